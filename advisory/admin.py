@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import MalawiRegion, Crop, Farmer, WeatherData, CropAdvice, FarmingCalendar, MarketPrice
+from .models import (
+    MalawiRegion, Crop, CropSuitability, Farmer, CropPlanting, WeatherData, DistrictSeasonTotals,
+    CropAdvice, FarmingCalendar, MarketPrice, MarketPriceRollup, OutboundMessage
+)
 
 @admin.register(MalawiRegion)
 class MalawiRegionAdmin(admin.ModelAdmin):
@@ -11,7 +14,7 @@ class MalawiRegionAdmin(admin.ModelAdmin):
 
 @admin.register(Crop)
 class CropAdmin(admin.ModelAdmin):
-    list_display = ['name_en', 'name_ny', 'crop_type', 'planting_season', 'harvest_season', 'growing_period_days']
+    list_display = ['name_en', 'name_ny', 'crop_type', 'planting_season', 'harvest_season', 'growing_period_days', 'view_count']
     list_filter = ['crop_type']
     search_fields = ['name_en', 'name_ny', 'scientific_name']
     filter_horizontal = ['suitable_regions']
@@ -27,27 +30,56 @@ class CropAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(CropSuitability)
+class CropSuitabilityAdmin(admin.ModelAdmin):
+    list_display = ['crop', 'region', 'score', 'updated_at']
+    list_filter = ['region', 'crop']
+    list_select_related = ['crop', 'region']
+    readonly_fields = ['crop', 'region', 'score', 'updated_at']
+    ordering = ['region', '-score']
+
 @admin.register(Farmer)
 class FarmerAdmin(admin.ModelAdmin):
-    list_display = ['user', 'phone_number', 'location', 'farm_size_acres', 'preferred_language', 'registration_date']
+    list_display = ['user', 'phone_number', 'location', 'farm_size_acres', 'preferred_language', 'registration_date', 'last_seen']
     list_filter = ['location', 'preferred_language', 'registration_date']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'phone_number']
+    list_select_related = ['user', 'location']
     filter_horizontal = ['primary_crops']
-    readonly_fields = ['registration_date']
+    readonly_fields = ['registration_date', 'last_seen']
+
+@admin.register(CropPlanting)
+class CropPlantingAdmin(admin.ModelAdmin):
+    list_display = ['farmer', 'crop', 'planting_date']
+    list_filter = ['crop', 'planting_date']
+    search_fields = ['farmer__user__username', 'crop__name_en']
+    list_select_related = ['farmer__user', 'farmer__location', 'crop']
 
 @admin.register(WeatherData)
 class WeatherDataAdmin(admin.ModelAdmin):
-    list_display = ['location', 'date', 'temperature_max', 'temperature_min', 'humidity', 'rainfall', 'weather_condition']
+    list_display = ['location', 'date', 'temperature_max', 'temperature_min', 'humidity', 'rainfall', 'weather_condition', 'growing_degree_days']
     list_filter = ['location', 'date', 'weather_condition']
     search_fields = ['location__name']
+    list_select_related = ['location']
     date_hierarchy = 'date'
     ordering = ['-date']
 
+@admin.register(DistrictSeasonTotals)
+class DistrictSeasonTotalsAdmin(admin.ModelAdmin):
+    list_display = ['location', 'season_start', 'season_gdd', 'season_rainfall', 'season_days', 'last_date']
+    list_select_related = ['location']
+    readonly_fields = [
+        'location', 'last_date', 'total_gdd', 'total_rainfall',
+        'season_start', 'season_gdd', 'season_rainfall', 'season_days'
+    ]
+    ordering = ['location__name']
+
 @admin.register(CropAdvice)
 class CropAdviceAdmin(admin.ModelAdmin):
     list_display = ['title_en', 'farmer', 'crop', 'advice_type', 'is_urgent', 'created_at', 'validity_days']
     list_filter = ['advice_type', 'is_urgent', 'crop', 'created_at']
     search_fields = ['title_en', 'title_ny', 'farmer__user__username']
+    list_select_related = ['farmer__user', 'farmer__location', 'crop']
+    raw_id_fields = ['farmer', 'weather_context']
     readonly_fields = ['created_at']
     fieldsets = (
         (_('Basic Information'), {
@@ -67,15 +99,43 @@ class CropAdviceAdmin(admin.ModelAdmin):
 
 @admin.register(FarmingCalendar)
 class FarmingCalendarAdmin(admin.ModelAdmin):
-    list_display = ['crop', 'region', 'month', 'activity_en']
-    list_filter = ['crop', 'region', 'month']
+    list_display = ['crop', 'region_group', 'region', 'month', 'activity_en']
+    list_filter = ['crop', 'region_group', 'region', 'month']
     search_fields = ['crop__name_en', 'region__name', 'activity_en', 'activity_ny']
-    ordering = ['crop', 'region', 'month']
+    list_select_related = ['crop', 'region']
+    ordering = ['crop', 'region_group', 'region', 'month']
 
 @admin.register(MarketPrice)
 class MarketPriceAdmin(admin.ModelAdmin):
     list_display = ['crop', 'location', 'date', 'price_per_kg', 'market_name', 'source']
     list_filter = ['crop', 'location', 'date', 'source']
     search_fields = ['crop__name_en', 'location__name', 'market_name']
+    list_select_related = ['crop', 'location']
     date_hierarchy = 'date'
     ordering = ['-date']
+
+@admin.register(MarketPriceRollup)
+class MarketPriceRollupAdmin(admin.ModelAdmin):
+    list_display = ['crop', 'location', 'market_name', 'period', 'period_start', 'price_count', 'min_price', 'max_price', 'rolling_avg_7d', 'rolling_avg_30d']
+    list_filter = ['period', 'crop', 'location']
+    search_fields = ['crop__name_en', 'location__name', 'market_name']
+    list_select_related = ['crop', 'location']
+    date_hierarchy = 'period_start'
+    ordering = ['-period_start']
+    
+    def has_add_permission(self, request):
+        # Rollups are maintained from MarketPrice rows
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ['phone_number', 'farmer', 'language', 'segments', 'status', 'gateway', 'attempts', 'created_at', 'delivered_at']
+    list_filter = ['status', 'gateway', 'language', 'created_at']
+    search_fields = ['phone_number', 'farmer__user__username', 'gateway_message_id']
+    list_select_related = ['farmer__user', 'farmer__location']
+    raw_id_fields = ['farmer', 'advice']
+    readonly_fields = ['gateway_message_id', 'attempts', 'error', 'created_at', 'sent_at', 'delivered_at']
+    date_hierarchy = 'created_at'
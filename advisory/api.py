@@ -0,0 +1,142 @@
+"""Versioned read-only REST API over the advisory models (``/api/v1/``)"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import permissions, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.routers import DefaultRouter
+from .models import (
+    MalawiRegion, Crop, CropSuitability, Farmer, WeatherData, DistrictSeasonTotals, CropPlanting,
+    CropAdvice, FarmingCalendar, MarketPrice, MarketPriceRollup, OutboundMessage
+)
+from .serializers import (
+    MalawiRegionSerializer, CropSerializer, CropSuitabilitySerializer, FarmerSerializer,
+    WeatherDataSerializer, DistrictSeasonTotalsSerializer, CropPlantingSerializer, CropAdviceSerializer,
+    FarmingCalendarSerializer, MarketPriceSerializer, MarketPriceRollupSerializer, OutboundMessageSerializer
+)
+
+
+class ReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    """List and detail endpoints that load only the columns the response uses"""
+    
+    # ?param=value query parameters mapped to queryset lookups
+    filters = {}
+    
+    def get_queryset(self):
+        queryset = self.scope(self.queryset.all())
+        for param, lookup in self.filters.items():
+            value = self.request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, DjangoValidationError):
+                raise ValidationError({param: f'Invalid value: {value}'})
+        return self.get_serializer().optimize(queryset)
+    
+    def scope(self, queryset):
+        """Rows the requesting user may see"""
+        return queryset
+
+
+class FarmerScopedViewSet(ReadOnlyViewSet):
+    """Farmers see their own rows; staff see everyone's"""
+    permission_classes = [permissions.IsAuthenticated]
+    farmer_lookup = 'farmer__user'
+    
+    def scope(self, queryset):
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(**{self.farmer_lookup: self.request.user})
+
+
+class MalawiRegionViewSet(ReadOnlyViewSet):
+    queryset = MalawiRegion.objects.all()
+    serializer_class = MalawiRegionSerializer
+    filters = {'region': 'region'}
+
+
+class CropViewSet(ReadOnlyViewSet):
+    queryset = Crop.objects.all()
+    serializer_class = CropSerializer
+    filters = {'crop_type': 'crop_type', 'region': 'suitable_regions'}
+
+
+class CropSuitabilityViewSet(ReadOnlyViewSet):
+    queryset = CropSuitability.objects.all()
+    serializer_class = CropSuitabilitySerializer
+    filters = {'crop': 'crop', 'region': 'region'}
+
+
+class WeatherDataViewSet(ReadOnlyViewSet):
+    queryset = WeatherData.objects.all()
+    serializer_class = WeatherDataSerializer
+    filters = {'location': 'location', 'date_from': 'date__gte', 'date_to': 'date__lte'}
+
+
+class DistrictSeasonTotalsViewSet(ReadOnlyViewSet):
+    queryset = DistrictSeasonTotals.objects.all()
+    serializer_class = DistrictSeasonTotalsSerializer
+    filters = {'location': 'location'}
+
+
+class FarmingCalendarViewSet(ReadOnlyViewSet):
+    queryset = FarmingCalendar.objects.all()
+    serializer_class = FarmingCalendarSerializer
+    filters = {'crop': 'crop', 'region': 'region', 'region_group': 'region_group', 'month': 'month'}
+
+
+class MarketPriceViewSet(ReadOnlyViewSet):
+    queryset = MarketPrice.objects.all()
+    serializer_class = MarketPriceSerializer
+    filters = {
+        'crop': 'crop', 'location': 'location', 'market': 'market_name',
+        'date_from': 'date__gte', 'date_to': 'date__lte',
+    }
+
+
+class MarketPriceRollupViewSet(ReadOnlyViewSet):
+    queryset = MarketPriceRollup.objects.all()
+    serializer_class = MarketPriceRollupSerializer
+    filters = {
+        'crop': 'crop', 'location': 'location', 'market': 'market_name', 'period': 'period',
+        'date_from': 'period_start__gte', 'date_to': 'period_start__lte',
+    }
+
+
+class FarmerViewSet(FarmerScopedViewSet):
+    queryset = Farmer.objects.all()
+    serializer_class = FarmerSerializer
+    farmer_lookup = 'user'
+    filters = {'location': 'location'}
+
+
+class CropPlantingViewSet(FarmerScopedViewSet):
+    queryset = CropPlanting.objects.all()
+    serializer_class = CropPlantingSerializer
+    filters = {'farmer': 'farmer', 'crop': 'crop'}
+
+
+class CropAdviceViewSet(FarmerScopedViewSet):
+    queryset = CropAdvice.objects.all()
+    serializer_class = CropAdviceSerializer
+    filters = {'farmer': 'farmer', 'crop': 'crop', 'advice_type': 'advice_type', 'is_urgent': 'is_urgent'}
+
+
+class OutboundMessageViewSet(FarmerScopedViewSet):
+    queryset = OutboundMessage.objects.all()
+    serializer_class = OutboundMessageSerializer
+    filters = {'farmer': 'farmer', 'status': 'status'}
+
+
+router = DefaultRouter()
+router.register('regions', MalawiRegionViewSet)
+router.register('crops', CropViewSet)
+router.register('suitability', CropSuitabilityViewSet)
+router.register('weather', WeatherDataViewSet)
+router.register('season-totals', DistrictSeasonTotalsViewSet)
+router.register('calendar', FarmingCalendarViewSet)
+router.register('prices', MarketPriceViewSet)
+router.register('price-rollups', MarketPriceRollupViewSet)
+router.register('farmers', FarmerViewSet)
+router.register('plantings', CropPlantingViewSet)
+router.register('advice', CropAdviceViewSet)
+router.register('messages', OutboundMessageViewSet)
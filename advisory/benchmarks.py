@@ -0,0 +1,179 @@
+"""Benchmark cases for the hot views and services.
+
+Each case is a callable taking a BenchmarkContext and performing one
+request or service call. Run them with ``manage.py benchmark``.
+"""
+import math
+import statistics
+import time
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from .models import Crop, Farmer, MalawiRegion, CropAdvice, WeatherData, MarketPrice
+from .services import AdvisoryService, WeatherService
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class QueryCounter:
+    """Counts queries through an execute wrapper; connection.queries is reset on every request"""
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class BenchmarkContext:
+    """Objects shared by all cases: a logged-in client and a representative farmer"""
+    
+    def __init__(self, farmer):
+        self.farmer = farmer
+        self.region = farmer.location
+        self.crop = farmer.primary_crops.order_by('id').first() or Crop.objects.order_by('id').first()
+        self.client = Client()
+        self.anonymous_client = Client()
+        self.client.force_login(farmer.user)
+    
+    def get(self, url, client=None):
+        response = (client or self.client).get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+        # Streaming or lazily rendered responses are only done once consumed
+        response.content
+        return response
+
+
+def farmer_dashboard(ctx):
+    ctx.get(reverse('farmer_dashboard'))
+
+
+def weather_info(ctx):
+    ctx.get(reverse('weather_info'), ctx.anonymous_client)
+
+
+def farming_calendar_view(ctx):
+    ctx.get(f"{reverse('farming_calendar')}?region={ctx.region.id}", ctx.anonymous_client)
+
+
+def api_weather(ctx):
+    ctx.get(reverse('api_weather', args=[ctx.region.id]), ctx.anonymous_client)
+
+
+def api_market_prices(ctx):
+    ctx.get(reverse('api_market_prices', args=[ctx.crop.id]), ctx.anonymous_client)
+
+
+def _page_through(ctx, url, rows):
+    """Follow REST API cursors until rows results have been read"""
+    fetched = 0
+    while url and fetched < rows:
+        data = ctx.get(url, ctx.anonymous_client).json()
+        fetched += len(data['results'])
+        url = data['next']
+
+
+def api_v1_prices_10k(ctx):
+    _page_through(ctx, f"{reverse('v1:marketprice-list')}?page_size=1000", 10000)
+
+
+def api_v1_prices_10k_sparse(ctx):
+    _page_through(ctx, f"{reverse('v1:marketprice-list')}?page_size=1000&fields=id,date,price_per_kg", 10000)
+
+
+def generate_advice(ctx):
+    if AdvisoryService().generate_advice(ctx.farmer, ctx.crop, 'care') is None:
+        raise RuntimeError('generate_advice returned None')
+
+
+def get_current_weather(ctx):
+    if WeatherService().get_current_weather(ctx.region) is None:
+        raise RuntimeError('get_current_weather returned None')
+
+
+CASES = {
+    'farmer_dashboard': farmer_dashboard,
+    'weather_info': weather_info,
+    'farming_calendar_view': farming_calendar_view,
+    'api_weather': api_weather,
+    'api_market_prices': api_market_prices,
+    'api_v1_prices_10k': api_v1_prices_10k,
+    'api_v1_prices_10k_sparse': api_v1_prices_10k_sparse,
+    'generate_advice': generate_advice,
+    'get_current_weather': get_current_weather,
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_case(case, ctx, iterations, warmup):
+    """Time one case; every call runs in a rolled-back transaction so the data never drifts"""
+    def call():
+        with transaction.atomic():
+            case(ctx)
+            transaction.set_rollback(True)
+    
+    for _ in range(warmup):
+        call()
+    
+    # Counted separately so the capture overhead stays out of the timings
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        call()
+    
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+    
+    timings.sort()
+    result = {
+        'iterations': iterations,
+        'queries': queries.count,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(timings[-1], 3),
+        'throughput_rps': round(iterations / elapsed, 1) if elapsed else None,
+    }
+    for pct in PERCENTILES:
+        result[f'p{pct}_ms'] = round(percentile(timings, pct), 3)
+    return result
+
+
+def dataset_summary():
+    return {
+        'districts': MalawiRegion.objects.count(),
+        'crops': Crop.objects.count(),
+        'farmers': Farmer.objects.count(),
+        'advice': CropAdvice.objects.count(),
+        'weather': WeatherData.objects.count(),
+        'market_prices': MarketPrice.objects.count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Cases slower (p50 or p95) by more than the threshold, or issuing more queries, than the baseline"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or 'error' in result or 'error' in previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(
+                    f'{name}: {metric} {previous[metric]:.2f} -> {result[metric]:.2f} '
+                    f'(+{100 * (result[metric] / previous[metric] - 1):.0f}%)'
+                )
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {result['queries']}")
+    return regressions
@@ -0,0 +1,77 @@
+import threading
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import request_finished, request_started
+from django.db.models import F
+from .metrics import record_cache_lookup
+
+# Versions read during the current request; None outside one, so commands
+# and other long-running code always see the latest
+_request_versions = threading.local()
+
+
+def get_cache_version(namespace, fresh=False):
+    """Current version of a group of cached fragments.
+    
+    Versions live in the database rather than the per-process cache, so a
+    bump made by one worker, or by a management command, reaches them all.
+    A request reads every version with one query and keeps them until it ends;
+    fresh=True reads it again, for callers that need the version and the data
+    it covers from the same transaction.
+    """
+    from .models import CacheVersion
+    versions = getattr(_request_versions, 'versions', None)
+    if versions is None or fresh:
+        return CacheVersion.objects.filter(namespace=namespace).values_list('version', flat=True).first() or 1
+    if namespace not in versions:
+        versions.clear()
+        versions.update(CacheVersion.objects.values_list('namespace', 'version'))
+        versions.setdefault(namespace, 1)
+    return versions[namespace]
+
+
+def bump_cache_version(namespace):
+    """Invalidate every cached fragment of a group at once.
+    
+    Runs inside the caller's transaction, so other workers only see the new
+    version together with the data that caused it.
+    """
+    from .models import CacheVersion
+    CacheVersion.objects.bulk_create([CacheVersion(namespace=namespace)], ignore_conflicts=True)
+    CacheVersion.objects.filter(namespace=namespace).update(version=F('version') + 1)
+    versions = getattr(_request_versions, 'versions', None)
+    if versions is not None:
+        versions.clear()
+    return get_cache_version(namespace)
+
+
+def _start_request(**kwargs):
+    _request_versions.versions = {}
+
+
+def _end_request(**kwargs):
+    _request_versions.versions = None
+
+
+request_started.connect(_start_request, dispatch_uid='advisory.cache_versions_start')
+request_finished.connect(_end_request, dispatch_uid='advisory.cache_versions_end')
+
+
+class MetricsCacheMixin:
+    """Counts hits and misses of a cache backend for the metrics endpoint"""
+    
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version)
+        record_cache_lookup(self.metrics_name, value is not sentinel)
+        return default if value is sentinel else value
+    
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        for key in keys:
+            record_cache_lookup(self.metrics_name, key in found)
+        return found
+
+
+class InstrumentedLocMemCache(MetricsCacheMixin, LocMemCache):
+    metrics_name = 'locmem'
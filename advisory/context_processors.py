@@ -0,0 +1,3 @@
+def page_shell(request):
+    """Tell templates whether the personalized fragments are loaded client-side"""
+    return {'page_shell': getattr(request, 'page_shell', False)}
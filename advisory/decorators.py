@@ -0,0 +1,34 @@
+from functools import wraps
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+
+
+def page_shell(view_func):
+    """
+    Serve a public page as a cacheable shell.
+
+    The per-user parts of base.html (login state, messages) are left out of
+    the response and loaded by main.js from the session fragment endpoint,
+    so a reverse proxy can store one copy of the page per URL and language.
+    Only pages whose language comes from Accept-Language (which LocaleMiddleware
+    adds to Vary) are shared; a visitor with a language cookie gets a private
+    copy, since caches don't key on that cookie.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not settings.PAGE_SHELL_ENABLED:
+            return view_func(request, *args, **kwargs)
+
+        request.page_shell = True
+        response = view_func(request, *args, **kwargs)
+
+        # Only plain successful pages are shared; anything that sets a cookie
+        # belongs to a single visitor.
+        if response.status_code == 200 and not response.cookies:
+            if settings.LANGUAGE_COOKIE_NAME in request.COOKIES:
+                patch_cache_control(response, private=True, max_age=settings.PAGE_SHELL_MAX_AGE)
+            else:
+                patch_cache_control(response, public=True, max_age=settings.PAGE_SHELL_MAX_AGE)
+        return response
+
+    return _wrapped_view
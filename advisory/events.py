@@ -0,0 +1,117 @@
+"""In-process publish/subscribe for live alerts.
+
+Model signals publish to channels such as ``farmer:12`` or ``district:3``
+from whatever thread saved the row; subscribers are asyncio queues owned by
+the SSE streams, so an idle connection costs one queue and one suspended
+coroutine, not a thread.
+
+Events only reach streams in the same process. Stream event ids are
+high-water marks of the underlying rows, so a client that reconnects (to any
+process) with Last-Event-ID catches up from the database.
+"""
+import asyncio
+import threading
+from .metrics import ALERT_STREAMS
+
+
+class Subscription:
+    """One stream's queue of events for a set of channels"""
+    
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+    
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind reconnects and resumes from the database
+            self.overflowed = True
+    
+    async def get(self):
+        return await self.queue.get()
+    
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fan events out to the subscriptions of a channel, from any thread"""
+    
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._channels = {}
+        self._lock = threading.Lock()
+    
+    def subscribe(self, channels):
+        """Must be called from the event loop that will read the subscription"""
+        subscription = Subscription(self, tuple(channels), self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        ALERT_STREAMS.inc()
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+        ALERT_STREAMS.dec()
+    
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # The stream's loop has already shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+    
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+broker = EventBroker()
+
+
+def farmer_channel(farmer_id):
+    return f'farmer:{farmer_id}'
+
+
+def district_channel(location_id):
+    return f'district:{location_id}'
+
+
+def advice_event(advice):
+    return {
+        'type': 'advice',
+        'id': advice.id,
+        'crop_id': advice.crop_id,
+        'advice_type': advice.advice_type,
+        'title_en': advice.title_en,
+        'title_ny': advice.title_ny,
+        'created_at': advice.created_at.isoformat(),
+    }
+
+
+def weather_event(weather):
+    return {
+        'type': 'weather',
+        'id': weather.id,
+        'date': weather.date.isoformat(),
+        'temp_max': weather.temperature_max,
+        'temp_min': weather.temperature_min,
+        'humidity': weather.humidity,
+        'rainfall': weather.rainfall,
+        'condition': weather.weather_condition,
+    }
@@ -1,8 +1,11 @@
 from django import forms
+from django.contrib.auth import password_validation
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field
-from .models import Farmer, MalawiRegion, Crop
+from .models import Farmer, MalawiRegion, Crop, AccountClaim
+from .sms import normalize_phone
 
 class FarmerRegistrationForm(forms.ModelForm):
     """Form for farmer registration"""
@@ -69,6 +72,63 @@ class FarmerProfileForm(forms.ModelForm):
             Submit('submit', _('Update Profile'), css_class='btn btn-primary btn-lg')
         )
 
+class AccountClaimForm(forms.Form):
+    """Set a first password with the one-time code sent to an imported farmer"""
+    phone_number = forms.CharField(label=_('Phone Number'), max_length=20)
+    code = forms.CharField(label=_('Code from SMS'), max_length=6)
+    new_password1 = forms.CharField(label=_('New password'), strip=False, widget=forms.PasswordInput)
+    new_password2 = forms.CharField(label=_('Confirm new password'), strip=False, widget=forms.PasswordInput)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.claim = None
+        self.helper = FormHelper()
+        self.helper.layout = Layout(
+            Row(
+                Column('phone_number', css_class='form-group col-md-6 mb-3'),
+                Column('code', css_class='form-group col-md-6 mb-3'),
+                css_class='form-row'
+            ),
+            Field('new_password1', css_class='mb-3'),
+            Field('new_password2', css_class='mb-3'),
+            Submit('submit', _('Set Password'), css_class='btn btn-success btn-lg')
+        )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        phone_number = normalize_phone(cleaned_data.get('phone_number'))
+        code = cleaned_data.get('code', '').strip()
+        invalid = forms.ValidationError(_('The phone number or code is not valid.'))
+        
+        claim = AccountClaim.objects.select_related('farmer__user').filter(
+            farmer__phone_number=phone_number
+        ).first() if phone_number else None
+        if claim is None or not claim.usable:
+            raise invalid
+        if not claim.check_code(code):
+            AccountClaim.objects.filter(pk=claim.pk).update(attempts=F('attempts') + 1)
+            raise invalid
+        
+        password1 = cleaned_data.get('new_password1')
+        password2 = cleaned_data.get('new_password2')
+        if password1 and password1 != password2:
+            self.add_error('new_password2', _('The two password fields didn’t match.'))
+        elif password1:
+            try:
+                password_validation.validate_password(password1, claim.farmer.user)
+            except forms.ValidationError as e:
+                self.add_error('new_password2', e)
+        self.claim = claim
+        return cleaned_data
+    
+    def save(self):
+        """Set the password and use up the code; returns the user"""
+        user = self.claim.farmer.user
+        user.set_password(self.cleaned_data['new_password1'])
+        user.save(update_fields=['password'])
+        self.claim.delete()
+        return user
+
 class CropFilterForm(forms.Form):
     """Form for filtering crops"""
     region = forms.ModelChoiceField(
@@ -0,0 +1,29 @@
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import reverse
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI handler that runs long-lived streams without a thread of their own
+
+    Django gives every ASGI request a private executor thread for its sync
+    code (session and auth middleware, the ORM) and keeps it until the
+    response finishes, which for an alert stream is minutes. Streams only do
+    sync work while they start, so they share the one main-thread executor
+    instead.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._stream_paths = None
+    
+    @property
+    def stream_paths(self):
+        if self._stream_paths is None:
+            self._stream_paths = {reverse('alert_stream')}
+        return self._stream_paths
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in self.stream_paths:
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
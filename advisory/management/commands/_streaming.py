@@ -0,0 +1,40 @@
+"""Helpers shared by the bulk import commands"""
+import csv
+import gzip
+import io
+import json
+import sys
+
+
+def open_text(path):
+    """Open a file (or '-' for stdin) for streaming, unpacking .gz on the fly"""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(path, file_format='auto'):
+    """Yield (line number, dict) per row without loading the file into memory"""
+    if file_format == 'auto':
+        name = path[:-3] if path.endswith('.gz') else path
+        file_format = 'jsonl' if name.endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+    with open_text(path) as handle:
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = {'_error': f'invalid JSON: {e}'}
+                if not isinstance(row, dict):
+                    row = {'_error': 'expected a JSON object'}
+                yield line_number, row
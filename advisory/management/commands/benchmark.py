@@ -0,0 +1,108 @@
+import json
+import platform
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from advisory.benchmarks import CASES, BenchmarkContext, compare, dataset_summary, run_case
+from advisory.models import Farmer
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot views and services: latency percentiles, throughput and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('cases', nargs='*', help=f'Cases to run (default: all of {", ".join(CASES)})')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline results to compare against')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed slowdown against the baseline before a case counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on regressions')
+        parser.add_argument('--generate-scale', type=float,
+                            help='Run generate_synthetic_data at this scale first if no farmers exist')
+
+    def handle(self, *args, **options):
+        unknown = set(options['cases']) - set(CASES)
+        if unknown:
+            raise CommandError(f'Unknown cases: {", ".join(sorted(unknown))}')
+        
+        farmer = self.pick_farmer()
+        if farmer is None and options['generate_scale']:
+            call_command('generate_synthetic_data', scale=options['generate_scale'], stdout=self.stdout)
+            farmer = self.pick_farmer()
+        if farmer is None:
+            raise CommandError('No farmer with a district and crops found; run generate_synthetic_data first')
+        
+        dataset = dataset_summary()
+        self.stdout.write('Dataset: ' + ', '.join(f'{value:,} {name}' for name, value in dataset.items()))
+        if dataset['advice'] < 100000:
+            self.stdout.write(self.style.WARNING(
+                'This dataset is far smaller than production; try generate_synthetic_data --scale 100'
+            ))
+        
+        ctx = BenchmarkContext(farmer)
+        results = {}
+        for name in options['cases'] or CASES:
+            try:
+                results[name] = run_case(CASES[name], ctx, options['iterations'], options['warmup'])
+            except Exception as e:
+                results[name] = {'error': f'{type(e).__name__}: {e}'}
+            self.report(name, results[name])
+        
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+            },
+            'dataset': dataset,
+            'results': results,
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+        
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+        elif baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text())
+            regressions = compare(results, baseline.get('results', {}), options['threshold'])
+            if regressions:
+                self.stdout.write(self.style.ERROR(f'{len(regressions)} regressions against {baseline_path}:'))
+                for line in regressions:
+                    self.stdout.write(f'  {line}')
+                if options['fail_on_regression']:
+                    raise CommandError('Performance regressions found')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
+
+    def pick_farmer(self):
+        """The first farmer with a district and crops, so repeated runs measure the same pages"""
+        return (
+            Farmer.objects.filter(location__isnull=False, primary_crops__isnull=False)
+            .select_related('user', 'location')
+            .order_by('id')
+            .first()
+        )
+
+    def report(self, name, result):
+        if 'error' in result:
+            self.stdout.write(self.style.ERROR(f"{name:<24} {result['error']}"))
+            return
+        self.stdout.write(
+            f"{name:<24} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+            f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_rps']:8.1f} req/s  {result['queries']:3d} queries"
+        )
@@ -0,0 +1,152 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from django.core.management.base import BaseCommand
+
+PHONE_PATTERN = re.compile(r'^\+\d{10,15}$')
+
+
+class FakeGateway:
+    """State shared by the request handlers: counters and pending delivery reports"""
+    
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.reports = []
+        self.accepted = self.rejected = self.errors = self.throttled = 0
+        self.window_start, self.window_count = time.monotonic(), 0
+    
+    def over_rate_limit(self, count):
+        limit = self.options['rate_limit']
+        if not limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start, self.window_count = now, 0
+            if self.window_count + count > limit:
+                self.throttled += 1
+                return True
+            self.window_count += count
+            return False
+    
+    def handle_batch(self, messages):
+        results, reports = [], []
+        for message in messages:
+            reference = message.get('reference')
+            if not PHONE_PATTERN.match(message.get('to') or ''):
+                results.append({'reference': reference, 'status': 'rejected', 'error': 'Invalid destination'})
+                continue
+            message_id = uuid.uuid4().hex
+            results.append({'reference': reference, 'status': 'accepted', 'message_id': message_id})
+            delivered = random.random() >= self.options['undelivered_rate']
+            reports.append({
+                'message_id': message_id,
+                'status': 'delivered' if delivered else 'failed',
+                'error': '' if delivered else 'Handset unreachable',
+            })
+        with self.lock:
+            self.reports.extend(reports)
+            self.accepted += sum(result['status'] == 'accepted' for result in results)
+            self.rejected += sum(result['status'] == 'rejected' for result in results)
+        return results
+    
+    def send_reports(self):
+        """Post delivery reports back in batches, like a real gateway's DLR callbacks"""
+        session = requests.Session()
+        if self.options['callback_token']:
+            session.headers['Authorization'] = f"Bearer {self.options['callback_token']}"
+        while True:
+            time.sleep(1)
+            with self.lock:
+                reports, self.reports = self.reports, []
+            for start in range(0, len(reports), 1000):
+                try:
+                    session.post(self.options['callback_url'], json={'reports': reports[start:start + 1000]}, timeout=10)
+                except requests.RequestException as exc:
+                    print(f'Delivery report callback failed: {exc}')
+
+
+def make_handler(gateway):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                messages = json.loads(body)['messages']
+            except (ValueError, KeyError, TypeError):
+                return self.reply(400, {'error': 'Expected {"messages": [...]}'})
+            
+            if gateway.over_rate_limit(len(messages)):
+                return self.reply(429, {'error': 'Rate limit exceeded'}, {'Retry-After': '1'})
+            if random.random() < gateway.options['error_rate']:
+                with gateway.lock:
+                    gateway.errors += 1
+                return self.reply(503, {'error': 'Temporarily unavailable'})
+            if gateway.options['latency']:
+                time.sleep(gateway.options['latency'] / 1000)
+            self.reply(200, {'results': gateway.handle_batch(messages)})
+        
+        def reply(self, status, data, headers=None):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return Handler
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the SMS gateway that accepts batches and posts delivery reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8025)
+        parser.add_argument('--latency', type=float, default=50, help='Milliseconds to spend on each batch')
+        parser.add_argument('--rate-limit', type=int, default=0,
+                            help='Messages per second before answering 429 (0 for no limit)')
+        parser.add_argument('--error-rate', type=float, default=0,
+                            help='Fraction of batches answered with 503')
+        parser.add_argument('--undelivered-rate', type=float, default=0.02,
+                            help='Fraction of accepted messages reported as not delivered')
+        parser.add_argument('--callback-url', default='http://127.0.0.1:8000/sms/delivery/',
+                            help='Where to post delivery reports')
+        parser.add_argument('--callback-token', default='', help='Bearer token for the delivery reports')
+
+    def handle(self, *args, **options):
+        gateway = FakeGateway(options)
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), make_handler(gateway))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        threading.Thread(target=gateway.send_reports, daemon=True).start()
+        self.stdout.write(f"Fake SMS gateway on http://127.0.0.1:{options['port']}/send")
+        
+        last, started = 0, time.monotonic()
+        try:
+            while True:
+                time.sleep(5)
+                if gateway.accepted != last:
+                    rate = (gateway.accepted - last) / 5 * 60
+                    last = gateway.accepted
+                    self.stdout.write(
+                        f'{gateway.accepted} accepted, {gateway.rejected} rejected, {gateway.errors} errors, '
+                        f'{gateway.throttled} throttled ({rate:,.0f}/min)'
+                    )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'Accepted {gateway.accepted} messages in {elapsed:.0f}s')
@@ -0,0 +1,280 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as day_time, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from advisory.models import (
+    MalawiRegion, Crop, Farmer, CropPlanting, CropAdvice, WeatherData, MarketPrice,
+)
+from advisory.services import MarketPriceRollupService, SeasonTotalsService
+from .populate_data import Command as PopulateCommand
+
+USERNAME_PREFIX = 'synthetic_'
+
+FIRST_NAMES = ['Chikondi', 'Mphatso', 'Tiyamike', 'Kondwani', 'Thoko', 'Limbani', 'Chisomo', 'Yamikani',
+               'Dalitso', 'Madalitso', 'Takondwa', 'Pemphero', 'Blessings', 'Grace', 'Esther', 'John']
+LAST_NAMES = ['Banda', 'Phiri', 'Mwale', 'Chirwa', 'Nkhoma', 'Kachingwe', 'Gondwe', 'Mbewe',
+              'Tembo', 'Zulu', 'Nyirenda', 'Msiska', 'Kumwenda', 'Chilima', 'Jere', 'Mvula']
+
+ADVICE_TEMPLATES = {
+    'planting': ('Planting guide for {crop}', 'Kubzala {crop}',
+                 'Prepare ridges 75cm apart and plant {crop} after the first good rains.'),
+    'care': ('Caring for your {crop}', 'Kusamalira {crop}',
+             'Weed {crop} two to three weeks after emergence and top-dress with fertiliser.'),
+    'disease': ('Disease watch for {crop}', 'Matenda a {crop}',
+                'Inspect {crop} leaves weekly and remove infected plants early.'),
+    'harvest': ('Harvesting {crop}', 'Kukolola {crop}',
+                'Harvest {crop} when fully mature and dry it well before storage.'),
+    'weather': ('Weather alert for {crop}', 'Chenjezo la nyengo pa {crop}',
+                'Expected weather may affect {crop}; check drainage and protect seedlings.'),
+    'general': ('Farming tips for {crop}', 'Malangizo a {crop}',
+                'Keep records of inputs and yields for {crop} to plan the next season.'),
+}
+
+
+@contextmanager
+def historical_timestamps(model, field_name):
+    """Let bulk_create keep explicit values for an auto_now_add field"""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, reproducible synthetic dataset (farmers, weather, prices, advice) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1,
+                            help='Multiplier for the default sizes: 1 = 1,000 farmers and 10,000 advice rows')
+        parser.add_argument('--farmers', type=int, help='Number of farmers (overrides --scale)')
+        parser.add_argument('--advice-per-farmer', type=int, default=10)
+        parser.add_argument('--days', type=int, default=180, help='Days of weather and price history')
+        parser.add_argument('--price-interval', type=int, default=7,
+                            help='Days between market price observations per crop and district')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated farmers first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        
+        if not MalawiRegion.objects.exists() or not Crop.objects.exists():
+            self.stdout.write('No reference data found, running populate_data first...')
+            call_command('populate_data', stdout=self.stdout)
+        
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            self.stdout.write(f'Deleted {deleted} previously generated rows')
+        
+        self.regions = list(MalawiRegion.objects.order_by('id'))
+        self.crops = list(Crop.objects.order_by('id'))
+        self.today = date.today()
+        self.start_date = self.today - timedelta(days=options['days'] - 1)
+        
+        farmer_count = options['farmers'] if options['farmers'] is not None else int(1000 * options['scale'])
+        self.create_weather()
+        self.create_prices(options['price_interval'])
+        farmers = self.create_farmers(farmer_count)
+        self.create_advice(farmers, options['advice_per_farmer'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Synthetic data generated in {time.monotonic() - started:.1f}s'))
+
+    def progress(self, label, done, total):
+        """Redraw a single-line progress bar"""
+        width = 30
+        filled = int(width * done / total) if total else width
+        self.stdout.write(f'\r{label:<10} [{"#" * filled}{"." * (width - filled)}] {done:,}/{total:,}', ending='')
+        if done >= total:
+            self.stdout.write('')
+        self.stdout.flush()
+
+    def insert(self, label, model, rows, total, keep=False, **options):
+        """
+        Bulk insert an iterable of unsaved objects in batches, one transaction
+        per batch. Returns the created objects with keep=True, for the models
+        whose pks later rows need; otherwise only the count, so memory stays
+        flat however many rows stream through.
+        """
+        created = []
+        batch = []
+        done = 0
+        if total:
+            self.progress(label, 0, total)
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    objects = model.objects.bulk_create(batch, **options)
+                if keep:
+                    created.extend(objects)
+                done += len(batch)
+                batch = []
+                self.progress(label, done, total)
+        if batch:
+            with transaction.atomic():
+                objects = model.objects.bulk_create(batch, **options)
+            if keep:
+                created.extend(objects)
+            done += len(batch)
+        if batch or not total:
+            self.progress(label, done, total)
+        return created if keep else done
+
+    def create_weather(self):
+        climate = PopulateCommand()
+        days = (self.today - self.start_date).days + 1
+        
+        def rows():
+            for day_offset in range(days):
+                current = self.start_date + timedelta(days=day_offset)
+                for region in self.regions:
+                    base = climate.get_base_temperature(current.month, region)
+                    wet = self.rng.random() < climate.get_rainfall_chance(current.month)
+                    rainfall = self.rng.randint(1, 30) if wet else 0
+                    yield WeatherData(
+                        location=region,
+                        date=current,
+                        temperature_max=base + self.rng.randint(-3, 5),
+                        temperature_min=base - self.rng.randint(5, 10),
+                        humidity=self.rng.randint(50, 90),
+                        rainfall=rainfall,
+                        wind_speed=self.rng.randint(5, 25),
+                        weather_condition=('Heavy Rain' if rainfall > 15 else 'Light Rain') if wet
+                        else self.rng.choice(['Sunny', 'Partly Cloudy', 'Clear', 'Cloudy']),
+                    )
+        
+        # Existing observations win; the running totals are rebuilt afterwards
+        self.insert('Weather', WeatherData, rows(), days * len(self.regions), ignore_conflicts=True)
+        totals = SeasonTotalsService()
+        for region in self.regions:
+            totals.rebuild(region.id)
+
+    def create_prices(self, interval):
+        days = list(range(0, (self.today - self.start_date).days + 1, max(1, interval)))
+        
+        def rows():
+            for crop in self.crops:
+                base_price = self.rng.randint(150, 1200)
+                for region in self.regions:
+                    price = base_price * self.rng.uniform(0.8, 1.2)
+                    for day_offset in days:
+                        price = max(50, price * self.rng.uniform(0.95, 1.06))
+                        yield MarketPrice(
+                            crop=crop,
+                            location=region,
+                            market_name=f'{region.name} Market',
+                            date=self.start_date + timedelta(days=day_offset),
+                            price_per_kg=Decimal(price).quantize(Decimal('0.01')),
+                            source='Synthetic',
+                        )
+        
+        total = len(self.crops) * len(self.regions) * len(days)
+        self.insert('Prices', MarketPrice, rows(), total, ignore_conflicts=True)
+        self.stdout.write('Rebuilding price rollups...')
+        MarketPriceRollupService().rebuild()
+
+    def create_farmers(self, count):
+        if not count:
+            return []
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        # Hashing is deliberately slow, so every generated farmer shares one password hash
+        password = make_password('farmer123', salt='synthetic')
+        
+        users = self.insert('Users', User, (
+            User(
+                username=f'{USERNAME_PREFIX}{offset + i:07d}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+            )
+            for i in range(count)
+        ), count, keep=True)
+        
+        suitable = {}
+        for crop_id, region_id in Crop.suitable_regions.through.objects.values_list('crop_id', 'malawiregion_id'):
+            suitable.setdefault(region_id, []).append(crop_id)
+        all_crop_ids = [crop.id for crop in self.crops]
+        
+        farmers = self.insert('Farmers', Farmer, (
+            Farmer(
+                user=user,
+                phone_number=f'+2659{self.rng.randint(10000000, 99999999)}',
+                location=self.rng.choice(self.regions),
+                farm_size_acres=round(self.rng.uniform(0.5, 10), 1),
+                preferred_language=self.rng.choice(['ny', 'ny', 'en']),
+            )
+            for user in users
+        ), count, keep=True)
+        
+        farmer_crops = {}
+        for farmer in farmers:
+            options = suitable.get(farmer.location_id) or all_crop_ids
+            farmer_crops[farmer.id] = self.rng.sample(options, min(len(options), self.rng.randint(1, 4)))
+        
+        through = Farmer.primary_crops.through
+        total = sum(len(crop_ids) for crop_ids in farmer_crops.values())
+        self.insert('Crops', through, (
+            through(farmer_id=farmer_id, crop_id=crop_id)
+            for farmer_id, crop_ids in farmer_crops.items()
+            for crop_id in crop_ids
+        ), total)
+        
+        plantings = [
+            (farmer_id, crop_id)
+            for farmer_id, crop_ids in farmer_crops.items()
+            for crop_id in crop_ids
+            if self.rng.random() < 0.5
+        ]
+        self.insert('Plantings', CropPlanting, (
+            CropPlanting(
+                farmer_id=farmer_id,
+                crop_id=crop_id,
+                planting_date=self.today - timedelta(days=self.rng.randint(0, 120)),
+            )
+            for farmer_id, crop_id in plantings
+        ), len(plantings))
+        
+        self.farmer_crops = farmer_crops
+        return farmers
+
+    def create_advice(self, farmers, per_farmer):
+        if not farmers or not per_farmer:
+            return
+        crop_names = {crop.id: crop.name_en for crop in self.crops}
+        advice_types = list(ADVICE_TEMPLATES)
+        history_days = (self.today - self.start_date).days + 1
+        
+        def rows():
+            for farmer in farmers:
+                for _ in range(per_farmer):
+                    crop_id = self.rng.choice(self.farmer_crops[farmer.id])
+                    advice_type = self.rng.choice(advice_types)
+                    title_en, title_ny, content = ADVICE_TEMPLATES[advice_type]
+                    day = self.start_date + timedelta(days=self.rng.randrange(history_days))
+                    moment = datetime.combine(day, day_time(self.rng.randint(6, 18), self.rng.randint(0, 59)))
+                    name = crop_names[crop_id]
+                    yield CropAdvice(
+                        farmer=farmer,
+                        crop_id=crop_id,
+                        advice_type=advice_type,
+                        title_en=title_en.format(crop=name),
+                        title_ny=title_ny.format(crop=name),
+                        content_en=content.format(crop=name),
+                        content_ny='',
+                        created_at=timezone.make_aware(moment),
+                        is_urgent=advice_type == 'weather' and self.rng.random() < 0.3,
+                    )
+        
+        with historical_timestamps(CropAdvice, 'created_at'):
+            self.insert('Advice', CropAdvice, rows(), len(farmers) * per_farmer)
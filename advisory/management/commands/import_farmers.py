@@ -0,0 +1,250 @@
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone, translation
+from django.utils.translation import gettext as _
+from advisory.models import AccountClaim, Crop, Farmer, MalawiRegion, OutboundMessage
+from advisory.sms import normalize_phone, segment_count, sms_text
+from ._streaming import read_rows
+
+
+def hash_password(password):
+    """Run in a worker process: PBKDF2 is CPU-bound, so threads would not help"""
+    return make_password(password)
+
+
+class Command(BaseCommand):
+    help = 'Stream a cooperative roster from CSV or JSONL files and create farmer accounts in batches'
+
+    LANGUAGES = {'en': 'en', 'english': 'en', 'ny': 'ny', 'chichewa': 'ny', 'chinyanja': 'ny'}
+    USERNAME_RE = re.compile(r'^[\w.@+-]{1,150}$')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="CSV or JSONL files (optionally .gz), or '-' for stdin")
+        parser.add_argument('--format', choices=['auto', 'csv', 'jsonl'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing the passwords given in the roster')
+        parser.add_argument('--language', choices=['en', 'ny'], default='en',
+                            help='Preferred language when a row has none')
+        parser.add_argument('--send-codes', action='store_true',
+                            help='Queue an SMS with a one-time code to farmers imported without a password')
+        parser.add_argument('--max-errors', type=int, default=0,
+                            help='Stop after this many rejected rows (0 = never stop)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing')
+
+    def handle(self, *args, **options):
+        self.crops = {}
+        for crop in Crop.objects.only('id', 'name_en', 'name_ny'):
+            self.crops[crop.name_en.lower()] = crop.id
+            if crop.name_ny:
+                self.crops.setdefault(crop.name_ny.lower(), crop.id)
+        self.districts = {
+            name.lower(): region_id
+            for region_id, name in MalawiRegion.objects.values_list('id', 'name')
+        }
+        # Older profiles may hold local formats, so compare numbers in E.164 form
+        self.phones = {
+            normalize_phone(number) or number
+            for number in Farmer.objects.values_list('phone_number', flat=True).iterator(chunk_size=5000)
+        }
+        self.usernames = set()
+
+        self.options = options
+        self.read = self.written = self.rejected = self.codes = 0
+        self.claim_url = settings.SITE_URL.rstrip('/') + reverse('claim_account')
+        self.pool = None
+        if options['workers'] > 1 and not options['dry_run']:
+            self.pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+        started = time.monotonic()
+
+        try:
+            batch = []
+            for path in options['files']:
+                try:
+                    for line_number, row in read_rows(path, options['format']):
+                        self.read += 1
+                        entry = self.build_entry(row, path, line_number)
+                        if entry is None:
+                            continue
+                        batch.append(entry)
+                        if len(batch) >= options['batch_size']:
+                            self.flush(batch, started)
+                            batch = []
+                except OSError as e:
+                    raise CommandError(f'Cannot read {path}: {e}')
+            self.flush(batch, started)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {self.read} rows, created {self.written} farmers, queued {self.codes} codes, '
+            f'rejected {self.rejected} in {elapsed:.1f}s ({self.read / elapsed:,.0f} rows/s)'
+        ))
+
+    def reject(self, path, line_number, reason):
+        self.rejected += 1
+        if self.rejected <= 20:
+            self.stderr.write(f'{path}:{line_number}: {reason}')
+        max_errors = self.options['max_errors']
+        if max_errors and self.rejected >= max_errors:
+            raise CommandError(f'Stopped after {self.rejected} rejected rows')
+        return None
+
+    def build_entry(self, row, path, line_number):
+        """Validate a row and turn it into the values of one account, or reject it"""
+        if '_error' in row:
+            return self.reject(path, line_number, row['_error'])
+
+        raw_phone = str(row.get('phone', row.get('phone_number', ''))).strip()
+        phone_number = normalize_phone(raw_phone)
+        if phone_number is None:
+            return self.reject(path, line_number, f'invalid phone number {raw_phone!r}')
+        if phone_number in self.phones:
+            return self.reject(path, line_number, f'phone number {phone_number} is already registered')
+
+        district = row.get('district', row.get('location', ''))
+        location_id = self.districts.get(str(district).strip().lower())
+        if location_id is None:
+            return self.reject(path, line_number, f'unknown district {district!r}')
+
+        try:
+            farm_size = float(str(row.get('farm_size', row.get('farm_size_acres', ''))).strip())
+        except ValueError:
+            return self.reject(path, line_number, f"invalid farm size {row.get('farm_size')!r}")
+        if not 0 < farm_size < 100000:
+            return self.reject(path, line_number, f'farm size out of range: {farm_size}')
+
+        language = str(row.get('language') or self.options['language']).strip().lower()
+        if language not in self.LANGUAGES:
+            return self.reject(path, line_number, f'unknown language {language!r}')
+
+        crop_ids = set()
+        for name in re.split(r'[;,|]', str(row.get('crops', row.get('primary_crops', '')))):
+            name = name.strip().lower()
+            if not name:
+                continue
+            if name not in self.crops:
+                return self.reject(path, line_number, f'unknown crop {name!r}')
+            crop_ids.add(self.crops[name])
+
+        username = str(row.get('username') or phone_number.lstrip('+')).strip()
+        if not self.USERNAME_RE.match(username) or username in self.usernames:
+            return self.reject(path, line_number, f'invalid or duplicate username {username!r}')
+
+        first_name = str(row.get('first_name', '')).strip()
+        last_name = str(row.get('last_name', '')).strip()
+        if not first_name and not last_name:
+            first_name, _sep, last_name = str(row.get('name', '')).strip().partition(' ')
+
+        self.phones.add(phone_number)
+        self.usernames.add(username)
+        return {
+            'line': (path, line_number),
+            'user': User(
+                username=username, first_name=first_name[:150], last_name=last_name.strip()[:150],
+                email=str(row.get('email', '')).strip()[:254],
+            ),
+            'password': str(row.get('password') or ''),
+            'farmer': Farmer(
+                phone_number=phone_number, location_id=location_id, farm_size_acres=farm_size,
+                preferred_language=self.LANGUAGES[language],
+            ),
+            'crop_ids': crop_ids,
+        }
+
+    def flush(self, batch, started):
+        if not batch:
+            return
+        # Usernames taken by earlier registrations, checked a batch at a time
+        taken = set(User.objects.filter(
+            username__in=[entry['user'].username for entry in batch]
+        ).values_list('username', flat=True))
+        entries = []
+        for entry in batch:
+            if entry['user'].username in taken:
+                self.reject(*entry['line'], f"username {entry['user'].username!r} is already taken")
+            else:
+                entries.append(entry)
+
+        if not self.options['dry_run'] and entries:
+            self.set_passwords(entries)
+            self.create(entries)
+        self.written += len(entries)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f'  {self.read} rows read, {self.written} created ({self.read / elapsed:,.0f} rows/s)')
+
+    def set_passwords(self, entries):
+        """Hash roster passwords across the pool; everyone else gets an unusable one"""
+        with_password = [entry for entry in entries if entry['password']]
+        passwords = [entry['password'] for entry in with_password]
+        if self.pool is not None and len(passwords) > 1:
+            chunksize = max(len(passwords) // (self.options['workers'] * 4), 1)
+            hashes = self.pool.map(hash_password, passwords, chunksize=chunksize)
+        else:
+            hashes = map(hash_password, passwords)
+        for entry, encoded in zip(with_password, hashes):
+            entry['user'].password = encoded
+        for entry in entries:
+            if not entry['password']:
+                entry['user'].set_unusable_password()
+
+    def create(self, entries):
+        with transaction.atomic():
+            users = User.objects.bulk_create([entry['user'] for entry in entries])
+            farmers = []
+            for entry, user in zip(entries, users):
+                entry['farmer'].user_id = user.id
+                farmers.append(entry['farmer'])
+            farmers = Farmer.objects.bulk_create(farmers)
+
+            Farmer.primary_crops.through.objects.bulk_create([
+                Farmer.primary_crops.through(farmer_id=farmer.id, crop_id=crop_id)
+                for entry, farmer in zip(entries, farmers)
+                for crop_id in entry['crop_ids']
+            ], batch_size=1000)
+
+            if self.options['send_codes']:
+                self.queue_codes([
+                    (entry['user'], farmer)
+                    for entry, farmer in zip(entries, farmers)
+                    if not entry['password']
+                ])
+
+    def queue_codes(self, accounts):
+        """Create a claim per account and queue the SMS that carries its code"""
+        expires_at = timezone.now() + timedelta(days=settings.ACCOUNT_CLAIM_DAYS)
+        claims, messages = [], []
+        for user, farmer in accounts:
+            code = f'{secrets.randbelow(10 ** 6):06d}'
+            claims.append(AccountClaim(
+                farmer_id=farmer.id, code_hash=AccountClaim.hash_code(farmer.id, code), expires_at=expires_at,
+            ))
+            with translation.override(farmer.preferred_language):
+                body = sms_text(_(
+                    'Welcome to Malawi Crop Advisory. Username: %(username)s Code: %(code)s '
+                    'Set your password within %(days)s days at %(url)s'
+                ) % {
+                    'username': user.username, 'code': code,
+                    'days': settings.ACCOUNT_CLAIM_DAYS, 'url': self.claim_url,
+                })
+            messages.append(OutboundMessage(
+                farmer_id=farmer.id, phone_number=farmer.phone_number, language=farmer.preferred_language,
+                body=body, segments=segment_count(body),
+            ))
+        AccountClaim.objects.bulk_create(claims, batch_size=1000)
+        OutboundMessage.objects.bulk_create(messages, batch_size=500)
+        self.codes += len(claims)
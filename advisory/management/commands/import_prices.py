@@ -0,0 +1,135 @@
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from advisory.models import Crop, MalawiRegion, MarketPrice
+from advisory.services import MarketPriceRollupService
+from ._streaming import read_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream market prices from CSV or JSONL files into the database in batches'
+
+    MAX_PRICE = Decimal('99999999.99')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="CSV or JSONL files (optionally .gz), or '-' for stdin")
+        parser.add_argument('--format', choices=['auto', 'csv', 'jsonl'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--on-conflict', choices=['update', 'skip'], default='update',
+                            help='Update the price of an existing (crop, district, market, date) row or keep it')
+        parser.add_argument('--source', default='Bulk Import', help='Source recorded when a row has none')
+        parser.add_argument('--max-errors', type=int, default=0,
+                            help='Stop after this many rejected rows (0 = never stop)')
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help='Do not rebuild the price rollups of the imported crops')
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing')
+
+    def handle(self, *args, **options):
+        self.crops = {}
+        for crop in Crop.objects.only('id', 'name_en', 'name_ny'):
+            self.crops[crop.name_en.lower()] = crop.id
+            if crop.name_ny:
+                self.crops.setdefault(crop.name_ny.lower(), crop.id)
+        self.districts = {
+            name.lower(): region_id
+            for region_id, name in MalawiRegion.objects.values_list('id', 'name')
+        }
+
+        self.options = options
+        self.read = self.written = self.rejected = 0
+        self.crop_ids = set()
+        started = time.monotonic()
+
+        batch = {}
+        for path in options['files']:
+            try:
+                for line_number, row in read_rows(path, options['format']):
+                    self.read += 1
+                    price = self.build_price(row, path, line_number)
+                    if price is None:
+                        continue
+                    # Later rows for the same market day win, as they would in the database
+                    batch[(price.crop_id, price.location_id, price.market_name, price.date)] = price
+                    if len(batch) >= options['batch_size']:
+                        self.flush(batch, started)
+                        batch = {}
+            except OSError as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+        self.flush(batch, started)
+
+        if self.crop_ids and not options['dry_run'] and not options['skip_rollups']:
+            self.stdout.write('Rebuilding price rollups...')
+            MarketPriceRollupService().rebuild(crop_ids=self.crop_ids)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {self.read} rows, wrote {self.written}, rejected {self.rejected} '
+            f'in {elapsed:.1f}s ({self.read / elapsed:,.0f} rows/s)'
+        ))
+
+    def reject(self, path, line_number, reason):
+        self.rejected += 1
+        if self.rejected <= 20:
+            self.stderr.write(f'{path}:{line_number}: {reason}')
+        max_errors = self.options['max_errors']
+        if max_errors and self.rejected >= max_errors:
+            raise CommandError(f'Stopped after {self.rejected} rejected rows')
+        return None
+
+    def build_price(self, row, path, line_number):
+        """Validate a row and turn it into an unsaved MarketPrice, or reject it"""
+        if '_error' in row:
+            return self.reject(path, line_number, row['_error'])
+
+        crop_id = self.crops.get(str(row.get('crop', '')).strip().lower())
+        if crop_id is None:
+            return self.reject(path, line_number, f"unknown crop {row.get('crop')!r}")
+
+        district = row.get('district', row.get('location', ''))
+        location_id = self.districts.get(str(district).strip().lower())
+        if location_id is None:
+            return self.reject(path, line_number, f'unknown district {district!r}')
+
+        market_name = str(row.get('market', row.get('market_name', ''))).strip()
+        if not market_name or len(market_name) > 100:
+            return self.reject(path, line_number, 'market name missing or too long')
+
+        try:
+            day = datetime.strptime(str(row.get('date', '')).strip(), '%Y-%m-%d').date()
+        except ValueError:
+            return self.reject(path, line_number, f"invalid date {row.get('date')!r}")
+
+        try:
+            price = Decimal(str(row.get('price', row.get('price_per_kg', ''))).strip()).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            return self.reject(path, line_number, f"invalid price {row.get('price')!r}")
+        if not Decimal(0) < price <= self.MAX_PRICE:
+            return self.reject(path, line_number, f'price out of range: {price}')
+
+        source = str(row.get('source') or self.options['source'])[:100]
+        return MarketPrice(
+            crop_id=crop_id, location_id=location_id, market_name=market_name,
+            date=day, price_per_kg=price, source=source,
+        )
+
+    def flush(self, batch, started):
+        if not batch:
+            return
+        prices = list(batch.values())
+        if not self.options['dry_run']:
+            conflict_options = {'ignore_conflicts': True}
+            if self.options['on_conflict'] == 'update':
+                conflict_options = {
+                    'update_conflicts': True,
+                    'unique_fields': ['crop', 'location', 'market_name', 'date'],
+                    'update_fields': ['price_per_kg', 'source', 'updated_at'],
+                }
+            with transaction.atomic():
+                MarketPrice.objects.bulk_create(prices, batch_size=1000, **conflict_options)
+        self.written += len(prices)
+        self.crop_ids.update(price.crop_id for price in prices)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f'  {self.read} rows read, {self.written} written ({self.read / elapsed:,.0f} rows/s)')
@@ -0,0 +1,268 @@
+import math
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from advisory.models import MalawiRegion, WeatherData
+from advisory.services import SeasonTotalsService, WeatherAlertService
+from ._streaming import read_rows
+
+MEASUREMENT_FIELDS = ['temperature_max', 'temperature_min', 'humidity', 'rainfall', 'wind_speed', 'weather_condition']
+
+# Column names used by the station dumps we receive, mapped to model fields
+ALIASES = {
+    'temperature_max': ('temperature_max', 'tmax', 'max_temp'),
+    'temperature_min': ('temperature_min', 'tmin', 'min_temp'),
+    'humidity': ('humidity', 'rh'),
+    'rainfall': ('rainfall', 'rain', 'precipitation', 'prcp'),
+    'wind_speed': ('wind_speed', 'wind'),
+    'weather_condition': ('weather_condition', 'condition'),
+}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+def pick(row, field):
+    for key in ALIASES[field]:
+        value = row.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def derive_condition(rainfall):
+    if rainfall >= 10:
+        return 'Heavy Rain'
+    if rainfall > 0:
+        return 'Light Rain'
+    return 'Sunny'
+
+
+def build_weather(row, location_id):
+    """Validate a row and turn it into an unsaved WeatherData; raises ValueError"""
+    try:
+        day = datetime.strptime(str(row.get('date', '')).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"invalid date {row.get('date')!r}")
+    
+    values = {}
+    for field in ('temperature_max', 'temperature_min', 'humidity', 'rainfall', 'wind_speed'):
+        raw = pick(row, field)
+        if raw is None:
+            if field in ('temperature_max', 'temperature_min', 'humidity'):
+                raise ValueError(f'missing {field}')
+            values[field] = 0.0 if field == 'rainfall' else None
+            continue
+        try:
+            values[field] = float(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f'invalid {field} {raw!r}')
+    
+    if not -10 <= values['temperature_min'] <= values['temperature_max'] <= 55:
+        raise ValueError('temperatures out of range')
+    if not 0 <= values['humidity'] <= 100:
+        raise ValueError('humidity out of range')
+    if values['rainfall'] < 0:
+        raise ValueError('negative rainfall')
+    
+    condition = str(pick(row, 'weather_condition') or derive_condition(values['rainfall']))[:50]
+    return WeatherData(location_id=location_id, date=day, weather_condition=condition, **values)
+
+
+def write_batch(batch, on_conflict):
+    """Upsert a batch keyed by (location, date), honouring unique_together"""
+    conflict_options = {'ignore_conflicts': True}
+    if on_conflict == 'update':
+        conflict_options = {
+            'update_conflicts': True,
+            'unique_fields': ['location', 'date'],
+            # updated_at lets delta sync pick up corrected readings
+            'update_fields': MEASUREMENT_FIELDS + ['updated_at'],
+        }
+    with transaction.atomic():
+        WeatherData.objects.bulk_create(list(batch.values()), batch_size=1000, **conflict_options)
+
+
+def parse_chunk(chunk):
+    """Worker entry point: validate a chunk of rows without touching the database"""
+    parsed, errors = [], []
+    for path, line_number, location_id, row in chunk:
+        try:
+            parsed.append(build_weather(row, location_id))
+        except ValueError as e:
+            errors.append(f'{path}:{line_number}: {e}')
+    return parsed, errors
+
+
+class Command(BaseCommand):
+    help = 'Stream historical weather station files (CSV or JSONL) into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="CSV or JSONL station files (optionally .gz), or '-' for stdin")
+        parser.add_argument('--format', choices=['auto', 'csv', 'jsonl'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--on-conflict', choices=['update', 'skip'], default='update',
+                            help='Overwrite an existing district/day observation or keep it')
+        parser.add_argument('--max-distance', type=float, default=50,
+                            help='Furthest a station may be from a district centre, in km, when matched by coordinates')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Validate rows in this many processes; writes stay in this one')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.districts = list(MalawiRegion.objects.values_list('id', 'name', 'latitude', 'longitude'))
+        self.by_name = {name.lower(): region_id for region_id, name, _, _ in self.districts}
+        self.stations = {}
+        self.read = self.written = self.rejected = 0
+        self.location_ids = set()
+        self.batch = {}
+        started = time.monotonic()
+        
+        if options['workers'] > 1:
+            self.import_parallel()
+        else:
+            self.import_serial()
+        if self.batch:
+            self.flush()
+        
+        self.stdout.write('Rebuilding season totals...')
+        totals = SeasonTotalsService()
+        for location_id in sorted(self.location_ids):
+            totals.rebuild(location_id)
+        
+        # Bulk writes skip signals; today's and forecast rows may still need alerts
+        alerts = WeatherAlertService()
+        upcoming = WeatherData.objects.filter(
+            location_id__in=self.location_ids, date__gte=timezone.now().date()
+        )
+        alerted = sum(len(alerts.fan_out(weather)) for weather in upcoming)
+        if alerted:
+            self.stdout.write(f'Sent {alerted} urgent weather alerts')
+        
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {self.read} rows, wrote {self.written}, rejected {self.rejected} '
+            f'across {len(self.location_ids)} districts in {elapsed:.1f}s ({self.read / elapsed:,.0f} rows/s)'
+        ))
+
+    def report(self, message):
+        self.rejected += 1
+        if self.rejected <= 20:
+            self.stderr.write(message)
+
+    def resolve_location(self, row):
+        """Map a row to a district by district name, station name, then nearest coordinates"""
+        district = str(row.get('district') or '').strip().lower()
+        if district:
+            return self.by_name.get(district)
+        
+        station = str(row.get('station') or '').strip()
+        key = (station.lower(), row.get('latitude'), row.get('longitude'))
+        if key not in self.stations:
+            self.stations[key] = self.match_station(*key)
+        return self.stations[key]
+
+    def match_station(self, station, latitude, longitude):
+        if station in self.by_name:
+            return self.by_name[station]
+        # Station names are usually the district followed by a site, e.g. "Chitedze Lilongwe"
+        for name, region_id in self.by_name.items():
+            if name in station.split() or station.startswith(name):
+                return region_id
+        
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return None
+        best, best_distance = None, self.options['max_distance']
+        for region_id, _, district_lat, district_lon in self.districts:
+            if district_lat is None or district_lon is None:
+                continue
+            distance = haversine_km(latitude, longitude, district_lat, district_lon)
+            if distance <= best_distance:
+                best, best_distance = region_id, distance
+        return best
+
+    def iter_rows(self):
+        """Yield (source, line number, location id, row) for every row of every file"""
+        for path in self.options['files']:
+            try:
+                for line_number, row in read_rows(path, self.options['format']):
+                    self.read += 1
+                    if '_error' in row:
+                        self.report(f"{path}:{line_number}: {row['_error']}")
+                        continue
+                    location_id = self.resolve_location(row)
+                    if location_id is None:
+                        self.report(f"{path}:{line_number}: no district for station "
+                                    f"{row.get('station') or row.get('district')!r}")
+                        continue
+                    yield path, line_number, location_id, row
+            except OSError as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+
+    def import_serial(self):
+        for path, line_number, location_id, row in self.iter_rows():
+            try:
+                weather = build_weather(row, location_id)
+            except ValueError as e:
+                self.report(f'{path}:{line_number}: {e}')
+                continue
+            self.add(weather)
+
+    def add(self, weather):
+        self.batch[(weather.location_id, weather.date)] = weather
+        self.location_ids.add(weather.location_id)
+        if len(self.batch) >= self.options['batch_size']:
+            self.flush()
+
+    def flush(self):
+        write_batch(self.batch, self.options['on_conflict'])
+        self.written += len(self.batch)
+        self.batch = {}
+        self.stdout.write(f'  {self.read} rows read, {self.written} written')
+
+    def iter_chunks(self):
+        chunk = []
+        for item in self.iter_rows():
+            chunk.append(item)
+            if len(chunk) >= self.options['batch_size']:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def collect(self, future):
+        parsed, errors = future.result()
+        for message in errors:
+            self.report(message)
+        for weather in parsed:
+            self.add(weather)
+
+    def import_parallel(self):
+        """Validate rows in a process pool while this process writes them.
+        
+        Workers never open the database, so there is still a single writer
+        (SQLite allows no more). Chunks are collected in the order they were
+        read, so a later row for the same district and day still wins.
+        """
+        # Connections must not be shared with the forked workers
+        connections.close_all()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.options['workers'], initializer=django.setup) as pool:
+            for chunk in self.iter_chunks():
+                pending.append(pool.submit(parse_chunk, chunk))
+                # Bound the chunks held in memory while the writer catches up
+                if len(pending) > 2 * self.options['workers']:
+                    self.collect(pending.popleft())
+            while pending:
+                self.collect(pending.popleft())
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from advisory.benchmarks import percentile
+
+
+class HttpConnection:
+    """Minimal HTTP/1.1 client connection; reconnects when the server closes (gunicorn sync workers do)"""
+    
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+    
+    async def request(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: application/json\r\n\r\n'.encode()
+        )
+        await self.writer.drain()
+        
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.read()
+            headers['connection'] = 'close'
+        
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+    
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = 'Hold many concurrent connections against a running server and report latency and throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Full URLs, e.g. http://127.0.0.1:8000/api/weather/1/')
+        parser.add_argument('--concurrency', default='10,50,100,200',
+                            help='Comma-separated numbers of concurrent connections to try in turn')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per concurrency level')
+        parser.add_argument('--timeout', type=float, default=10, help='Per-request timeout in seconds')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        targets = []
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f'Only plain http:// URLs are supported: {url}')
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            targets.append((parts.hostname, parts.port or 80, path))
+        
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        results = []
+        self.stdout.write(f"{'conns':>6} {'reqs':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'p99 ms':>9} {'errors':>7} {'timeouts':>8}")
+        for level in levels:
+            result = asyncio.run(self.run_level(targets, level, options['duration'], options['timeout']))
+            results.append(result)
+            self.stdout.write(
+                f"{level:>6} {result['requests']:>8} {result['throughput_rps']:>8.1f} {result['p50_ms']:>9.1f} "
+                f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['errors']:>7} {result['timeouts']:>8}"
+            )
+        
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({'urls': options['urls'], 'levels': results}, handle, indent=2)
+
+    async def run_level(self, targets, concurrency, duration, timeout):
+        latencies = []
+        counts = {'errors': 0, 'timeouts': 0}
+        deadline = time.monotonic() + duration
+        
+        async def client(index):
+            host, port, path = targets[index % len(targets)]
+            connection = HttpConnection(host, port)
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        status = await asyncio.wait_for(connection.request(path), timeout)
+                    except asyncio.TimeoutError:
+                        counts['timeouts'] += 1
+                        await connection.close()
+                        continue
+                    except (OSError, ConnectionError, ValueError, IndexError, asyncio.IncompleteReadError):
+                        counts['errors'] += 1
+                        await connection.close()
+                        await asyncio.sleep(0.05)
+                        continue
+                    if status >= 400:
+                        counts['errors'] += 1
+                    else:
+                        latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                await connection.close()
+        
+        started = time.monotonic()
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+        elapsed = time.monotonic() - started
+        
+        latencies.sort()
+        return {
+            'concurrency': concurrency,
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            **counts,
+        }
@@ -238,7 +238,6 @@ class Command(BaseCommand):
     def create_farming_calendar(self):
         """Create farming calendar entries"""
         crops = Crop.objects.all()
-        regions = MalawiRegion.objects.all()
         
         # Sample farming activities by month for different crops
         calendar_activities = {
@@ -287,25 +286,27 @@ class Command(BaseCommand):
             }
         }
         
+        # Activities are the same everywhere, so they are stored once at the
+        # national level; regions and districts only get rows where they differ
         created_count = 0
         for crop in crops:
             if crop.name_en in calendar_activities:
                 activities = calendar_activities[crop.name_en]
-                for region in regions:
-                    for month, (activity_en, activity_ny) in activities.items():
-                        calendar_entry, created = FarmingCalendar.objects.get_or_create(
-                            crop=crop,
-                            region=region,
-                            month=month,
-                            defaults={
-                                'activity_en': activity_en,
-                                'activity_ny': activity_ny,
-                                'description_en': f'{activity_en} for {crop.name_en} in {region.name}',
-                                'description_ny': f'{activity_ny} wa {crop.name_ny or crop.name_en} ku {region.name}',
-                            }
-                        )
-                        if created:
-                            created_count += 1
+                for month, (activity_en, activity_ny) in activities.items():
+                    calendar_entry, created = FarmingCalendar.objects.get_or_create(
+                        crop=crop,
+                        region_group='',
+                        region=None,
+                        month=month,
+                        defaults={
+                            'activity_en': activity_en,
+                            'activity_ny': activity_ny,
+                            'description_en': f'{activity_en} for {crop.name_en}',
+                            'description_ny': f'{activity_ny} wa {crop.name_ny or crop.name_en}',
+                        }
+                    )
+                    if created:
+                        created_count += 1
         
         self.stdout.write(self.style.SUCCESS(f'Created {created_count} farming calendar entries'))
 
@@ -314,8 +315,9 @@ class Command(BaseCommand):
         regions = MalawiRegion.objects.all()
         created_count = 0
         
-        # Create weather data for the last 30 days
-        for i in range(30):
+        # Create weather data for the last 30 days, oldest first so the
+        # district running totals are extended rather than rebuilt
+        for i in reversed(range(30)):
             current_date = date.today() - timedelta(days=i)
             current_month = current_date.month
             
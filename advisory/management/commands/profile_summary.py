@@ -0,0 +1,78 @@
+import json
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from advisory.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = 'Summarize the request profiling records: slowest views, query counts and sampled profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=str(settings.REQUEST_PROFILING_DIR), help='Profiling directory')
+        parser.add_argument('--limit', type=int, default=15, help='Number of views to show')
+        parser.add_argument('--since', type=float, help='Only include requests from the last N minutes')
+        parser.add_argument('--sort', choices=['p95', 'p50', 'max', 'total', 'queries'], default='p95')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'])
+        files = sorted(directory.glob('requests-*.jsonl'))
+        if not files:
+            raise CommandError(f'No profiling records in {directory}; set REQUEST_PROFILING=1 first')
+        
+        cutoff = time.time() - options['since'] * 60 if options['since'] else None
+        by_view = defaultdict(list)
+        for path in files:
+            with open(path) as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if cutoff and record['time'] < cutoff:
+                        continue
+                    by_view[record['view'] or record['path']].append(record)
+        
+        summary = []
+        for view, records in by_view.items():
+            totals = sorted(record['total_ms'] for record in records)
+            profiles = sorted(
+                (record for record in records if record.get('profile')),
+                key=lambda record: record['total_ms'], reverse=True,
+            )
+            summary.append({
+                'view': view,
+                'requests': len(records),
+                'p50_ms': round(percentile(totals, 50), 2),
+                'p95_ms': round(percentile(totals, 95), 2),
+                'max_ms': round(totals[-1], 2),
+                'total_ms': round(sum(totals), 2),
+                'queries': round(statistics.fmean(record['sql_count'] for record in records), 1),
+                'sql_ms': round(statistics.fmean(record['sql_ms'] for record in records), 2),
+                'template_ms': round(statistics.fmean(record['template_ms'] for record in records), 2),
+                'slowest_profiles': [record['profile'] for record in profiles[:3]],
+            })
+        
+        sort_key = {'p95': 'p95_ms', 'p50': 'p50_ms', 'max': 'max_ms', 'total': 'total_ms', 'queries': 'queries'}
+        summary.sort(key=lambda row: row[sort_key[options['sort']]], reverse=True)
+        summary = summary[:options['limit']]
+        
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        
+        self.stdout.write(
+            f"{'view':<32} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+            f"{'queries':>8} {'sql ms':>8} {'tpl ms':>8}"
+        )
+        for row in summary:
+            self.stdout.write(
+                f"{row['view'][:32]:<32} {row['requests']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                f"{row['max_ms']:>9.1f} {row['queries']:>8.1f} {row['sql_ms']:>8.1f} {row['template_ms']:>8.1f}"
+            )
+            for profile in row['slowest_profiles']:
+                self.stdout.write(f'    {directory / profile}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from advisory.services import MarketPriceRollupService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily and weekly market price rollups from raw prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crop', type=int, action='append', dest='crop_ids',
+                            help='Only rebuild rollups for this crop id (repeatable)')
+
+    def handle(self, *args, **options):
+        count = MarketPriceRollupService().rebuild(crop_ids=options['crop_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} market price rollups'))
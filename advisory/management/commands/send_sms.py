@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from advisory.services import WeatherAlertService
+from advisory.sms import SmsDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Send urgent weather alerts and queued SMS to the configured gateways, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when nothing is due instead of polling for new messages')
+        parser.add_argument('--poll-interval', type=float, default=2,
+                            help='Seconds to wait between polls when the queue is empty')
+
+    def handle(self, *args, **options):
+        dispatcher = SmsDispatcher()
+        alerts = WeatherAlertService()
+
+        def send_alerts():
+            created = alerts.fan_out_pending()
+            if created:
+                self.stdout.write(f'Created {len(created)} urgent weather alerts')
+            return len(created)
+
+        try:
+            totals = dispatcher.run(
+                poll_interval=options['poll_interval'], once=options['once'], stdout=self.stdout,
+                before_round=send_alerts,
+            )
+        except KeyboardInterrupt:
+            return
+        summary = ', '.join(f'{count} {result}' for result, count in sorted(totals.items())) or 'nothing due'
+        self.stdout.write(self.style.SUCCESS(f'Done: {summary}'))
@@ -0,0 +1,91 @@
+"""Prometheus metrics for the advisory app.
+
+Under gunicorn every worker is a separate process, so set
+PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py): each worker then writes its
+samples to files in that directory and /metrics merges them on every scrape.
+"""
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'crop_advisor_request_duration_seconds',
+    'Request latency by URL name',
+    ['url_name', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'crop_advisor_requests_total',
+    'Requests by URL name and status class',
+    ['url_name', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'crop_advisor_request_db_queries',
+    'Database queries per request by URL name',
+    ['url_name'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 200),
+)
+CACHE_LOOKUPS = Counter(
+    'crop_advisor_cache_lookups_total',
+    'Cache lookups; hit ratio = hit / (hit + miss)',
+    ['cache', 'result'],
+)
+ADVICE_DURATION = Histogram(
+    'crop_advisor_advice_generation_seconds',
+    'AdvisoryService.generate_advice duration by advice type',
+    ['advice_type', 'outcome'],
+    buckets=LATENCY_BUCKETS,
+)
+ALERT_STREAMS = Gauge(
+    'crop_advisor_alert_streams',
+    'Open server-sent alert streams',
+    multiprocess_mode='livesum',
+)
+WEATHER_ALERTS = Counter(
+    'crop_advisor_weather_alerts_total',
+    'Urgent weather advice created for farmers in affected districts',
+)
+SMS_MESSAGES = Counter(
+    'crop_advisor_sms_messages_total',
+    'Outbound SMS send attempts by gateway and outcome: sent, rejected, retry or failed',
+    ['gateway', 'result'],
+)
+WEATHER_LOOKUPS = Counter(
+    'crop_advisor_weather_lookups_total',
+    'Current weather lookups: stored, generated (mock) or error',
+    ['result'],
+)
+
+
+WRITE_BEHIND_PENDING = Gauge(
+    'crop_advisor_write_behind_pending',
+    'Coalesced updates waiting for the next write-behind flush',
+    multiprocess_mode='livesum',
+)
+WRITE_BEHIND_WRITES = Counter(
+    'crop_advisor_write_behind_writes_total',
+    'Buffered updates: queued, coalesced into a pending one, or flushed',
+    ['result'],
+)
+WRITE_BEHIND_FLUSH = Histogram(
+    'crop_advisor_write_behind_flush_seconds',
+    'Duration of write-behind flush transactions by outcome',
+    ['outcome'],
+    buckets=LATENCY_BUCKETS,
+)
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.labels(cache_name, 'hit' if hit else 'miss').inc()
+
+
+def render_metrics():
+    """Metrics in the Prometheus text format, merged across worker processes"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
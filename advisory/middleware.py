@@ -0,0 +1,333 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+from .metrics import REQUEST_LATENCY, REQUEST_QUERIES, REQUESTS
+from .models import Farmer
+from .writebehind import write_behind
+
+logger = logging.getLogger(__name__)
+
+# Timings for the request being handled in this thread (None outside one)
+_current_timings = ContextVar('request_profiling_timings', default=None)
+
+# Query count of the request being handled, for MetricsMiddleware
+_query_counter = ContextVar('request_query_counter', default=None)
+
+
+def _instrument_templates():
+    """Time top-level template renders; includes and extends happen inside them"""
+    if getattr(DjangoTemplate.render, '_profiled', False):
+        return
+    original_render = DjangoTemplate.render
+    
+    def render(self, context=None, request=None):
+        timings = _current_timings.get()
+        if timings is None:
+            return original_render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            timings['template_ms'] += (time.perf_counter() - started) * 1000
+    
+    render._profiled = True
+    DjangoTemplate.render = render
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+    
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+    
+    def write(self, path):
+        # Brendan Gregg's folded format: read by flamegraph.pl, inferno and speedscope
+        with open(path, 'w') as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f'{stack} {count}\n')
+
+
+class RequestProfilingMiddleware:
+    """Records SQL count and time, template time and total time for every request.
+    
+    A REQUEST_PROFILING_SAMPLE_RATE fraction of requests is also profiled,
+    either by stack sampling (folded stacks for flame graphs) or cProfile
+    (.prof files for snakeviz and pstats), and written to
+    REQUEST_PROFILING_DIR. The middleware removes itself when
+    REQUEST_PROFILING_ENABLED is off. It is sync only, so enabling it under
+    ASGI serializes requests; profile under runserver or gunicorn.
+    """
+    
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        self.mode = settings.REQUEST_PROFILING_MODE
+        self.directory = Path(settings.REQUEST_PROFILING_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        _instrument_templates()
+    
+    def __call__(self, request):
+        timings = {'sql_count': 0, 'sql_ms': 0.0, 'template_ms': 0.0}
+        
+        def record_sql(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings['sql_count'] += 1
+                timings['sql_ms'] += (time.perf_counter() - started) * 1000
+        
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        profiler = sampler = None
+        if sampled and self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+        elif sampled:
+            sampler = StackSampler(threading.get_ident(), settings.REQUEST_PROFILING_INTERVAL)
+        
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_sql))
+                if profiler:
+                    profiler.enable()
+                elif sampler:
+                    sampler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler:
+                        profiler.disable()
+                    elif sampler:
+                        sampler.stop()
+        finally:
+            _current_timings.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        
+        match = request.resolver_match
+        record = {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            'sql_count': timings['sql_count'],
+            'sql_ms': round(timings['sql_ms'], 3),
+            'template_ms': round(timings['template_ms'], 3),
+            'profile': None,
+        }
+        if profiler or sampler:
+            record['profile'] = self._write_profile(record, profiler, sampler)
+        self._write_record(record)
+        
+        response['Server-Timing'] = (
+            f"db;desc=\"{timings['sql_count']} queries\";dur={timings['sql_ms']:.1f}, "
+            f"tpl;dur={timings['template_ms']:.1f}, total;dur={total_ms:.1f}"
+        )
+        return response
+    
+    def _write_profile(self, record, profiler, sampler):
+        view = (record['view'] or 'unresolved').replace(':', '-')
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{uuid.uuid4().hex[:8]}"
+        try:
+            if profiler:
+                path = self.directory / f'{name}.prof'
+                profiler.dump_stats(path)
+            else:
+                path = self.directory / f'{name}.folded'
+                sampler.write(path)
+        except OSError as e:
+            logger.warning('Could not write profile %s: %s', name, e)
+            return None
+        return path.name
+    
+    def _write_record(self, record):
+        # One file per process so concurrent workers never interleave lines
+        path = self.directory / f'requests-{os.getpid()}.jsonl'
+        try:
+            with self._lock, open(path, 'a') as handle:
+                handle.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logger.warning('Could not write request profile record: %s', e)
+
+
+class MetricsMiddleware:
+    """Feeds request latency, status and query count per URL name to the metrics endpoint"""
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened later are covered by connection_created
+        _install_query_counter(connections.all())
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _install_query_counter(connections.all())
+        counter = {'queries': 0}
+        started = time.perf_counter()
+        token = _query_counter.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        self._record(request, response, counter['queries'], time.perf_counter() - started)
+        return response
+    
+    async def __acall__(self, request):
+        # The view's ORM calls run in sync_to_async threads with their own
+        # connections; those threads inherit this context, counter included
+        counter = {'queries': 0}
+        started = time.perf_counter()
+        token = _query_counter.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        self._record(request, response, counter['queries'], time.perf_counter() - started)
+        return response
+    
+    def _record(self, request, response, queries, duration):
+        # URL names, not paths, keep the number of series bounded
+        match = request.resolver_match
+        url_name = (match.view_name if match else None) or 'unmatched'
+        REQUEST_LATENCY.labels(url_name, request.method).observe(duration)
+        REQUESTS.labels(url_name, request.method, f'{response.status_code // 100}xx').inc()
+        REQUEST_QUERIES.labels(url_name).observe(queries)
+
+
+class LastSeenMiddleware:
+    """Records when each farmer was last active, through the write-behind buffer.
+    
+    Only requests that already loaded the user count: resolving it here
+    would read the session of pages that are meant to stay cacheable.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._record(request)
+        return response
+    
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self._record(request)
+        return response
+    
+    def _record(self, request):
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            return
+        if user is not None and user.is_authenticated:
+            # Minutes are precise enough and let a flush update everyone seen in one
+            last_seen = timezone.now().replace(second=0, microsecond=0)
+            write_behind.set(Farmer, user.pk, key_field='user_id', last_seen=last_seen)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter['queries'] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(connections_to_wrap):
+    """Count queries on these connections for whichever request's context runs them"""
+    for connection in connections_to_wrap:
+        if _count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_query)
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kwargs):
+    # Every thread gets its own connections, including sync_to_async's
+    _install_query_counter([connection])
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise that can also sit in an async middleware chain.
+    
+    A sync-only middleware makes Django run the whole request through one
+    shared thread under ASGI, which would serialize the async API views.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+    
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farmingcalendar',
+            index=models.Index(fields=['month', 'region', 'crop'], name='calendar_month_region_crop_idx'),
+        ),
+    ]
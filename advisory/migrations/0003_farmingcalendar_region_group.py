@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter, defaultdict
+
+
+def collapse_district_entries(apps, schema_editor):
+    """
+    Replace per-district copies of the same activity with one national entry,
+    a regional entry where a whole region agrees on something else, and
+    district overrides only where a district still differs.
+    """
+    FarmingCalendar = apps.get_model('advisory', 'FarmingCalendar')
+    MalawiRegion = apps.get_model('advisory', 'MalawiRegion')
+    Crop = apps.get_model('advisory', 'Crop')
+    
+    groups = {district.id: district.region for district in MalawiRegion.objects.all()}
+    crops = {crop.id: crop for crop in Crop.objects.all()}
+    
+    entries = defaultdict(list)
+    for entry in FarmingCalendar.objects.filter(region__isnull=False):
+        entries[(entry.crop_id, entry.month)].append(entry)
+    
+    for (crop_id, month), district_entries in entries.items():
+        crop = crops[crop_id]
+        activity = lambda entry: (entry.activity_en, entry.activity_ny)
+        
+        national = Counter(map(activity, district_entries)).most_common(1)[0][0]
+        FarmingCalendar.objects.create(
+            crop_id=crop_id, month=month, region_group='',
+            activity_en=national[0], activity_ny=national[1],
+            description_en=f'{national[0]} for {crop.name_en}',
+            description_ny=f'{national[1]} wa {crop.name_ny or crop.name_en}',
+        )
+        
+        by_group = defaultdict(list)
+        for entry in district_entries:
+            by_group[groups[entry.region_id]].append(entry)
+        
+        for group, group_entries in by_group.items():
+            inherited = national
+            common = Counter(map(activity, group_entries)).most_common(1)[0][0]
+            if common != national:
+                FarmingCalendar.objects.create(
+                    crop_id=crop_id, month=month, region_group=group,
+                    activity_en=common[0], activity_ny=common[1],
+                    description_en=f'{common[0]} for {crop.name_en}',
+                    description_ny=f'{common[1]} wa {crop.name_ny or crop.name_en}',
+                )
+                inherited = common
+            
+            redundant = [entry.id for entry in group_entries if activity(entry) == inherited]
+            FarmingCalendar.objects.filter(id__in=redundant).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0002_farmingcalendar_month_region_crop_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmingcalendar',
+            name='region_group',
+            field=models.CharField(blank=True, choices=[('northern', 'Northern Region'), ('central', 'Central Region'), ('southern', 'Southern Region')], max_length=20, verbose_name='Region'),
+        ),
+        migrations.AlterField(
+            model_name='farmingcalendar',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='advisory.malawiregion', verbose_name='District'),
+        ),
+        migrations.RunPython(collapse_district_entries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='farmingcalendar',
+            constraint=models.UniqueConstraint(condition=models.Q(('region__isnull', True)), fields=('crop', 'region_group', 'month'), name='calendar_unique_group_entry'),
+        ),
+    ]
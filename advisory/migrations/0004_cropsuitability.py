@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0003_farmingcalendar_region_group'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CropSuitability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Suitability Score')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('crop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='advisory.crop')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='advisory.malawiregion')),
+            ],
+            options={
+                'verbose_name': 'Crop Suitability',
+                'verbose_name_plural': 'Crop Suitability',
+                'indexes': [models.Index(fields=['region', '-score'], name='suitability_region_score_idx')],
+                'unique_together': {('crop', 'region')},
+            },
+        ),
+    ]
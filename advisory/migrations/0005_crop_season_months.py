@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:55
+
+from django.db import migrations, models
+from advisory.seasons import season_month_mask
+
+
+def parse_season_months(apps, schema_editor):
+    Crop = apps.get_model('advisory', 'Crop')
+    for crop in Crop.objects.all():
+        crop.planting_months = season_month_mask(crop.planting_season)
+        crop.harvest_months = season_month_mask(crop.harvest_season)
+        crop.save(update_fields=['planting_months', 'harvest_months'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0004_cropsuitability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crop',
+            name='harvest_months',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='crop',
+            name='planting_months',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(parse_season_months, migrations.RunPython.noop),
+    ]
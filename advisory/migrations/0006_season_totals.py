@@ -0,0 +1,105 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import date
+
+
+def build_season_totals(apps, schema_editor):
+    """Fill the running totals for weather recorded before they existed"""
+    WeatherData = apps.get_model('advisory', 'WeatherData')
+    DistrictSeasonTotals = apps.get_model('advisory', 'DistrictSeasonTotals')
+    
+    location_ids = WeatherData.objects.order_by().values_list('location_id', flat=True).distinct()
+    for location_id in location_ids:
+        rows = list(WeatherData.objects.filter(location_id=location_id).order_by('date'))
+        totals = DistrictSeasonTotals(location_id=location_id)
+        for row in rows:
+            year = row.date.year if row.date.month >= 10 else row.date.year - 1
+            season_start = date(year, 10, 1)
+            if season_start != totals.season_start:
+                totals.season_start = season_start
+                totals.season_gdd = totals.season_rainfall = 0
+                totals.season_days = 0
+            
+            row.growing_degree_days = max(0.0, (row.temperature_max + row.temperature_min) / 2 - 10)
+            totals.total_gdd += row.growing_degree_days
+            totals.total_rainfall += row.rainfall
+            totals.total_days += 1
+            totals.season_gdd += row.growing_degree_days
+            totals.season_rainfall += row.rainfall
+            totals.season_days += 1
+            row.cumulative_gdd = totals.total_gdd
+            row.cumulative_rainfall = totals.total_rainfall
+            row.cumulative_days = totals.total_days
+        
+        WeatherData.objects.bulk_update(
+            rows, ['growing_degree_days', 'cumulative_gdd', 'cumulative_rainfall', 'cumulative_days'],
+            batch_size=500
+        )
+        totals.last_date = rows[-1].date
+        totals.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0005_crop_season_months'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherdata',
+            name='cumulative_days',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='weatherdata',
+            name='cumulative_gdd',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='weatherdata',
+            name='cumulative_rainfall',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='weatherdata',
+            name='growing_degree_days',
+            field=models.FloatField(default=0, editable=False, verbose_name='Growing Degree Days'),
+        ),
+        migrations.CreateModel(
+            name='DistrictSeasonTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_date', models.DateField(verbose_name='Last Weather Date')),
+                ('total_gdd', models.FloatField(default=0)),
+                ('total_rainfall', models.FloatField(default=0)),
+                ('total_days', models.IntegerField(default=0)),
+                ('season_start', models.DateField(verbose_name='Season Start')),
+                ('season_gdd', models.FloatField(default=0, verbose_name='Season Growing Degree Days')),
+                ('season_rainfall', models.FloatField(default=0, verbose_name='Season Rainfall (mm)')),
+                ('season_days', models.IntegerField(default=0, verbose_name='Days Recorded This Season')),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='season_totals', to='advisory.malawiregion')),
+            ],
+            options={
+                'verbose_name': 'District Season Totals',
+                'verbose_name_plural': 'District Season Totals',
+            },
+        ),
+        migrations.CreateModel(
+            name='CropPlanting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('planting_date', models.DateField(verbose_name='Planting Date')),
+                ('crop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='advisory.crop')),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plantings', to='advisory.farmer')),
+            ],
+            options={
+                'verbose_name': 'Crop Planting',
+                'verbose_name_plural': 'Crop Plantings',
+                'unique_together': {('farmer', 'crop')},
+            },
+        ),
+        migrations.RunPython(build_season_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0006_season_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketPriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('market_name', models.CharField(max_length=100, verbose_name='Market Name')),
+                ('period', models.CharField(choices=[('day', 'Daily'), ('week', 'Weekly')], max_length=4, verbose_name='Period')),
+                ('period_start', models.DateField(verbose_name='Period Start')),
+                ('price_count', models.IntegerField(default=0, verbose_name='Prices Recorded')),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Min Price (MWK)')),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Max Price (MWK)')),
+                ('rolling_avg_7d', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='7-day Average (MWK)')),
+                ('rolling_avg_30d', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='30-day Average (MWK)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('crop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='advisory.crop')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='advisory.malawiregion')),
+            ],
+            options={
+                'verbose_name': 'Market Price Rollup',
+                'verbose_name_plural': 'Market Price Rollups',
+                'ordering': ['-period_start'],
+                'indexes': [models.Index(fields=['crop', 'period', 'period_start'], name='rollup_crop_period_idx')],
+                'unique_together': {('crop', 'location', 'market_name', 'period', 'period_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:59
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_prices(apps, schema_editor):
+    """Keep only the latest price per crop, district, market and day"""
+    MarketPrice = apps.get_model('advisory', 'MarketPrice')
+    duplicates = (
+        MarketPrice.objects.order_by()
+        .values('crop_id', 'location_id', 'market_name', 'date')
+        .annotate(rows=Count('id'), latest_id=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates.iterator():
+        MarketPrice.objects.filter(
+            crop_id=group['crop_id'], location_id=group['location_id'],
+            market_name=group['market_name'], date=group['date'],
+        ).exclude(id=group['latest_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0007_marketpricerollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_prices, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='marketprice',
+            unique_together={('crop', 'location', 'market_name', 'date')},
+        ),
+    ]
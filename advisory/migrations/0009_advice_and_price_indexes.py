@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0008_marketprice_unique_market_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cropadvice',
+            index=models.Index(fields=['farmer', 'created_at'], name='advice_farmer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cropadvice',
+            index=models.Index(fields=['created_at'], name='advice_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketprice',
+            index=models.Index(fields=['crop', 'location', 'date'], name='price_crop_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketprice',
+            index=models.Index(fields=['crop', 'date'], name='price_crop_date_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0009_advice_and_price_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=16, verbose_name='Phone Number')),
+                ('language', models.CharField(choices=[('en', 'English'), ('ny', 'Chichewa')], max_length=2, verbose_name='Language')),
+                ('body', models.TextField(verbose_name='Message')),
+                ('segments', models.PositiveSmallIntegerField(default=1, verbose_name='Segments')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='queued', max_length=10, verbose_name='Status')),
+                ('gateway', models.CharField(blank=True, max_length=50, verbose_name='Gateway')),
+                ('gateway_message_id', models.CharField(blank=True, max_length=100, verbose_name='Gateway Message ID')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.CharField(blank=True, max_length=200, verbose_name='Last Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('advice', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sms', to='advisory.cropadvice')),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='advisory.farmer')),
+            ],
+            options={
+                'verbose_name': 'Outbound SMS',
+                'verbose_name_plural': 'Outbound SMS',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='sms_due_idx'), models.Index(fields=['gateway_message_id'], name='sms_gateway_message_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0010_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='farmer',
+            name='phone_number',
+            field=models.CharField(db_index=True, max_length=15, verbose_name='Phone Number'),
+        ),
+    ]
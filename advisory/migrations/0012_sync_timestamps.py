@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:52
+
+from datetime import datetime, time, timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Spread existing rows over their own dates instead of leaving them all
+    # stamped with the moment the migration ran
+    apps.get_model('advisory', 'CropAdvice').objects.update(updated_at=F('created_at'))
+    for name in ('WeatherData', 'MarketPrice'):
+        model = apps.get_model('advisory', name)
+        for day in model.objects.values_list('date', flat=True).distinct().order_by():
+            model.objects.filter(date=day).update(updated_at=datetime.combine(day, time.min, timezone.utc))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0011_farmer_phone_number_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cropadvice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='farmingcalendar',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='marketprice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='weatherdata',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cropadvice',
+            index=models.Index(fields=['farmer', 'updated_at'], name='advice_farmer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmingcalendar',
+            index=models.Index(fields=['updated_at'], name='calendar_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketprice',
+            index=models.Index(fields=['crop', 'updated_at'], name='price_crop_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weatherdata',
+            index=models.Index(fields=['location', 'updated_at'], name='weather_location_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedrecord',
+            index=models.Index(fields=['model', 'deleted_at'], name='deleted_model_time_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0012_sync_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_hash', models.CharField(max_length=64)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('farmer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='claim', to='advisory.farmer')),
+            ],
+            options={
+                'verbose_name': 'Account Claim',
+                'verbose_name_plural': 'Account Claims',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0013_account_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crop',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Views'),
+        ),
+        migrations.AddField(
+            model_name='farmer',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last Seen'),
+        ),
+    ]
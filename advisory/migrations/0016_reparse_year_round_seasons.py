@@ -0,0 +1,24 @@
+from django.db import migrations
+from advisory.seasons import season_month_mask
+
+
+def reparse_season_months(apps, schema_editor):
+    # "All year" and "Throughout the year" used to parse to no months at all
+    Crop = apps.get_model('advisory', 'Crop')
+    for crop in Crop.objects.all():
+        planting_months = season_month_mask(crop.planting_season)
+        harvest_months = season_month_mask(crop.harvest_season)
+        if (planting_months, harvest_months) != (crop.planting_months, crop.harvest_months):
+            crop.planting_months, crop.harvest_months = planting_months, harvest_months
+            crop.save(update_fields=['planting_months', 'harvest_months'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0015_cache_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(reparse_season_months, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0016_reparse_year_round_seasons'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletedrecord',
+            name='crop_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deletedrecord',
+            name='location_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0017_deletedrecord_scope'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherdata',
+            name='alert_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='weatherdata',
+            index=models.Index(condition=models.Q(('alert_pending', True)), fields=['date'], name='weather_alert_pending_idx'),
+        ),
+    ]
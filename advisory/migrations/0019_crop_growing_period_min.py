@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:59
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0018_weather_alert_pending'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='crop',
+            name='growing_period_days',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Growing Period (days)'),
+        ),
+    ]
@@ -1,6 +1,11 @@
+from decimal import Decimal
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
 from django.utils.translation import gettext_lazy as _
+from .seasons import month_bit, season_month_mask
 
 class MalawiRegion(models.Model):
     """Malawi administrative regions and districts"""
@@ -24,6 +29,24 @@ class MalawiRegion(models.Model):
     def __str__(self):
         return f"{self.name} - {self.get_region_display()}"
 
+class CropQuerySet(models.QuerySet):
+    """Crop lookups by season using the parsed month masks"""
+    
+    def _in_month(self, field, month, region=None):
+        crops = self.alias(**{f'{field}_bit': models.F(field).bitand(month_bit(month))})
+        crops = crops.filter(**{f'{field}_bit__gt': 0})
+        if region is not None:
+            crops = crops.filter(suitable_regions=region)
+        return crops
+    
+    def plantable_in(self, month, region=None):
+        """Crops that can be planted in a month, optionally in a district"""
+        return self._in_month('planting_months', month, region)
+    
+    def harvestable_in(self, month, region=None):
+        """Crops that are harvested in a month, optionally in a district"""
+        return self._in_month('harvest_months', month, region)
+
 class Crop(models.Model):
     """Available crops for Malawi"""
     CROP_TYPES = [
@@ -43,8 +66,15 @@ class Crop(models.Model):
     harvest_season = models.CharField(max_length=100, verbose_name=_('Harvest Season'))
     water_requirement = models.CharField(max_length=50, verbose_name=_('Water Requirement'))
     soil_type = models.TextField(verbose_name=_('Suitable Soil Types'))
-    growing_period_days = models.IntegerField(verbose_name=_('Growing Period (days)'))
+    growing_period_days = models.IntegerField(verbose_name=_('Growing Period (days)'), validators=[MinValueValidator(1)])
     suitable_regions = models.ManyToManyField(MalawiRegion, verbose_name=_('Suitable Regions'))
+    # 12-bit month masks parsed from the season texts (bit 0 is January)
+    planting_months = models.PositiveSmallIntegerField(default=0, editable=False)
+    harvest_months = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Detail page views, counted through the write-behind buffer
+    view_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Views'))
+    
+    objects = CropQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('Crop')
@@ -52,6 +82,32 @@ class Crop(models.Model):
     
     def __str__(self):
         return self.name_en
+    
+    def save(self, *args, **kwargs):
+        self.planting_months = season_month_mask(self.planting_season)
+        self.harvest_months = season_month_mask(self.harvest_season)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'planting_months', 'harvest_months'}
+        super().save(*args, **kwargs)
+
+class CropSuitability(models.Model):
+    """Precomputed suitability score of a crop in a district (0-100)"""
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
+    region = models.ForeignKey(MalawiRegion, on_delete=models.CASCADE)
+    score = models.FloatField(verbose_name=_('Suitability Score'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Crop Suitability')
+        verbose_name_plural = _('Crop Suitability')
+        unique_together = ['crop', 'region']
+        indexes = [
+            models.Index(fields=['region', '-score'], name='suitability_region_score_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.crop} in {self.region.name}: {self.score}"
 
 class Farmer(models.Model):
     """Farmer profile"""
@@ -61,12 +117,14 @@ class Farmer(models.Model):
     ]
     
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    phone_number = models.CharField(max_length=15, verbose_name=_('Phone Number'))
+    phone_number = models.CharField(max_length=15, db_index=True, verbose_name=_('Phone Number'))
     location = models.ForeignKey(MalawiRegion, on_delete=models.SET_NULL, null=True, verbose_name=_('Location'))
     farm_size_acres = models.FloatField(verbose_name=_('Farm Size (acres)'))
     preferred_language = models.CharField(max_length=2, choices=LANGUAGE_CHOICES, default='en', verbose_name=_('Preferred Language'))
     primary_crops = models.ManyToManyField(Crop, verbose_name=_('Primary Crops'), blank=True)
     registration_date = models.DateTimeField(auto_now_add=True)
+    # To the minute, written behind by LastSeenMiddleware
+    last_seen = models.DateTimeField(null=True, blank=True, editable=False, verbose_name=_('Last Seen'))
     
     class Meta:
         verbose_name = _('Farmer')
@@ -85,16 +143,64 @@ class WeatherData(models.Model):
     rainfall = models.FloatField(default=0, verbose_name=_('Rainfall (mm)'))
     wind_speed = models.FloatField(null=True, blank=True, verbose_name=_('Wind Speed (km/h)'))
     weather_condition = models.CharField(max_length=50, verbose_name=_('Weather Condition'))
+    # Filled in by SeasonTotalsService as rows arrive; the cumulative values
+    # are running totals for the district, so any period is a subtraction
+    growing_degree_days = models.FloatField(default=0, editable=False, verbose_name=_('Growing Degree Days'))
+    cumulative_gdd = models.FloatField(default=0, editable=False)
+    cumulative_rainfall = models.FloatField(default=0, editable=False)
+    cumulative_days = models.IntegerField(default=0, editable=False)
+    # Urgent rows for today or later wait here for send_sms to alert farmers
+    alert_pending = models.BooleanField(default=False, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = _('Weather Data')
         verbose_name_plural = _('Weather Data')
         unique_together = ['location', 'date']
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['location', 'updated_at'], name='weather_location_updated_idx'),
+            models.Index(
+                fields=['date'], condition=models.Q(alert_pending=True), name='weather_alert_pending_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.location} - {self.date}"
 
+class DistrictSeasonTotals(models.Model):
+    """Running weather totals for a district, updated as each WeatherData row lands"""
+    location = models.OneToOneField(MalawiRegion, on_delete=models.CASCADE, related_name='season_totals')
+    last_date = models.DateField(verbose_name=_('Last Weather Date'))
+    total_gdd = models.FloatField(default=0)
+    total_rainfall = models.FloatField(default=0)
+    total_days = models.IntegerField(default=0)
+    season_start = models.DateField(verbose_name=_('Season Start'))
+    season_gdd = models.FloatField(default=0, verbose_name=_('Season Growing Degree Days'))
+    season_rainfall = models.FloatField(default=0, verbose_name=_('Season Rainfall (mm)'))
+    season_days = models.IntegerField(default=0, verbose_name=_('Days Recorded This Season'))
+    
+    class Meta:
+        verbose_name = _('District Season Totals')
+        verbose_name_plural = _('District Season Totals')
+    
+    def __str__(self):
+        return f"{self.location.name} season from {self.season_start}"
+
+class CropPlanting(models.Model):
+    """When a farmer planted one of their crops"""
+    farmer = models.ForeignKey(Farmer, on_delete=models.CASCADE, related_name='plantings')
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
+    planting_date = models.DateField(verbose_name=_('Planting Date'))
+    
+    class Meta:
+        verbose_name = _('Crop Planting')
+        verbose_name_plural = _('Crop Plantings')
+        unique_together = ['farmer', 'crop']
+    
+    def __str__(self):
+        return f"{self.crop} planted {self.planting_date}"
+
 class CropAdvice(models.Model):
     """AI-generated crop advice"""
     ADVICE_TYPES = [
@@ -117,11 +223,17 @@ class CropAdvice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_urgent = models.BooleanField(default=False, verbose_name=_('Urgent'))
     validity_days = models.IntegerField(default=7, verbose_name=_('Validity (days)'))
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = _('Crop Advice')
         verbose_name_plural = _('Crop Advice')
         ordering = ['-created_at', '-is_urgent']
+        indexes = [
+            models.Index(fields=['farmer', 'created_at'], name='advice_farmer_created_idx'),
+            models.Index(fields=['created_at'], name='advice_created_idx'),
+            models.Index(fields=['farmer', 'updated_at'], name='advice_farmer_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title_en} - {self.farmer.user.username}"
@@ -135,22 +247,48 @@ class FarmingCalendar(models.Model):
         (10, _('October')), (11, _('November')), (12, _('December')),
     ]
     
+    # Entries are national when neither region_group nor region is set,
+    # regional when only region_group is set, and district overrides when
+    # region is set. Lookups resolve the most specific entry.
     crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
-    region = models.ForeignKey(MalawiRegion, on_delete=models.CASCADE)
+    region_group = models.CharField(max_length=20, choices=MalawiRegion.REGION_CHOICES, blank=True, verbose_name=_('Region'))
+    region = models.ForeignKey(MalawiRegion, on_delete=models.CASCADE, null=True, blank=True, verbose_name=_('District'))
     month = models.IntegerField(choices=MONTHS)
     activity_en = models.CharField(max_length=200, verbose_name=_('Activity (English)'))
     activity_ny = models.CharField(max_length=200, verbose_name=_('Activity (Chichewa)'), blank=True)
     description_en = models.TextField(verbose_name=_('Description (English)'))
     description_ny = models.TextField(verbose_name=_('Description (Chichewa)'), blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = _('Farming Calendar Entry')
         verbose_name_plural = _('Farming Calendar Entries')
         unique_together = ['crop', 'region', 'month']
         ordering = ['month']
+        indexes = [
+            models.Index(fields=['month', 'region', 'crop'], name='calendar_month_region_crop_idx'),
+            models.Index(fields=['updated_at'], name='calendar_updated_idx'),
+        ]
+        constraints = [
+            # unique_together does not cover rows without a district
+            models.UniqueConstraint(
+                fields=['crop', 'region_group', 'month'],
+                condition=models.Q(region__isnull=True),
+                name='calendar_unique_group_entry',
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.crop} - {self.get_month_display()} ({self.region})"
+        return f"{self.crop} - {self.get_month_display()} ({self.scope_display})"
+    
+    @property
+    def scope_display(self):
+        """District, region or national level the entry applies to"""
+        if self.region_id:
+            return self.region.name
+        if self.region_group:
+            return self.get_region_group_display()
+        return _('All Districts')
 
 class MarketPrice(models.Model):
     """Market prices for crops"""
@@ -160,11 +298,155 @@ class MarketPrice(models.Model):
     price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Price per KG (MWK)'))
     market_name = models.CharField(max_length=100, verbose_name=_('Market Name'))
     source = models.CharField(max_length=100, default='Manual Entry', verbose_name=_('Price Source'))
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = _('Market Price')
         verbose_name_plural = _('Market Prices')
+        unique_together = ['crop', 'location', 'market_name', 'date']
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['crop', 'location', 'date'], name='price_crop_location_date_idx'),
+            models.Index(fields=['crop', 'date'], name='price_crop_date_idx'),
+            models.Index(fields=['crop', 'updated_at'], name='price_crop_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.crop} - MWK {self.price_per_kg}/kg ({self.date})"
+
+class MarketPriceRollup(models.Model):
+    """Daily or weekly price statistics per crop, district and market"""
+    PERIODS = [
+        ('day', _('Daily')),
+        ('week', _('Weekly')),
+    ]
+    
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
+    location = models.ForeignKey(MalawiRegion, on_delete=models.CASCADE)
+    market_name = models.CharField(max_length=100, verbose_name=_('Market Name'))
+    period = models.CharField(max_length=4, choices=PERIODS, verbose_name=_('Period'))
+    period_start = models.DateField(verbose_name=_('Period Start'))
+    price_count = models.IntegerField(default=0, verbose_name=_('Prices Recorded'))
+    price_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Min Price (MWK)'))
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Max Price (MWK)'))
+    # Only kept on daily rows: mean over the days ending on period_start
+    rolling_avg_7d = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name=_('7-day Average (MWK)'))
+    rolling_avg_30d = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name=_('30-day Average (MWK)'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Market Price Rollup')
+        verbose_name_plural = _('Market Price Rollups')
+        unique_together = ['crop', 'location', 'market_name', 'period', 'period_start']
+        indexes = [
+            models.Index(fields=['crop', 'period', 'period_start'], name='rollup_crop_period_idx'),
+        ]
+        ordering = ['-period_start']
+    
+    def __str__(self):
+        return f"{self.crop} at {self.market_name} - {self.get_period_display()} {self.period_start}"
+    
+    @property
+    def mean_price(self):
+        if not self.price_count:
+            return None
+        return (self.price_total / self.price_count).quantize(Decimal('0.01'))
+
+
+class OutboundMessage(models.Model):
+    """An SMS to a farmer, rendered when queued and sent by the dispatcher"""
+    STATUSES = [
+        ('queued', _('Queued')),
+        ('sending', _('Sending')),
+        ('sent', _('Sent')),
+        ('delivered', _('Delivered')),
+        ('failed', _('Failed')),
+    ]
+    
+    farmer = models.ForeignKey(Farmer, on_delete=models.CASCADE, related_name='messages')
+    advice = models.OneToOneField(CropAdvice, on_delete=models.SET_NULL, null=True, blank=True, related_name='sms')
+    phone_number = models.CharField(max_length=16, verbose_name=_('Phone Number'))
+    language = models.CharField(max_length=2, choices=Farmer.LANGUAGE_CHOICES, verbose_name=_('Language'))
+    body = models.TextField(verbose_name=_('Message'))
+    segments = models.PositiveSmallIntegerField(default=1, verbose_name=_('Segments'))
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued', verbose_name=_('Status'))
+    gateway = models.CharField(max_length=50, blank=True, verbose_name=_('Gateway'))
+    gateway_message_id = models.CharField(max_length=100, blank=True, verbose_name=_('Gateway Message ID'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('Attempts'))
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    error = models.CharField(max_length=200, blank=True, verbose_name=_('Last Error'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Outbound SMS')
+        verbose_name_plural = _('Outbound SMS')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='sms_due_idx'),
+            models.Index(fields=['gateway_message_id'], name='sms_gateway_message_idx'),
+        ]
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.phone_number} ({self.get_status_display()})"
+
+
+class AccountClaim(models.Model):
+    """One-time SMS code that lets a farmer imported from a roster set a password"""
+    MAX_ATTEMPTS = 5
+    
+    farmer = models.OneToOneField(Farmer, on_delete=models.CASCADE, related_name='claim')
+    code_hash = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Account Claim')
+        verbose_name_plural = _('Account Claims')
+    
+    def __str__(self):
+        return f"Claim for farmer {self.farmer_id} until {self.expires_at}"
+    
+    @staticmethod
+    def hash_code(farmer_id, code):
+        # Short-lived and attempt-limited, so a fast keyed hash is enough;
+        # PBKDF2 per code would bring back the cost the codes avoid
+        return salted_hmac('advisory.AccountClaim', f'{farmer_id}:{code}', algorithm='sha256').hexdigest()
+    
+    @property
+    def usable(self):
+        return self.attempts < self.MAX_ATTEMPTS and self.expires_at > timezone.now()
+    
+    def check_code(self, code):
+        return constant_time_compare(self.hash_code(self.farmer_id, code), self.code_hash)
+
+
+class DeletedRecord(models.Model):
+    """Tombstone for a synced row, so delta sync can tell clients to drop it"""
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    # The district or crop the row was synced under; plain ids, since the
+    # tombstone outlives the rows they point at
+    location_id = models.BigIntegerField(null=True, blank=True)
+    crop_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at'], name='deleted_model_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.deleted_at}"
+
+
+class CacheVersion(models.Model):
+    """Generation of a group of cached data, shared by every worker process"""
+    namespace = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.namespace} v{self.version}"
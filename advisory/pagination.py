@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Opaque cursors over the primary key, newest first.
+    
+    Unlike page numbers, the cost of a page doesn't grow with its depth and
+    rows added while a client pages aren't skipped or repeated.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
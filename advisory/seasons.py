@@ -0,0 +1,70 @@
+import re
+
+ALL_MONTHS = 0xFFF
+
+# Phrases for a crop that can be planted or harvested in any month
+YEAR_ROUND = re.compile(
+    r'\byear[\s-]*round\b|\ball[\s-]+(?:the[\s-]+)?year\b|\b(?:throughout|whole|entire)[\s-]+(?:the[\s-]+)?year\b'
+    r'|\bevery[\s-]+month\b'
+)
+
+MONTH_NAMES = [
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december',
+]
+
+
+def month_number(word):
+    """Month number for a full or abbreviated month name, or None"""
+    if len(word) < 3:
+        return None
+    for number, name in enumerate(MONTH_NAMES, start=1):
+        if name.startswith(word):
+            return number
+    return None
+
+
+def month_bit(month):
+    """Bit for a month number in a 12-bit mask (bit 0 is January)"""
+    return 1 << (month - 1)
+
+
+def month_range_mask(start, end):
+    """Mask for start..end inclusive, wrapping across the year end"""
+    mask = 0
+    month = start
+    while True:
+        mask |= month_bit(month)
+        if month == end:
+            return mask
+        month = month % 12 + 1
+
+
+def season_month_mask(season):
+    """
+    Parse a free-text season such as "November-January" into a 12-bit mask.
+    
+    Ranges wrap across the year end, several ranges can be separated by
+    commas, and anything saying the crop grows all year ("Year-round",
+    "All year", "Throughout the year") covers every month.
+    """
+    text = (season or '').lower()
+    if YEAR_ROUND.search(text):
+        return ALL_MONTHS
+    
+    mask = 0
+    for part in text.split(','):
+        months = [
+            number for number in map(month_number, re.findall(r'[a-z]+', part))
+            if number
+        ]
+        if len(months) == 1:
+            mask |= month_bit(months[0])
+        elif months:
+            mask |= month_range_mask(months[0], months[-1])
+    return mask
+
+
+def mask_months(mask):
+    """Month numbers set in a mask"""
+    return [month for month in range(1, 13) if mask & month_bit(month)]
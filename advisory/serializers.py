@@ -0,0 +1,181 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from .models import (
+    MalawiRegion, Crop, CropSuitability, Farmer, WeatherData, DistrictSeasonTotals, CropPlanting,
+    CropAdvice, FarmingCalendar, MarketPrice, MarketPriceRollup, OutboundMessage
+)
+
+
+class ForeignKeyIdField(serializers.PrimaryKeyRelatedField):
+    """Primary key of a related row, read from the local *_id column"""
+    
+    def get_attribute(self, instance):
+        if len(self.source_attrs) == 1:
+            return getattr(instance, f'{self.source_attrs[0]}_id')
+        return super().get_attribute(instance)
+    
+    def to_representation(self, value):
+        # Many-to-many children still get the related object
+        return getattr(value, 'pk', value)
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer that honours ``?fields=a,b`` and knows which columns its
+    remaining fields read, so the view can load just those.
+    
+    Fields backed by a property rather than a column list what they read in
+    ``Meta.field_columns``.
+    """
+    serializer_related_field = ForeignKeyIdField
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request else None
+        if fields:
+            requested = {name.strip() for name in fields.split(',') if name.strip()}
+            unknown = requested - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+    
+    @property
+    def _readable_fields(self):
+        # DRF rebuilds this list for every row; a page of 1000 rows reuses one
+        if not hasattr(self, '_readable_fields_cache'):
+            self._readable_fields_cache = [field for field in self.fields.values() if not field.write_only]
+        return self._readable_fields_cache
+    
+    def optimize(self, queryset):
+        """Restrict a queryset to the columns and relations the fields use"""
+        model = queryset.model
+        field_columns = getattr(self.Meta, 'field_columns', {})
+        columns, related, prefetches = set(), set(), []
+        for name, field in self.fields.items():
+            if name in field_columns:
+                columns.update(field_columns[name])
+                continue
+            try:
+                model_field = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many:
+                prefetches.append(Prefetch(
+                    field.source, queryset=model_field.related_model.objects.only('id').order_by('id')
+                ))
+                continue
+            columns.add('__'.join(field.source_attrs))
+            if len(field.source_attrs) > 1:
+                related.add('__'.join(field.source_attrs[:-1]))
+        
+        queryset = queryset.only(*columns or ['id'])
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+
+class MalawiRegionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = MalawiRegion
+        fields = ['id', 'name', 'region', 'latitude', 'longitude', 'altitude', 'annual_rainfall']
+
+
+class CropSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Crop
+        fields = [
+            'id', 'name_en', 'name_ny', 'crop_type', 'scientific_name', 'planting_season', 'harvest_season',
+            'planting_months', 'harvest_months', 'water_requirement', 'soil_type', 'growing_period_days',
+            'suitable_regions',
+        ]
+
+
+class CropSuitabilitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = CropSuitability
+        fields = ['id', 'crop', 'region', 'score', 'updated_at']
+
+
+class WeatherDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = WeatherData
+        fields = [
+            'id', 'location', 'date', 'temperature_max', 'temperature_min', 'humidity', 'rainfall',
+            'wind_speed', 'weather_condition', 'growing_degree_days', 'updated_at',
+        ]
+
+
+class DistrictSeasonTotalsSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DistrictSeasonTotals
+        fields = [
+            'id', 'location', 'last_date', 'season_start', 'season_gdd', 'season_rainfall', 'season_days',
+            'total_gdd', 'total_rainfall', 'total_days',
+        ]
+
+
+class FarmingCalendarSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = FarmingCalendar
+        fields = [
+            'id', 'crop', 'region_group', 'region', 'month', 'activity_en', 'activity_ny',
+            'description_en', 'description_ny', 'updated_at',
+        ]
+
+
+class MarketPriceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = MarketPrice
+        fields = ['id', 'crop', 'location', 'market_name', 'date', 'price_per_kg', 'source', 'updated_at']
+
+
+class MarketPriceRollupSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    mean_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = MarketPriceRollup
+        fields = [
+            'id', 'crop', 'location', 'market_name', 'period', 'period_start', 'price_count',
+            'min_price', 'mean_price', 'max_price', 'rolling_avg_7d', 'rolling_avg_30d', 'updated_at',
+        ]
+        field_columns = {'mean_price': ['price_total', 'price_count']}
+
+
+class FarmerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+    
+    class Meta:
+        model = Farmer
+        fields = [
+            'id', 'username', 'phone_number', 'location', 'farm_size_acres', 'preferred_language',
+            'primary_crops', 'registration_date',
+        ]
+
+
+class CropPlantingSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = CropPlanting
+        fields = ['id', 'farmer', 'crop', 'planting_date']
+
+
+class CropAdviceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = CropAdvice
+        fields = [
+            'id', 'farmer', 'crop', 'advice_type', 'title_en', 'title_ny', 'content_en', 'content_ny',
+            'weather_context', 'is_urgent', 'validity_days', 'created_at', 'updated_at',
+        ]
+
+
+class OutboundMessageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = OutboundMessage
+        fields = [
+            'id', 'farmer', 'advice', 'phone_number', 'language', 'body', 'segments', 'status',
+            'attempts', 'created_at', 'sent_at', 'delivered_at',
+        ]
@@ -1,10 +1,556 @@
+import gzip
+import hashlib
+import json
+import logging
 import requests
-from datetime import datetime, timedelta
+import time
+from asgiref.sync import sync_to_async
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Min, Max, Value
+from django.db.models.functions import Greatest, Least
 from django.utils import timezone
+from django.utils import translation
 from django.utils.translation import gettext as _
-from .models import WeatherData, CropAdvice, FarmingCalendar, Crop, MalawiRegion
+from .models import (
+    WeatherData, CropAdvice, FarmingCalendar, Crop, MalawiRegion, CropSuitability,
+    DistrictSeasonTotals, CropPlanting, MarketPrice, MarketPriceRollup, Farmer, OutboundMessage,
+    DeletedRecord
+)
+from .caching import get_cache_version, bump_cache_version
+from .events import broker, farmer_channel, advice_event
+from .metrics import ADVICE_DURATION, WEATHER_ALERTS, WEATHER_LOOKUPS, record_cache_lookup
+from .seasons import month_bit
+from .sms import sms_text, fit_segments, segment_count, normalize_phone
 import random
 
+logger = logging.getLogger(__name__)
+
+class FarmingCalendarService:
+    """Resolve farming calendar entries from national, regional and district rows"""
+    
+    # Shared by all instances: {month: {crop_id: {scope: entry}}}
+    _index = None
+    _index_version = None
+    
+    NATIONAL = ('national', '')
+    
+    @classmethod
+    def _get_index(cls):
+        """Load every calendar row once per calendar version"""
+        version = get_cache_version('farming_calendar')
+        stale = cls._index is None or cls._index_version != version
+        record_cache_lookup('farming_calendar_index', not stale)
+        if stale:
+            index = {}
+            for entry in FarmingCalendar.objects.select_related('crop', 'region'):
+                if entry.region_id:
+                    scope = ('district', entry.region_id)
+                elif entry.region_group:
+                    scope = ('group', entry.region_group)
+                else:
+                    scope = cls.NATIONAL
+                index.setdefault(entry.month, {}).setdefault(entry.crop_id, {})[scope] = entry
+            cls._index, cls._index_version = index, version
+        return cls._index
+    
+    def _resolve(self, scopes, region):
+        """Pick the most specific entry that applies to a district"""
+        if region:
+            entry = scopes.get(('district', region.id)) or scopes.get(('group', region.region))
+            if entry:
+                return entry
+        return scopes.get(self.NATIONAL)
+    
+    def get_entry(self, crop, region, month):
+        """Calendar entry for a crop in a district and month, or None"""
+        scopes = self._get_index().get(month, {}).get(crop.id)
+        if not scopes:
+            return None
+        return self._resolve(scopes, region)
+    
+    def get_month_entries(self, month, region=None, crop_ids=None):
+        """
+        Entries for a month ordered by crop name.
+        
+        With a district each crop resolves to one entry; without one the
+        national and regional entries are listed as stored.
+        """
+        crops = self._get_index().get(month, {})
+        if crop_ids is not None:
+            crop_ids = set(crop_ids)
+        
+        entries = []
+        for crop_id, scopes in crops.items():
+            if crop_ids is not None and crop_id not in crop_ids:
+                continue
+            if region:
+                entry = self._resolve(scopes, region)
+                if entry:
+                    entries.append(entry)
+            else:
+                entries.extend(
+                    entry for scope, entry in scopes.items() if scope[0] != 'district'
+                )
+        
+        entries.sort(key=lambda entry: (entry.crop.name_en, entry.region_group))
+        return entries
+
+class SuitabilityService:
+    """Score how well every crop suits every district"""
+    
+    # Annual rainfall (mm) each water requirement grows best in
+    RAINFALL_RANGES = {
+        'Low': (500, 900),
+        'Medium': (750, 1200),
+        'High': (1000, 1600),
+    }
+    
+    # Altitude (m) each crop type grows best in
+    ALTITUDE_RANGES = {
+        'cereal': (0, 1800),
+        'legume': (0, 1800),
+        'tuber': (0, 2000),
+        'vegetable': (0, 2000),
+        'fruit': (0, 1500),
+        'cash': (200, 1500),
+    }
+    
+    # Crops whose needs differ from the rest of their type
+    ALTITUDE_OVERRIDES = {
+        'Irish Potato': (800, 2500),  # needs the cooler highlands
+    }
+    
+    # Rough length of the rainy season per mm of annual rainfall
+    SEASON_DAYS_PER_MM = 0.125
+    
+    WEIGHTS = {'rainfall': 0.45, 'altitude': 0.3, 'season': 0.25}
+    
+    # Shared by all instances: {region_id: [crop, ...] best first}
+    _rankings = None
+    _rankings_version = None
+    
+    @staticmethod
+    def _range_score(values, ranges, tolerance):
+        """1 inside each optimal range, falling linearly to 0 `tolerance` outside it"""
+        scores = []
+        for value, (low, high) in zip(values, ranges):
+            if value is None:
+                scores.append(0.5)
+            elif value < low:
+                scores.append(max(0.0, 1 - (low - value) / tolerance))
+            elif value > high:
+                scores.append(max(0.0, 1 - (value - high) / tolerance))
+            else:
+                scores.append(1.0)
+        return scores
+    
+    def compute_scores(self, crops, regions):
+        """Score matrix as {(crop_id, region_id): score}, one column of districts per crop"""
+        altitudes = [region.altitude for region in regions]
+        rainfalls = [region.annual_rainfall for region in regions]
+        season_days = [
+            rainfall * self.SEASON_DAYS_PER_MM if rainfall else None
+            for rainfall in rainfalls
+        ]
+        
+        scores = {}
+        for crop in crops:
+            rainfall_range = self.RAINFALL_RANGES.get(crop.water_requirement, self.RAINFALL_RANGES['Medium'])
+            altitude_range = self.ALTITUDE_OVERRIDES.get(
+                crop.name_en, self.ALTITUDE_RANGES.get(crop.crop_type, (0, 2000))
+            )
+            
+            rainfall_scores = self._range_score(rainfalls, [rainfall_range] * len(regions), 400)
+            altitude_scores = self._range_score(altitudes, [altitude_range] * len(regions), 600)
+            # Crops saved before the field was validated may have no growing period
+            growing_days = max(crop.growing_period_days, 1)
+            season_scores = [
+                0.5 if days is None else min(1.0, days / growing_days)
+                for days in season_days
+            ]
+            
+            for region, rainfall, altitude, season in zip(regions, rainfall_scores, altitude_scores, season_scores):
+                score = (
+                    self.WEIGHTS['rainfall'] * rainfall
+                    + self.WEIGHTS['altitude'] * altitude
+                    + self.WEIGHTS['season'] * season
+                )
+                scores[(crop.id, region.id)] = round(100 * score, 1)
+        
+        return scores
+    
+    def refresh(self, crops=None, regions=None):
+        """Recompute and store the scores for the given crops and districts (default: all)"""
+        crops = list(crops if crops is not None else Crop.objects.all())
+        regions = list(regions if regions is not None else MalawiRegion.objects.all())
+        
+        scores = self.compute_scores(crops, regions)
+        # Workers rebuild their rankings when they see the new version, so it
+        # must not become visible before the scores it stands for
+        with transaction.atomic():
+            CropSuitability.objects.bulk_create(
+                [
+                    CropSuitability(crop_id=crop_id, region_id=region_id, score=score)
+                    for (crop_id, region_id), score in scores.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['crop', 'region'],
+                update_fields=['score', 'updated_at'],
+                batch_size=500,
+            )
+            bump_cache_version('suitability')
+        return len(scores)
+    
+    @classmethod
+    def _get_rankings(cls):
+        """Crops sorted by score for every district, loaded once per version"""
+        # Shared with the other workers, so a rescore in one reaches them all
+        version = get_cache_version('suitability')
+        stale = cls._rankings is None or cls._rankings_version != version
+        record_cache_lookup('suitability_rankings', not stale)
+        if stale:
+            if not CropSuitability.objects.exists() and Crop.objects.exists():
+                cls().refresh()
+                version = get_cache_version('suitability')
+            
+            crops = {
+                crop['id']: crop
+                for crop in Crop.objects.values('id', 'name_en', 'name_ny', 'crop_type')
+            }
+            rankings = {}
+            rows = CropSuitability.objects.order_by('region_id', '-score').values_list('region_id', 'crop_id', 'score')
+            for region_id, crop_id, score in rows:
+                rankings.setdefault(region_id, []).append(dict(crops[crop_id], score=score))
+            cls._rankings, cls._rankings_version = rankings, version
+        return cls._rankings
+    
+    def top_crops(self, region, k=5):
+        """The k best suited crops for a district, best first"""
+        return self._get_rankings().get(region.id, [])[:k]
+
+class SeasonTotalsService:
+    """Running growing-degree-day and rainfall totals per district"""
+    
+    BASE_TEMPERATURE = 10  # °C, base for warm-season field crops
+    SEASON_START_MONTH = 10  # the growing season starts with the October rains
+    REFERENCE_DAILY_GDD = 15  # heat a typical growing day provides
+    
+    # (fraction of growing period, English, Chichewa)
+    STAGES = [
+        (0.1, 'Emergence', 'Kumera'),
+        (0.45, 'Vegetative growth', 'Kukula kwa masamba'),
+        (0.7, 'Flowering', 'Kuchita maluwa'),
+        (1.0, 'Maturing', 'Kucha'),
+    ]
+    READY_STAGE = ('Ready for harvest', 'Yakonzeka kutcha')
+    
+    def daily_gdd(self, temperature_max, temperature_min):
+        """Growing degree days contributed by one day"""
+        return max(0.0, (temperature_max + temperature_min) / 2 - self.BASE_TEMPERATURE)
+    
+    def season_start(self, day):
+        """First day of the growing season a date falls in"""
+        year = day.year if day.month >= self.SEASON_START_MONTH else day.year - 1
+        return date(year, self.SEASON_START_MONTH, 1)
+    
+    def record(self, weather, created=True):
+        """Add a newly saved weather row to its district's totals in O(1)"""
+        if not created:
+            # Corrections shift every later running total
+            return self.rebuild(weather.location_id)
+        
+        gdd = self.daily_gdd(weather.temperature_max, weather.temperature_min)
+        season_start = self.season_start(weather.date)
+        with transaction.atomic():
+            # Locked, so rows for one district saved at the same time add up
+            # instead of overwriting each other's totals
+            totals, new = DistrictSeasonTotals.objects.select_for_update().get_or_create(
+                location_id=weather.location_id,
+                defaults={'season_start': season_start, 'last_date': weather.date},
+            )
+            if not new and weather.date <= totals.last_date:
+                # Backfills shift every later running total
+                return self.rebuild(weather.location_id)
+            return self._add(totals, weather, gdd, season_start)
+    
+    def _add(self, totals, weather, gdd, season_start):
+        if totals.season_start != season_start:
+            totals.season_start = season_start
+            totals.season_gdd = totals.season_rainfall = 0
+            totals.season_days = 0
+        
+        totals.total_gdd += gdd
+        totals.total_rainfall += weather.rainfall
+        totals.total_days += 1
+        totals.season_gdd += gdd
+        totals.season_rainfall += weather.rainfall
+        totals.season_days += 1
+        totals.last_date = weather.date
+        totals.save()
+        
+        weather.growing_degree_days = gdd
+        weather.cumulative_gdd = totals.total_gdd
+        weather.cumulative_rainfall = totals.total_rainfall
+        weather.cumulative_days = totals.total_days
+        WeatherData.objects.filter(pk=weather.pk).update(
+            growing_degree_days=gdd,
+            cumulative_gdd=totals.total_gdd,
+            cumulative_rainfall=totals.total_rainfall,
+            cumulative_days=totals.total_days,
+        )
+        return totals
+    
+    @transaction.atomic
+    def rebuild(self, location_id):
+        """Recompute a district's running totals from its full weather history"""
+        totals = DistrictSeasonTotals.objects.select_for_update().filter(location_id=location_id).first()
+        rows = list(
+            WeatherData.objects.filter(location_id=location_id).order_by('date').only(
+                'date', 'temperature_max', 'temperature_min', 'rainfall',
+                'growing_degree_days', 'cumulative_gdd', 'cumulative_rainfall', 'cumulative_days'
+            )
+        )
+        if not rows:
+            DistrictSeasonTotals.objects.filter(location_id=location_id).delete()
+            return None
+        
+        if totals is None:
+            totals = DistrictSeasonTotals(location_id=location_id)
+        totals.total_gdd = totals.total_rainfall = 0
+        totals.total_days = 0
+        totals.season_start = None
+        
+        for row in rows:
+            season_start = self.season_start(row.date)
+            if season_start != totals.season_start:
+                totals.season_start = season_start
+                totals.season_gdd = totals.season_rainfall = 0
+                totals.season_days = 0
+            
+            row.growing_degree_days = self.daily_gdd(row.temperature_max, row.temperature_min)
+            totals.total_gdd += row.growing_degree_days
+            totals.total_rainfall += row.rainfall
+            totals.total_days += 1
+            totals.season_gdd += row.growing_degree_days
+            totals.season_rainfall += row.rainfall
+            totals.season_days += 1
+            row.cumulative_gdd = totals.total_gdd
+            row.cumulative_rainfall = totals.total_rainfall
+            row.cumulative_days = totals.total_days
+        
+        WeatherData.objects.bulk_update(
+            rows, ['growing_degree_days', 'cumulative_gdd', 'cumulative_rainfall', 'cumulative_days'],
+            batch_size=500
+        )
+        totals.last_date = rows[-1].date
+        totals.save()
+        return totals
+    
+    def totals_between(self, location, start, end):
+        """GDD, rainfall and days recorded for start..end from two running-total lookups"""
+        rows = WeatherData.objects.filter(location=location).values_list(
+            'cumulative_gdd', 'cumulative_rainfall', 'cumulative_days'
+        )
+        upto_end = rows.filter(date__lte=end).order_by('-date').first()
+        if upto_end is None:
+            return 0.0, 0.0, 0
+        before_start = rows.filter(date__lt=start).order_by('-date').first() or (0.0, 0.0, 0)
+        return tuple(total - earlier for total, earlier in zip(upto_end, before_start))
+    
+    def crop_progress(self, planting, location, today=None):
+        """Stage and expected harvest window of a planted crop"""
+        today = today or timezone.now().date()
+        crop = planting.crop
+        days_since_planting = (today - planting.planting_date).days
+        if days_since_planting < 0:
+            return None
+        
+        gdd, rainfall, observed_days = self.totals_between(location, planting.planting_date, today)
+        
+        # Warmer than usual seasons mature faster, cooler ones slower
+        expected_days = crop.growing_period_days
+        if observed_days >= 14 and gdd > 0:
+            heat_factor = self.REFERENCE_DAILY_GDD / (gdd / observed_days)
+            expected_days = round(crop.growing_period_days * min(max(heat_factor, 0.8), 1.25))
+        
+        # A crop saved with no growing period is treated as one day long
+        expected_days = max(expected_days, 1)
+        fraction = days_since_planting / expected_days
+        stage_en, stage_ny = self.READY_STAGE
+        for limit, name_en, name_ny in self.STAGES:
+            if fraction < limit:
+                stage_en, stage_ny = name_en, name_ny
+                break
+        
+        harvest_date = planting.planting_date + timedelta(days=expected_days)
+        return {
+            'planting_date': planting.planting_date,
+            'days_since_planting': days_since_planting,
+            'stage_en': stage_en,
+            'stage_ny': stage_ny,
+            'gdd': round(gdd, 1),
+            'rainfall': round(rainfall, 1),
+            'harvest_start': harvest_date - timedelta(days=7),
+            'harvest_end': harvest_date + timedelta(days=7),
+        }
+
+class MarketPriceRollupService:
+    """Daily and weekly price statistics kept up to date as prices are recorded"""
+    
+    CENT = Decimal('0.01')
+    ROLLING_WINDOWS = {'rolling_avg_7d': 7, 'rolling_avg_30d': 30}
+    
+    @staticmethod
+    def week_start(day):
+        return day - timedelta(days=day.weekday())
+    
+    def _buckets(self, price):
+        return [('day', price.date), ('week', self.week_start(price.date))]
+    
+    def record(self, price):
+        """Add a newly recorded price to its daily and weekly rollups"""
+        value = Decimal(price.price_per_kg)
+        with transaction.atomic():
+            for period, period_start in self._buckets(price):
+                rollup, created = MarketPriceRollup.objects.get_or_create(
+                    crop_id=price.crop_id,
+                    location_id=price.location_id,
+                    market_name=price.market_name,
+                    period=period,
+                    period_start=period_start,
+                    defaults={
+                        'price_count': 1,
+                        'price_total': value,
+                        'min_price': value,
+                        'max_price': value,
+                    }
+                )
+                if not created:
+                    # Done in the database, so concurrent saves and imports all count
+                    MarketPriceRollup.objects.filter(pk=rollup.pk).update(
+                        price_count=F('price_count') + 1,
+                        price_total=F('price_total') + value,
+                        min_price=Least('min_price', Value(value)),
+                        max_price=Greatest('max_price', Value(value)),
+                        updated_at=timezone.now(),
+                    )
+            
+            self.update_rolling(price.crop_id, price.location_id, price.market_name, price.date)
+    
+    def rebuild_buckets(self, crop_id, location_id, market_name, day):
+        """Recompute the rollups containing a day from raw prices, after an edit or delete"""
+        for period, period_start in [('day', day), ('week', self.week_start(day))]:
+            period_end = period_start if period == 'day' else period_start + timedelta(days=6)
+            stats = MarketPrice.objects.filter(
+                crop_id=crop_id,
+                location_id=location_id,
+                market_name=market_name,
+                date__range=(period_start, period_end),
+            ).aggregate(
+                price_count=Count('id'),
+                price_total=Sum('price_per_kg'),
+                min_price=Min('price_per_kg'),
+                max_price=Max('price_per_kg'),
+            )
+            key = {
+                'crop_id': crop_id, 'location_id': location_id, 'market_name': market_name,
+                'period': period, 'period_start': period_start,
+            }
+            if stats['price_count']:
+                MarketPriceRollup.objects.update_or_create(**key, defaults=stats)
+            else:
+                MarketPriceRollup.objects.filter(**key).delete()
+        
+        self.update_rolling(crop_id, location_id, market_name, day)
+    
+    def update_rolling(self, crop_id, location_id, market_name, day):
+        """Refresh the rolling averages of the daily rows whose windows include a day"""
+        longest = max(self.ROLLING_WINDOWS.values())
+        daily = list(MarketPriceRollup.objects.filter(
+            crop_id=crop_id,
+            location_id=location_id,
+            market_name=market_name,
+            period='day',
+            period_start__range=(day - timedelta(days=longest - 1), day + timedelta(days=longest - 1)),
+        ).order_by('period_start'))
+        
+        changed = [rollup for rollup in daily if rollup.period_start >= day]
+        self._apply_rolling(daily, changed)
+        MarketPriceRollup.objects.bulk_update(changed, list(self.ROLLING_WINDOWS))
+    
+    def _apply_rolling(self, daily, targets):
+        """Set rolling averages on targets from the sorted daily rows of one market"""
+        dates = [rollup.period_start for rollup in daily]
+        counts, totals = [0], [Decimal(0)]
+        for rollup in daily:
+            counts.append(counts[-1] + rollup.price_count)
+            totals.append(totals[-1] + rollup.price_total)
+        
+        for target in targets:
+            end = bisect_right(dates, target.period_start)
+            for field, days in self.ROLLING_WINDOWS.items():
+                start = bisect_left(dates, target.period_start - timedelta(days=days - 1))
+                count = counts[end] - counts[start]
+                total = totals[end] - totals[start]
+                setattr(target, field, (total / count).quantize(self.CENT) if count else None)
+    
+    def rebuild(self, crop_ids=None):
+        """Recompute all rollups (optionally for some crops) from raw prices, e.g. after a bulk import"""
+        prices = MarketPrice.objects.order_by()
+        rollups = MarketPriceRollup.objects.all()
+        if crop_ids is not None:
+            prices = prices.filter(crop_id__in=crop_ids)
+            rollups = rollups.filter(crop_id__in=crop_ids)
+        
+        days = prices.values('crop_id', 'location_id', 'market_name', 'date').annotate(
+            price_count=Count('id'),
+            price_total=Sum('price_per_kg'),
+            min_price=Min('price_per_kg'),
+            max_price=Max('price_per_kg'),
+        )
+        
+        daily_by_market = defaultdict(list)
+        weekly = {}
+        for day in days.iterator():
+            market = (day['crop_id'], day['location_id'], day['market_name'])
+            daily_by_market[market].append(MarketPriceRollup(
+                crop_id=day['crop_id'], location_id=day['location_id'], market_name=day['market_name'],
+                period='day', period_start=day['date'], price_count=day['price_count'],
+                price_total=day['price_total'], min_price=day['min_price'], max_price=day['max_price'],
+            ))
+            
+            week_key = market + (self.week_start(day['date']),)
+            week = weekly.get(week_key)
+            if week is None:
+                weekly[week_key] = MarketPriceRollup(
+                    crop_id=day['crop_id'], location_id=day['location_id'], market_name=day['market_name'],
+                    period='week', period_start=week_key[-1], price_count=day['price_count'],
+                    price_total=day['price_total'], min_price=day['min_price'], max_price=day['max_price'],
+                )
+            else:
+                week.price_count += day['price_count']
+                week.price_total += day['price_total']
+                week.min_price = min(week.min_price, day['min_price'])
+                week.max_price = max(week.max_price, day['max_price'])
+        
+        created = []
+        for daily in daily_by_market.values():
+            daily.sort(key=lambda rollup: rollup.period_start)
+            self._apply_rolling(daily, daily)
+            created.extend(daily)
+        created.extend(weekly.values())
+        
+        with transaction.atomic():
+            rollups.delete()
+            MarketPriceRollup.objects.bulk_create(created, batch_size=1000)
+        return len(created)
+
 class WeatherService:
     """Service for managing weather data"""
     
@@ -21,13 +567,39 @@ class WeatherService:
                 date=timezone.now().date()
             ).first()
             
-            if not weather:
+            if weather:
+                WEATHER_LOOKUPS.labels('stored').inc()
+            else:
                 # Generate mock weather data
                 weather = self.generate_mock_weather(location)
+                WEATHER_LOOKUPS.labels('generated').inc()
             
             return weather
-        except Exception as e:
-            print(f"Error getting weather: {e}")
+        except Exception:
+            WEATHER_LOOKUPS.labels('error').inc()
+            logger.exception('Error getting weather for %s', location)
+            return None
+    
+    async def aget_current_weather(self, location):
+        """Async variant of get_current_weather for async views"""
+        try:
+            weather = await WeatherData.objects.filter(
+                location=location,
+                date=timezone.now().date()
+            ).afirst()
+            
+            if weather:
+                WEATHER_LOOKUPS.labels('stored').inc()
+            else:
+                # Saving fires the (sync) season totals signal, so the whole
+                # write runs in the ORM's thread
+                weather = await sync_to_async(self.generate_mock_weather)(location)
+                WEATHER_LOOKUPS.labels('generated').inc()
+            
+            return weather
+        except Exception:
+            WEATHER_LOOKUPS.labels('error').inc()
+            logger.exception('Error getting weather for %s', location)
             return None
     
     def generate_mock_weather(self, location):
@@ -86,6 +658,8 @@ class AdvisoryService:
     
     def generate_advice(self, farmer, crop, advice_type='general'):
         """Generate personalized crop advice for a farmer"""
+        started = time.perf_counter()
+        outcome = 'error'
         try:
             # Get current weather context
             weather_context = None
@@ -119,22 +693,22 @@ class AdvisoryService:
                 is_urgent=advice.get('is_urgent', False)
             )
             
+            outcome = 'success'
             return crop_advice
             
-        except Exception as e:
-            print(f"Error generating advice: {e}")
+        except Exception:
+            logger.exception('Error generating %s advice for farmer %s', advice_type, farmer.pk)
             return None
+        finally:
+            label = advice_type if advice_type in dict(CropAdvice.ADVICE_TYPES) else 'other'
+            ADVICE_DURATION.labels(label, outcome).observe(time.perf_counter() - started)
     
     def _generate_planting_advice(self, farmer, crop, weather_context):
         """Generate planting advice"""
         current_month = timezone.now().month
         
         # Get farming calendar for this crop and region
-        calendar_entry = FarmingCalendar.objects.filter(
-            crop=crop,
-            region=farmer.location,
-            month=current_month
-        ).first()
+        calendar_entry = FarmingCalendarService().get_entry(crop, farmer.location, current_month)
         
         title_en = f"Planting Advice for {crop.name_en}"
         title_ny = f"Malangizo a Kubzala {crop.name_ny or crop.name_en}"
@@ -195,6 +769,29 @@ class AdvisoryService:
             'is_urgent': False
         }
     
+    def _crop_progress_text(self, farmer, crop):
+        """Crop stage section for care and harvest advice, if a planting date is known"""
+        planting = CropPlanting.objects.filter(farmer=farmer, crop=crop).select_related('crop').first()
+        if not planting or not farmer.location:
+            return '', ''
+        
+        progress = SeasonTotalsService().crop_progress(planting, farmer.location)
+        if not progress:
+            return '', ''
+        
+        content_en = f"""
+        **Crop Stage:** {progress['stage_en']} ({progress['days_since_planting']} days since planting)
+        • Heat accumulated: {progress['gdd']} growing degree days
+        • Rainfall since planting: {progress['rainfall']}mm
+        • Expected harvest: {progress['harvest_start']:%d %b} - {progress['harvest_end']:%d %b %Y}
+        """
+        content_ny = f"""
+        **Gawo la Mbewu:** {progress['stage_ny']} (masiku {progress['days_since_planting']} kuchokera kubzala)
+        • Mvula kuchokera kubzala: {progress['rainfall']}mm
+        • Nthawi yotcha: {progress['harvest_start']:%d/%m} - {progress['harvest_end']:%d/%m/%Y}
+        """
+        return content_en, content_ny
+    
     def _generate_care_advice(self, farmer, crop, weather_context):
         """Generate crop care and maintenance advice"""
         title_en = f"Care Instructions for {crop.name_en}"
@@ -251,6 +848,10 @@ class AdvisoryService:
         • Chotsani mbewu zowonongeka msanga
         """
         
+        progress_en, progress_ny = self._crop_progress_text(farmer, crop)
+        content_en += progress_en
+        content_ny += progress_ny
+        
         return {
             'title_en': title_en,
             'title_ny': title_ny,
@@ -395,6 +996,10 @@ class AdvisoryService:
         • Sunganitsani mbewu monga mmene ziliri
         """
         
+        progress_en, progress_ny = self._crop_progress_text(farmer, crop)
+        content_en += progress_en
+        content_ny += progress_ny
+        
         return {
             'title_en': title_en,
             'title_ny': title_ny,
@@ -403,6 +1008,11 @@ class AdvisoryService:
             'is_urgent': is_urgent
         }
     
+    @staticmethod
+    def is_urgent_weather(weather):
+        """Heavy rain, extreme heat or very high humidity"""
+        return weather.rainfall > 50 or weather.temperature_max > 35 or weather.humidity > 90
+    
     def _generate_weather_advice(self, farmer, crop, weather_context):
         """Generate weather-based advice"""
         title_en = f"Weather Advisory for {crop.name_en}"
@@ -461,16 +1071,12 @@ class AdvisoryService:
         • Chenjerani ndi matenda nthawi ya chinyengo
         """
         
-        is_urgent = (weather_context.rainfall > 50 or 
-                     weather_context.temperature_max > 35 or 
-                     weather_context.humidity > 90)
-        
         return {
             'title_en': title_en,
             'title_ny': title_ny,
             'content_en': content_en,
             'content_ny': content_ny,
-            'is_urgent': is_urgent
+            'is_urgent': self.is_urgent_weather(weather_context)
         }
     
     def _generate_general_advice(self, farmer, crop, weather_context):
@@ -528,4 +1134,666 @@ class AdvisoryService:
             'content_en': content_en,
             'content_ny': content_ny,
             'is_urgent': False
-        }
\ No newline at end of file
+        }
+
+class SmsService:
+    """Render advice as SMS in the farmer's language and queue it for the dispatcher"""
+    
+    def render(self, title, content):
+        """SMS body: GSM-friendly text trimmed to SMS_MAX_SEGMENTS"""
+        return fit_segments(sms_text(f'{title}\n{content}'), settings.SMS_MAX_SEGMENTS)
+    
+    def queue_advice(self, advice_list):
+        """Queue one message per advice; returns the messages created"""
+        farmers = Farmer.objects.only('id', 'phone_number', 'preferred_language').in_bulk(
+            {advice.farmer_id for advice in advice_list}
+        )
+        # Alerts fanned out for one crop share their text, so render it once
+        rendered = {}
+        messages = []
+        for advice in advice_list:
+            farmer = farmers.get(advice.farmer_id)
+            if farmer is None:
+                continue
+            language = farmer.preferred_language
+            if language == 'ny' and advice.content_ny:
+                title, content = advice.title_ny or advice.title_en, advice.content_ny
+            else:
+                language, title, content = 'en', advice.title_en, advice.content_en
+            
+            key = (title, content)
+            if key not in rendered:
+                body = self.render(title, content)
+                rendered[key] = (body, segment_count(body))
+            body, segments = rendered[key]
+            
+            phone_number = normalize_phone(farmer.phone_number)
+            messages.append(OutboundMessage(
+                farmer_id=farmer.id,
+                advice_id=advice.id,
+                phone_number=phone_number or farmer.phone_number[:16],
+                language=language,
+                body=body,
+                segments=segments,
+                status='queued' if phone_number else 'failed',
+                error='' if phone_number else 'Invalid phone number',
+            ))
+        return OutboundMessage.objects.bulk_create(messages, batch_size=500, ignore_conflicts=True)
+
+class WeatherAlertService:
+    """Send urgent weather advice to every farmer growing a crop in the district"""
+    
+    BATCH_SIZE = 500
+    
+    def farmers_by_crop(self, location_id):
+        """
+        {crop_id: [farmer_id, ...]} for the farmers of a district.
+        
+        Read when the alert goes out rather than kept in memory, so a farmer
+        who moved or changed crops through another worker or a command is
+        never missed or wrongly alerted.
+        """
+        farmers_by_crop = {}
+        rows = Farmer.primary_crops.through.objects.filter(
+            farmer__location_id=location_id
+        ).values_list('crop_id', 'farmer_id')
+        for crop_id, farmer_id in rows.iterator(chunk_size=5000):
+            farmers_by_crop.setdefault(crop_id, []).append(farmer_id)
+        return farmers_by_crop
+    
+    def fan_out_pending(self, limit=100):
+        """
+        Fan out the weather rows flagged alert_pending; returns the advice
+        created. Each row is claimed and handled in one transaction, so one
+        that fails stays flagged for the next call.
+        """
+        created = []
+        pending = list(
+            WeatherData.objects.filter(alert_pending=True).order_by('date', 'id').values_list('id', flat=True)[:limit]
+        )
+        for weather_id in pending:
+            try:
+                with transaction.atomic():
+                    if not WeatherData.objects.filter(pk=weather_id, alert_pending=True).update(alert_pending=False):
+                        continue
+                    created += self.fan_out(WeatherData.objects.get(pk=weather_id))
+            except Exception:
+                logger.exception('Weather alert fan-out failed for weather %s', weather_id)
+        return created
+    
+    def fan_out(self, weather):
+        """
+        Create urgent advice for today's or forecast weather that crosses the
+        urgency thresholds, and push it to the farmers' alert streams.
+        
+        Safe to call again for the same day: farmers who already have advice
+        for this weather row are skipped. Returns the advice created.
+        """
+        if weather.date < timezone.now().date() or not AdvisoryService.is_urgent_weather(weather):
+            return []
+        farmers_by_crop = self.farmers_by_crop(weather.location_id)
+        if not farmers_by_crop:
+            return []
+        
+        started = time.perf_counter()
+        already_sent = set(
+            CropAdvice.objects.filter(weather_context=weather, advice_type='weather')
+            .values_list('farmer_id', 'crop_id')
+        )
+        crops = Crop.objects.in_bulk(farmers_by_crop.keys())
+        advisory = AdvisoryService()
+        
+        pending = []
+        for crop_id, farmer_ids in farmers_by_crop.items():
+            crop = crops.get(crop_id)
+            if crop is None:
+                continue
+            # The advice depends only on the crop and the weather, so every
+            # farmer growing the crop gets the same text
+            advice = advisory._generate_weather_advice(None, crop, weather)
+            for farmer_id in farmer_ids:
+                if (farmer_id, crop_id) in already_sent:
+                    continue
+                pending.append(CropAdvice(
+                    farmer_id=farmer_id,
+                    crop_id=crop_id,
+                    advice_type='weather',
+                    title_en=advice['title_en'],
+                    title_ny=advice['title_ny'],
+                    content_en=advice['content_en'],
+                    content_ny=advice['content_ny'],
+                    weather_context_id=weather.id,
+                    is_urgent=True,
+                ))
+        
+        if not pending:
+            return []
+        
+        with transaction.atomic():
+            # bulk_create skips post_save, so publish the alerts here
+            created = CropAdvice.objects.bulk_create(pending, batch_size=self.BATCH_SIZE)
+            SmsService().queue_advice(created)
+            events = [(farmer_channel(advice.farmer_id), advice_event(advice)) for advice in created]
+            transaction.on_commit(lambda: [broker.publish(*event) for event in events])
+        
+        WEATHER_ALERTS.inc(len(created))
+        logger.info(
+            'Sent %d urgent weather alerts for %s on %s in %.0fms',
+            len(created), weather.location_id, weather.date, (time.perf_counter() - started) * 1000
+        )
+        return created
+
+class UssdService:
+    """Numbered menus and short advice replies for USSD sessions"""
+    
+    # Shared by all instances: {'crops': {id: (name_en, name_ny)}, 'order': [id, ...]}
+    _menus = None
+    _menus_version = None
+    
+    PAGE_SIZE = 7
+    MORE = '9'
+    REPLY_LENGTH = 160
+    ADVICE_TYPES = [
+        ('planting', 'Planting', 'Kubzala'),
+        ('care', 'Crop care', 'Kusamalira'),
+        ('disease', 'Pests & disease', 'Tizilombo ndi matenda'),
+        ('harvest', 'Harvest', 'Kukolola'),
+        ('weather', 'Weather', 'Nyengo'),
+        ('general', 'General', 'Malangizo onse'),
+    ]
+    TEXT = {
+        'en': {
+            'choose_crop': 'Choose a crop:',
+            'choose_advice': 'Advice for {crop}:',
+            'more': 'More',
+            'invalid': 'Invalid choice. Please dial again.',
+            'no_crops': 'No crops available.',
+        },
+        'ny': {
+            'choose_crop': 'Sankhani mbewu:',
+            'choose_advice': 'Malangizo a {crop}:',
+            'more': 'Zina',
+            'invalid': 'Mwasankha molakwika. Imbaninso.',
+            'no_crops': 'Palibe mbewu.',
+        },
+    }
+    
+    @classmethod
+    def _get_menus(cls):
+        """Crop names in menu order, loaded once per crop version"""
+        # The version is shared through the database, so a crop added or
+        # renamed in one worker reloads the menus in all of them
+        version = get_cache_version('crops')
+        stale = cls._menus is None or cls._menus_version != version
+        record_cache_lookup('ussd_menus', not stale)
+        if stale:
+            crops = Crop.objects.order_by('name_en').values_list('id', 'name_en', 'name_ny')
+            cls._menus = {
+                'crops': {crop_id: (name_en, name_ny or name_en) for crop_id, name_en, name_ny in crops},
+                'order': [crop_id for crop_id, _name_en, _name_ny in crops],
+            }
+            cls._menus_version = version
+        return cls._menus
+    
+    def crop_name(self, crop_id, language):
+        name_en, name_ny = self._get_menus()['crops'][crop_id]
+        return name_ny if language == 'ny' else name_en
+    
+    def menu_crop_ids(self, preferred_ids=()):
+        """The farmer's crops first, then every other crop"""
+        order = self._get_menus()['order']
+        preferred = [crop_id for crop_id in order if crop_id in preferred_ids]
+        return preferred + [crop_id for crop_id in order if crop_id not in preferred_ids]
+    
+    def crop_menu(self, crop_ids, language, page=0):
+        """One page of the crop menu; the last line offers more when there are"""
+        text = self.TEXT[language]
+        start = page * self.PAGE_SIZE
+        page_ids = crop_ids[start:start + self.PAGE_SIZE]
+        lines = [text['choose_crop']] + [
+            f'{number}. {self.crop_name(crop_id, language)}' for number, crop_id in enumerate(page_ids, 1)
+        ]
+        if start + self.PAGE_SIZE < len(crop_ids):
+            lines.append(f"{self.MORE}. {text['more']}")
+        return '\n'.join(lines)
+    
+    def advice_menu(self, crop_id, language):
+        lines = [self.TEXT[language]['choose_advice'].format(crop=self.crop_name(crop_id, language))]
+        for number, (_advice_type, label_en, label_ny) in enumerate(self.ADVICE_TYPES, 1):
+            lines.append(f'{number}. {label_ny if language == "ny" else label_en}')
+        return '\n'.join(lines)
+    
+    def respond(self, session, inputs):
+        """
+        Walk the menus with the inputs so far; returns (more_input_expected, text).
+        
+        session holds the farmer fields and crop order fixed when it started.
+        """
+        language = session['language']
+        # A crop deleted since the session started drops out of its menu
+        menu_crops = self._get_menus()['crops']
+        crop_ids = [crop_id for crop_id in session['crop_ids'] if crop_id in menu_crops]
+        if not crop_ids:
+            return False, self.TEXT[language]['no_crops']
+        
+        position, page = 0, 0
+        while (position < len(inputs) and inputs[position] == self.MORE
+               and (page + 1) * self.PAGE_SIZE < len(crop_ids)):
+            position, page = position + 1, page + 1
+        if position == len(inputs):
+            return True, self.crop_menu(crop_ids, language, page)
+        
+        page_ids = crop_ids[page * self.PAGE_SIZE:(page + 1) * self.PAGE_SIZE]
+        choice = self.parse_choice(inputs[position], len(page_ids))
+        if choice is None:
+            return False, self.TEXT[language]['invalid']
+        crop_id = page_ids[choice]
+        position += 1
+        if position == len(inputs):
+            return True, self.advice_menu(crop_id, language)
+        
+        choice = self.parse_choice(inputs[position], len(self.ADVICE_TYPES))
+        if choice is None or position + 1 != len(inputs):
+            return False, self.TEXT[language]['invalid']
+        advice_type = self.ADVICE_TYPES[choice][0]
+        return False, self.advice_reply(
+            crop_id, advice_type, language, session['farmer_id'], session['location_id']
+        )
+    
+    @staticmethod
+    def parse_choice(value, options):
+        """Zero-based index of a numbered menu choice, or None"""
+        if value.isdigit() and 1 <= int(value) <= options:
+            return int(value) - 1
+        return None
+    
+    def advice_reply(self, crop_id, advice_type, language, farmer_id=None, location_id=None):
+        """
+        A one-screen advice summary.
+        
+        A farmer's own advice is used while it is still valid; otherwise a
+        district summary built from the reference data, cached for the day.
+        Nothing here generates full advice, which is too slow for USSD.
+        """
+        if farmer_id:
+            advice = CropAdvice.objects.filter(
+                farmer_id=farmer_id, crop_id=crop_id, advice_type=advice_type,
+            ).order_by('-created_at').only(
+                'title_en', 'title_ny', 'content_en', 'content_ny', 'created_at', 'validity_days'
+            ).first()
+            if advice and advice.created_at + timedelta(days=advice.validity_days) > timezone.now():
+                if language == 'ny' and advice.content_ny:
+                    content = advice.content_ny
+                else:
+                    content = advice.content_en
+                return self.shorten(content)
+        
+        today = timezone.now().date()
+        key = f'ussd:summary:{location_id}:{crop_id}:{advice_type}:{language}:{today}'
+        version = get_cache_version('ussd_summaries')
+        summary = cache.get(key, version=version)
+        record_cache_lookup('ussd_summary', summary is not None)
+        if summary is None:
+            summary = self.shorten(self.district_summary(crop_id, advice_type, language, location_id, today))
+            cache.set(key, summary, 6 * 60 * 60, version=version)
+        return summary
+    
+    def shorten(self, text):
+        """Advice text as one screen: headings dropped, bullets joined with semicolons"""
+        lines = [
+            line.lstrip('- ').rstrip('.') for line in sms_text(text).splitlines()
+            if not line.endswith(':')
+        ]
+        text = '; '.join(line for line in lines if line) + '.'
+        if len(text) <= self.REPLY_LENGTH:
+            return text
+        return text[:self.REPLY_LENGTH - 3].rsplit(' ', 1)[0].rstrip(';,') + '...'
+    
+    def district_summary(self, crop_id, advice_type, language, location_id, today):
+        """Short advice from the crop, this month's calendar entry and today's weather"""
+        crop = Crop.objects.get(id=crop_id)
+        region = MalawiRegion.objects.filter(id=location_id).first() if location_id else None
+        ny = language == 'ny'
+        name = self.crop_name(crop_id, language)
+        parts = []
+        
+        if advice_type in ('planting', 'care', 'harvest'):
+            entry = FarmingCalendarService().get_entry(crop, region, today.month)
+            if entry:
+                parts.append((entry.activity_ny if ny and entry.activity_ny else entry.activity_en) + '.')
+        
+        weather = None
+        if region and advice_type in ('care', 'disease', 'harvest', 'weather'):
+            weather = WeatherData.objects.filter(location=region, date=today).first()
+        
+        if advice_type == 'planting':
+            if ny:
+                parts.append(f'Nyengo ya Kubzala: {crop.planting_season}. Masiku a Kukula: {crop.growing_period_days}.')
+            else:
+                parts.append(f'Plant {name} in {crop.planting_season}; it needs {crop.growing_period_days} days.')
+        elif advice_type == 'care':
+            parts.append('Letsani udzu ndi tizilombo.' if ny else 'Weed early and scout for pests weekly.')
+            if weather and weather.rainfall < 5:
+                parts.append('Thirirani mbewu.' if ny else 'Dry today: water if you can.')
+        elif advice_type == 'disease':
+            if weather and weather.humidity > 80:
+                parts.append('Chinyezi chambiri: yangayang matenda.' if ny else 'Humid: check leaves for fungal disease.')
+            parts.append('Yangayang tizilombo ndi matenda.' if ny else 'Remove sick plants and rotate crops.')
+        elif advice_type == 'harvest':
+            parts.append(f'Kukolola: {crop.harvest_season}.' if ny else f'Harvest {name} in {crop.harvest_season}.')
+            if weather and weather.rainfall > 20:
+                parts.append('Mvula: umitsani bwino.' if ny else 'Rain today: dry the harvest well.')
+        elif advice_type == 'weather':
+            if weather:
+                if ny:
+                    parts.append(
+                        f'Lero: {weather.temperature_min:.0f}-{weather.temperature_max:.0f}C, mvula {weather.rainfall:.0f}mm.'
+                    )
+                else:
+                    parts.append(
+                        f'Today: {weather.temperature_min:.0f}-{weather.temperature_max:.0f}C, '
+                        f'rain {weather.rainfall:.0f}mm, {weather.weather_condition}.'
+                    )
+                if AdvisoryService.is_urgent_weather(weather):
+                    parts.append('Chenjerani!' if ny else 'Take care: extreme weather.')
+            else:
+                parts.append('Palibe zambiri za nyengo.' if ny else 'No weather data for today yet.')
+        else:
+            parts.append(
+                'Gwiritsani ntchito mbewu zabwino. Bzalani molingana.' if ny
+                else 'Use certified seed, plant on time and keep records.'
+            )
+        return f'{name}: ' + ' '.join(parts)
+
+
+class ReferenceBundleService:
+    """
+    Crops, districts and the farming calendar in both languages as one
+    compressed JSON document for mobile and offline clients.
+    """
+    
+    LANGUAGES = ('en', 'ny')
+    
+    # Shared by all instances: {'hash': ..., 'body': ..., 'gzip': ...}
+    _bundle = None
+    _bundle_version = None
+    
+    @classmethod
+    def get_bundle(cls, bundle_hash=None):
+        """
+        The bundle, rebuilt once per reference-data version.
+        
+        The hash is the version the bundle was built from, stored in the
+        database, so every worker publishes the same URL for the same data.
+        A bundle already held under the requested hash is returned without
+        reading the version: a hash always names the same content.
+        """
+        if bundle_hash is not None and cls._bundle is not None and cls._bundle['hash'] == bundle_hash:
+            record_cache_lookup('reference_bundle', True)
+            return cls._bundle
+        version = get_cache_version('reference')
+        stale = cls._bundle is None or cls._bundle_version != version
+        record_cache_lookup('reference_bundle', not stale)
+        if stale:
+            # Read the version again with the data, in one snapshot, so the
+            # content always matches the version it is published under
+            with transaction.atomic():
+                version = get_cache_version('reference', fresh=True)
+                body = json.dumps(cls().build(), separators=(',', ':'), ensure_ascii=False).encode()
+            cls._bundle = {
+                # The digest keeps URLs unique if the versions ever start over
+                'hash': f'{version}-{hashlib.sha256(body).hexdigest()[:12]}',
+                'body': body,
+                # mtime=0 keeps the compressed bytes identical between rebuilds
+                'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+            }
+            cls._bundle_version = version
+        return cls._bundle
+    
+    def _labels(self, choices):
+        """{value: {'en': label, 'ny': label}} for a model's choices"""
+        labels = {}
+        for language in self.LANGUAGES:
+            with translation.override(language):
+                for value, label in choices:
+                    labels.setdefault(value, {})[language] = str(label)
+        return labels
+    
+    @staticmethod
+    def _months(mask):
+        return [month for month in range(1, 13) if mask & month_bit(month)]
+    
+    @staticmethod
+    def calendar_entry(entry):
+        return {
+            'id': entry.id,
+            'crop': entry.crop_id,
+            'month': entry.month,
+            'region_group': entry.region_group,
+            'region': entry.region_id,
+            'activity': {'en': entry.activity_en, 'ny': entry.activity_ny or entry.activity_en},
+            'description': {'en': entry.description_en, 'ny': entry.description_ny or entry.description_en},
+        }
+    
+    def build(self):
+        """Plain data for the bundle; ordered so equal data hashes equally"""
+        suitable = defaultdict(list)
+        for crop_id, region_id in Crop.suitable_regions.through.objects.order_by(
+            'crop_id', 'malawiregion_id'
+        ).values_list('crop_id', 'malawiregion_id'):
+            suitable[crop_id].append(region_id)
+        
+        regions = [
+            {
+                'id': region.id,
+                'name': region.name,
+                'region': region.region,
+                'latitude': region.latitude,
+                'longitude': region.longitude,
+                'altitude': region.altitude,
+                'annual_rainfall': region.annual_rainfall,
+            }
+            for region in MalawiRegion.objects.order_by('id')
+        ]
+        crops = [
+            {
+                'id': crop.id,
+                'name': {'en': crop.name_en, 'ny': crop.name_ny or crop.name_en},
+                'crop_type': crop.crop_type,
+                'scientific_name': crop.scientific_name,
+                'planting_season': crop.planting_season,
+                'harvest_season': crop.harvest_season,
+                'planting_months': self._months(crop.planting_months),
+                'harvest_months': self._months(crop.harvest_months),
+                'water_requirement': crop.water_requirement,
+                'soil_type': crop.soil_type,
+                'growing_period_days': crop.growing_period_days,
+                'suitable_regions': suitable[crop.id],
+            }
+            for crop in Crop.objects.order_by('id')
+        ]
+        calendar = [self.calendar_entry(entry) for entry in FarmingCalendar.objects.order_by('id')]
+        return {
+            'labels': {
+                'region': self._labels(MalawiRegion.REGION_CHOICES),
+                'crop_type': self._labels(Crop.CROP_TYPES),
+                'month': self._labels(FarmingCalendar.MONTHS),
+            },
+            'regions': regions,
+            'crops': crops,
+            'calendar': calendar,
+        }
+
+
+class SyncService:
+    """
+    Rows a farmer's device needs that changed since its last sync.
+    
+    Cursors are modification times in microseconds. Each section is read in
+    updated_at order from a (scope, updated_at) index, and deletions come
+    from DeletedRecord tombstones kept under the same scopes. The pages of a
+    first sync carry its start date after a colon, so they keep its window.
+    """
+    
+    EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    # Sections whose deletions are recorded by the signals; advice only goes
+    # away with its farmer
+    TOMBSTONED = ('weather', 'prices', 'calendar')
+    
+    def __init__(self, farmer):
+        self.farmer = farmer
+        self.limit = settings.SYNC_PAGE_SIZE
+    
+    @classmethod
+    def encode_cursor(cls, moment, start=None):
+        cursor = str((moment - cls.EPOCH) // timedelta(microseconds=1))
+        if start is not None:
+            cursor += f':{start.isoformat()}'
+        return cursor
+    
+    @classmethod
+    def decode_cursor(cls, value):
+        """
+        Cursor string to (datetime, start date or None); ValueError if it
+        isn't one of ours.
+        """
+        micros, _sep, start = value.partition(':')
+        micros = int(micros)
+        if micros < 0:
+            raise ValueError(value)
+        start = date.fromisoformat(start) if start else None
+        return cls.EPOCH + timedelta(microseconds=micros), start
+    
+    def _page(self, queryset, field='updated_at'):
+        """
+        Up to limit rows in field order, and the cursor to resume from when
+        more are left (None when the section is complete).
+        
+        A page never ends part way through a timestamp, or the rows sharing
+        it would be skipped by the next field > cursor query.
+        """
+        rows = list(queryset.order_by(field, 'id')[:self.limit + 1])
+        if len(rows) <= self.limit:
+            return rows, None
+        boundary = getattr(rows[self.limit], field)
+        rows = [row for row in rows[:self.limit] if getattr(row, field) < boundary]
+        if not rows:
+            # The whole page shares one timestamp; send all of it to move past
+            rows = list(queryset.filter(**{field: boundary}).order_by('id'))
+            return rows, boundary
+        return rows, getattr(rows[-1], field)
+    
+    def sections(self, crop_ids, start=None):
+        """(name, queryset, serializer) for each kind of synced row"""
+        farmer = self.farmer
+        advice = CropAdvice.objects.filter(farmer=farmer)
+        weather = WeatherData.objects.filter(location_id=farmer.location_id)
+        prices = MarketPrice.objects.filter(crop_id__in=crop_ids)
+        calendar = FarmingCalendar.objects.all()
+        if start is not None:
+            # A new device starts from recent history, not everything
+            advice = advice.filter(created_at__date__gte=start)
+            weather = weather.filter(date__gte=start)
+            prices = prices.filter(date__gte=start)
+        
+        return [
+            ('advice', advice, self.advice_data),
+            ('weather', weather, self.weather_data),
+            ('prices', prices, self.price_data),
+            ('calendar', calendar, ReferenceBundleService.calendar_entry),
+        ]
+    
+    def tombstones(self, crop_ids):
+        """
+        Deletions from the same scopes as the sections. Tombstones written
+        before they recorded a scope go to every farmer.
+        """
+        return DeletedRecord.objects.filter(
+            Q(model='weather') & (Q(location_id=self.farmer.location_id) | Q(location_id__isnull=True))
+            | Q(model='prices') & (Q(crop_id__in=crop_ids) | Q(crop_id__isnull=True))
+            | Q(model='calendar')
+        ).only('id', 'model', 'object_id', 'deleted_at')
+    
+    @staticmethod
+    def advice_data(advice):
+        return {
+            'id': advice.id,
+            'crop': advice.crop_id,
+            'advice_type': advice.advice_type,
+            'title': {'en': advice.title_en, 'ny': advice.title_ny or advice.title_en},
+            'content': {'en': advice.content_en, 'ny': advice.content_ny or advice.content_en},
+            'is_urgent': advice.is_urgent,
+            'validity_days': advice.validity_days,
+            'created_at': advice.created_at.isoformat(),
+        }
+    
+    @staticmethod
+    def weather_data(weather):
+        return {
+            'id': weather.id,
+            'location': weather.location_id,
+            'date': weather.date.isoformat(),
+            'temp_max': weather.temperature_max,
+            'temp_min': weather.temperature_min,
+            'humidity': weather.humidity,
+            'rainfall': weather.rainfall,
+            'condition': weather.weather_condition,
+        }
+    
+    @staticmethod
+    def price_data(price):
+        return {
+            'id': price.id,
+            'crop': price.crop_id,
+            'location': price.location_id,
+            'market': price.market_name,
+            'date': price.date.isoformat(),
+            'price': float(price.price_per_kg),
+        }
+    
+    def changes(self, since=None, start=None):
+        """
+        Changed rows, deleted ids and the cursor for the next call.
+        
+        start is the first day of a first sync still being paged through;
+        a sync without a cursor picks it.
+        """
+        now = timezone.now()
+        if since is None:
+            start = timezone.localdate(now) - timedelta(days=settings.SYNC_INITIAL_DAYS)
+        crop_ids = list(self.farmer.primary_crops.values_list('id', flat=True))
+        data = {}
+        resume_at = []
+        for name, queryset, serialize in self.sections(crop_ids, start):
+            if since is not None:
+                queryset = queryset.filter(updated_at__gt=since)
+            rows, truncated_at = self._page(queryset)
+            data[name] = [serialize(row) for row in rows]
+            if truncated_at is not None:
+                resume_at.append(truncated_at)
+        
+        deleted = {name: [] for name in self.TOMBSTONED}
+        if since is not None:
+            tombstones, truncated_at = self._page(
+                self.tombstones(crop_ids).filter(deleted_at__gt=since), 'deleted_at'
+            )
+            for tombstone in tombstones:
+                deleted[tombstone.model].append(tombstone.object_id)
+            if truncated_at is not None:
+                resume_at.append(truncated_at)
+        
+        if resume_at:
+            cursor = min(resume_at)
+        else:
+            # The first sync is complete; later ones take every change
+            start = None
+            # Rows saved just before now may belong to transactions that
+            # haven't committed yet, so the next sync looks back a little
+            cursor = now - timedelta(seconds=settings.SYNC_CURSOR_OVERLAP_SECONDS)
+            if since is not None:
+                cursor = max(cursor, since)
+        
+        data['deleted'] = deleted
+        data['cursor'] = self.encode_cursor(cursor, start)
+        data['has_more'] = bool(resume_at)
+        return data
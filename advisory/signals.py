@@ -0,0 +1,139 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .caching import bump_cache_version
+from .events import broker, farmer_channel, district_channel, advice_event, weather_event
+from .models import FarmingCalendar, Crop, MalawiRegion, WeatherData, MarketPrice, CropAdvice, DeletedRecord
+from .services import AdvisoryService, SuitabilityService, SeasonTotalsService, MarketPriceRollupService
+
+
+def record_deletion(model, instance, location_id=None, crop_id=None):
+    """Leave a tombstone so delta sync clients drop the row too"""
+    DeletedRecord.objects.create(model=model, object_id=instance.pk, location_id=location_id, crop_id=crop_id)
+
+
+@receiver(post_save, sender=FarmingCalendar)
+@receiver(post_delete, sender=FarmingCalendar)
+def farming_calendar_changed(sender, **kwargs):
+    """Drop the cached calendar fragments when an entry changes"""
+    bump_cache_version('farming_calendar')
+    bump_cache_version('ussd_summaries')
+    bump_cache_version('reference')
+
+
+@receiver(post_delete, sender=FarmingCalendar)
+def farming_calendar_deleted(sender, instance, **kwargs):
+    record_deletion('calendar', instance, location_id=instance.region_id, crop_id=instance.crop_id)
+
+
+@receiver(post_save, sender=Crop)
+def crop_saved(sender, instance, raw=False, **kwargs):
+    """Rescore a crop in every district when its growing needs change"""
+    if raw:
+        return
+    SuitabilityService().refresh(crops=[instance])
+    # The calendar page lists crops by their season masks
+    bump_cache_version('farming_calendar')
+    bump_cache_version('crops')
+    bump_cache_version('ussd_summaries')
+    bump_cache_version('reference')
+
+
+@receiver(post_save, sender=MalawiRegion)
+def region_saved(sender, instance, raw=False, **kwargs):
+    """Rescore every crop in a district when its altitude or rainfall changes"""
+    if raw:
+        return
+    SuitabilityService().refresh(regions=[instance])
+    bump_cache_version('reference')
+
+
+@receiver(m2m_changed, sender=Crop.suitable_regions.through)
+def crop_regions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_cache_version('reference')
+
+
+@receiver(post_delete, sender=Crop)
+@receiver(post_delete, sender=MalawiRegion)
+def suitability_input_deleted(sender, **kwargs):
+    """Deleted scores cascade in the database; drop the cached rankings"""
+    bump_cache_version('suitability')
+    bump_cache_version('reference')
+    if sender is Crop:
+        bump_cache_version('crops')
+
+
+@receiver(post_save, sender=WeatherData)
+def weather_saved(sender, instance, created, raw=False, **kwargs):
+    """Add the day to the district's running growing-degree-day and rainfall totals"""
+    if raw:
+        return
+    SeasonTotalsService().record(instance, created=created)
+    if created:
+        event = weather_event(instance)
+        channel = district_channel(instance.location_id)
+        transaction.on_commit(lambda: broker.publish(channel, event))
+    # Edits count too: a corrected reading may only now cross a threshold.
+    # The fan-out writes advice and SMS for a whole district, so it is left
+    # to send_sms rather than run in the request that saved the row.
+    if instance.date >= timezone.now().date() and AdvisoryService.is_urgent_weather(instance):
+        WeatherData.objects.filter(pk=instance.pk).update(alert_pending=True)
+    if instance.date == timezone.now().date():
+        bump_cache_version('ussd_summaries')
+
+
+@receiver(post_delete, sender=WeatherData)
+def weather_deleted(sender, instance, **kwargs):
+    SeasonTotalsService().rebuild(instance.location_id)
+    record_deletion('weather', instance, location_id=instance.location_id)
+
+
+@receiver(post_save, sender=CropAdvice)
+def advice_saved(sender, instance, created, raw=False, **kwargs):
+    """Push new urgent advice to the farmer's open alert streams"""
+    if raw or not created or not instance.is_urgent:
+        return
+    event = advice_event(instance)
+    channel = farmer_channel(instance.farmer_id)
+    transaction.on_commit(lambda: broker.publish(channel, event))
+
+
+def _rollup_key(price):
+    return (price.crop_id, price.location_id, price.market_name, price.date)
+
+
+@receiver(pre_save, sender=MarketPrice)
+def market_price_saving(sender, instance, raw=False, **kwargs):
+    """Remember which rollups an edited price used to count towards"""
+    if raw or instance.pk is None:
+        return
+    previous = MarketPrice.objects.filter(pk=instance.pk).values_list(
+        'crop_id', 'location_id', 'market_name', 'date'
+    ).first()
+    instance._previous_rollup_key = previous
+
+
+@receiver(post_save, sender=MarketPrice)
+def market_price_saved(sender, instance, created, raw=False, **kwargs):
+    """Fold a new price into its rollups; edits rebuild the affected buckets"""
+    if raw:
+        return
+    service = MarketPriceRollupService()
+    if created:
+        service.record(instance)
+        return
+    
+    keys = {_rollup_key(instance)}
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous:
+        keys.add(previous)
+    for key in keys:
+        service.rebuild_buckets(*key)
+
+
+@receiver(post_delete, sender=MarketPrice)
+def market_price_deleted(sender, instance, **kwargs):
+    MarketPriceRollupService().rebuild_buckets(*_rollup_key(instance))
+    record_deletion('prices', instance, location_id=instance.location_id, crop_id=instance.crop_id)
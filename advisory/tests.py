@@ -1,3 +1,892 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import (
+    AccountClaim, Crop, CropAdvice, CropPlanting, CropSuitability, DistrictSeasonTotals, Farmer, MalawiRegion,
+    MarketPrice, MarketPriceRollup, OutboundMessage, WeatherData,
+)
+from .seasons import ALL_MONTHS, mask_months, season_month_mask
+from .services import (
+    ReferenceBundleService, SeasonTotalsService, SuitabilityService, SyncService, UssdService, WeatherAlertService,
+)
+from .sms import TokenBucket, fit_segments, record_delivery_reports, segment_count
+from .views import _alert_events, _parse_event_id
+from .writebehind import write_behind
 
-# Create your tests here.
+# Tables small enough that scanning them is cheaper than an index lookup;
+# they only grow with reference data, never with farmers or history
+SMALL_TABLES = {
+    'advisory_malawiregion',
+    'advisory_crop',
+    'advisory_crop_suitable_regions',
+    'advisory_farmingcalendar',
+    'advisory_cropsuitability',
+    'django_content_type',
+    'advisory_cacheversion',
+}
+
+SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+ALIAS_PATTERN = re.compile(r'"(\w+)" (\w+)')
+
+
+class QueryRecorder:
+    """Records every query a request runs, with its parameters, for EXPLAIN"""
+    
+    def __init__(self):
+        self.queries = []
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetTestCase(TestCase):
+    """Runs every view against a synthetic dataset and checks how it queries it.
+    
+    Budgets are deliberately tight: a per-row query (N+1) blows through them
+    at this fixture size, and so does any new full-table scan.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_data', stdout=StringIO())
+        call_command(
+            'generate_synthetic_data', farmers=300, advice_per_farmer=20, days=60,
+            seed=7, batch_size=2000, stdout=StringIO(),
+        )
+        cls.farmer = (
+            Farmer.objects.filter(location__isnull=False, primary_crops__isnull=False)
+            .select_related('user', 'location').order_by('id').first()
+        )
+        cls.region = cls.farmer.location
+        cls.crop = cls.farmer.primary_crops.order_by('id').first()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+    
+    def setUp(self):
+        # Cached fragments would hide the queries being budgeted
+        cache.clear()
+        # Buffered writes belong to the test that queued them
+        write_behind.clear()
+        self.addCleanup(write_behind.clear)
+    
+    def assertQueryBudget(self, url, max_queries, user=None, allow_scans=(), data=None):
+        """GET url, or POST data to it, within max_queries and without full scans"""
+        if user is not None:
+            self.client.force_login(user)
+        
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            if data is None:
+                response = self.client.get(url)
+            else:
+                response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200, url)
+        
+        self.assertLessEqual(
+            len(recorder.queries), max_queries,
+            f'{url} ran {len(recorder.queries)} queries (budget {max_queries}):\n'
+            + '\n'.join(sql for sql, _ in recorder.queries)
+        )
+        if connection.vendor == 'sqlite':
+            self.assertNoFullScans(recorder.queries, SMALL_TABLES | set(allow_scans))
+        return response
+    
+    def assertNoFullScans(self, queries, allowed):
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            aliases = {alias: table for table, alias in ALIAS_PATTERN.findall(sql)}
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            for detail in plan:
+                match = SCAN_PATTERN.match(detail)
+                if not match:
+                    continue
+                table = aliases.get(match.group(1), match.group(1))
+                if table not in allowed:
+                    self.fail(f'Full scan of {table} ({detail}) in:\n{sql}\nPlan:\n' + '\n'.join(plan))
+
+
+class PublicViewQueryTests(QueryBudgetTestCase):
+    
+    def test_homepage(self):
+        # The farmer total is a count over the whole table by design
+        self.assertQueryBudget(reverse('homepage'), 4, allow_scans=['advisory_farmer'])
+    
+    def test_crop_list(self):
+        self.assertQueryBudget(reverse('crop_list'), 2)
+        self.assertQueryBudget(f"{reverse('crop_list')}?region={self.region.id}&type=cereal", 3)
+    
+    def test_crop_detail(self):
+        self.assertQueryBudget(reverse('crop_detail', args=[self.crop.id]), 4)
+    
+    def test_weather_info(self):
+        self.assertQueryBudget(reverse('weather_info'), 2)
+    
+    def test_farming_calendar(self):
+        # Includes loading the calendar index, which later requests reuse
+        self.assertQueryBudget(f"{reverse('farming_calendar')}?region={self.region.id}", 6)
+    
+    def test_api_weather(self):
+        self.assertQueryBudget(reverse('api_weather', args=[self.region.id]), 2)
+    
+    def test_api_market_prices(self):
+        self.assertQueryBudget(reverse('api_market_prices', args=[self.crop.id]), 2)
+    
+    def test_api_price_trends(self):
+        self.assertQueryBudget(reverse('api_price_trends', args=[self.crop.id]), 2)
+        self.assertQueryBudget(f"{reverse('api_price_trends', args=[self.crop.id])}?period=week", 2)
+    
+    def test_api_price_comparison(self):
+        self.assertQueryBudget(reverse('api_price_comparison', args=[self.crop.id]), 2)
+    
+    def test_api_recommendations(self):
+        self.assertQueryBudget(reverse('api_crop_recommendations', args=[self.region.id]), 5)
+    
+    def test_api_seasonal_crops(self):
+        self.assertQueryBudget(reverse('api_seasonal_crops', args=[self.region.id]), 3)
+    
+    def test_api_session(self):
+        self.assertQueryBudget(reverse('api_session'), 0)
+    
+    def test_api_search(self):
+        self.assertQueryBudget(f"{reverse('api_search')}?q=ma", 2)
+    
+    def test_api_v1_prices(self):
+        url = reverse('v1:marketprice-list')
+        self.assertQueryBudget(f'{url}?crop={self.crop.id}', 1)
+        # Unfiltered, the first page walks the primary key backwards and stops at the limit
+        data = self.assertQueryBudget(
+            f'{url}?fields=id,price_per_kg&page_size=5', 1, allow_scans=['advisory_marketprice']
+        ).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'price_per_kg'})
+        self.assertQueryBudget(data['next'], 1)
+    
+    def test_api_v1_crops(self):
+        self.assertQueryBudget(reverse('v1:crop-list'), 2)
+    
+    def test_api_reference_bundle(self):
+        # Built once per reference-data version; a hash already held in
+        # memory is served without reading the version
+        bundle = ReferenceBundleService.get_bundle()
+        self.assertQueryBudget(reverse('api_reference_bundle', args=[bundle['hash']]), 0)
+    
+    def test_claim_account(self):
+        # A wrong code finds the claim by phone number and counts the attempt
+        farmer = Farmer.objects.exclude(pk=self.farmer.pk).order_by('id').first()
+        AccountClaim.objects.create(
+            farmer=farmer, code_hash=AccountClaim.hash_code(farmer.id, '123456'),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        data = {
+            'phone_number': farmer.phone_number, 'code': '654321',
+            'new_password1': 'Unused-pass-42', 'new_password2': 'Unused-pass-42',
+        }
+        self.assertQueryBudget(reverse('claim_account'), 2, data=data)
+        self.assertEqual(AccountClaim.objects.get(farmer=farmer).attempts, 1)
+
+
+class FarmerViewQueryTests(QueryBudgetTestCase):
+    
+    def test_dashboard(self):
+        self.assertQueryBudget(reverse('farmer_dashboard'), 12, user=self.farmer.user)
+    
+    def test_get_advice(self):
+        self.assertQueryBudget(reverse('get_advice'), 5, user=self.farmer.user)
+    
+    def test_advice_history(self):
+        self.assertQueryBudget(reverse('advice_history'), 5, user=self.farmer.user)
+    
+    def test_complete_profile(self):
+        self.assertQueryBudget(reverse('complete_profile'), 6, user=self.farmer.user)
+    
+    def test_api_session(self):
+        self.assertQueryBudget(reverse('api_session'), 3, user=self.farmer.user)
+    
+    def test_api_v1_advice(self):
+        self.assertQueryBudget(f"{reverse('v1:cropadvice-list')}?page_size=20", 3, user=self.farmer.user)
+    
+    def test_api_sync(self):
+        response = self.assertQueryBudget(reverse('api_sync'), 8, user=self.farmer.user)
+        cursor = response.json()['cursor']
+        self.assertQueryBudget(f"{reverse('api_sync')}?since={cursor}", 9, user=self.farmer.user)
+    
+    def test_set_planting_date_rejects_a_bad_crop_id(self):
+        self.client.force_login(self.farmer.user)
+        for crop_id in ('', 'maize'):
+            response = self.client.post(
+                reverse('set_planting_date'), {'crop_id': crop_id, 'planting_date': '2024-11-20'}
+            )
+            self.assertRedirects(response, reverse('get_advice'), fetch_redirect_response=False)
+
+
+@override_settings(USSD_TOKEN='ussd-secret')
+class UssdQueryTests(QueryBudgetTestCase):
+    
+    def ussd(self, session_id, text, max_queries):
+        data = {'sessionId': session_id, 'phoneNumber': self.farmer.phone_number, 'text': text}
+        return self.assertQueryBudget(f"{reverse('ussd')}?token=ussd-secret", max_queries, data=data)
+    
+    def test_gateway_token_required(self):
+        data = {'sessionId': 'intruder', 'phoneNumber': self.farmer.phone_number, 'text': '1*2'}
+        self.assertEqual(self.client.post(reverse('ussd'), data).status_code, 403)
+        self.assertEqual(self.client.post(f"{reverse('ussd')}?token=guess", data).status_code, 403)
+        response = self.client.post(reverse('ussd'), data, HTTP_AUTHORIZATION='Bearer ussd-secret')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(USSD_TOKEN=''):
+            self.assertEqual(self.client.post(f"{reverse('ussd')}?token=", data).status_code, 403)
+    
+    def test_session_start(self):
+        # Farmer, their crops, the cache versions and the crop menu
+        response = self.ussd('start', '', 4)
+        self.assertTrue(response.content.startswith(b'CON '))
+    
+    def test_menu_step_uses_session(self):
+        self.ussd('menu', '', 4)
+        # Only the shared cache versions are read again
+        self.ussd('menu', '1', 1)
+    
+    def test_advice_reply(self):
+        self.ussd('reply', '', 4)
+        response = self.ussd('reply', '1*2', 7)
+        self.assertTrue(response.content.startswith(b'END '))
+        # The district summary is cached for the next caller
+        self.ussd('reply-again', '', 3)
+        self.ussd('reply-again', '1*2', 2)
+
+
+class AdminQueryTests(QueryBudgetTestCase):
+    
+    def test_crop_advice_changelist(self):
+        # The changelist counts every row for its paginator
+        self.assertQueryBudget(
+            reverse('admin:advisory_cropadvice_changelist'), 6, user=self.admin,
+            allow_scans=['advisory_cropadvice'],
+        )
+    
+    def test_market_price_changelist(self):
+        self.assertQueryBudget(
+            reverse('admin:advisory_marketprice_changelist'), 10, user=self.admin,
+            allow_scans=['advisory_marketprice'],
+        )
+    
+    def test_weather_changelist(self):
+        self.assertQueryBudget(
+            reverse('admin:advisory_weatherdata_changelist'), 9, user=self.admin,
+            allow_scans=['advisory_weatherdata'],
+        )
+
+
+class WriteBehindQueryTests(QueryBudgetTestCase):
+    
+    def test_flush_batches_pending_writes(self):
+        farmers = list(Farmer.objects.order_by('id').values_list('id', 'user_id')[:50])
+        last_seen = timezone.now().replace(second=0, microsecond=0)
+        for farmer_id, user_id in farmers:
+            write_behind.set(Farmer, farmer_id, preferred_language='ny')
+            write_behind.set(Farmer, user_id, key_field='user_id', last_seen=last_seen)
+            write_behind.increment(Crop, self.crop.id, 'view_count')
+        # Instances loaded before the flush already see the pending values
+        self.assertEqual(Farmer.objects.get(pk=farmers[0][0]).preferred_language, 'ny')
+        
+        # One UPDATE per distinct value and counter step, inside a savepoint
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(write_behind.flush(), 101)
+        self.assertLessEqual(len(queries), 5, '\n'.join(query['sql'] for query in queries))
+        
+        self.assertEqual(Crop.objects.get(pk=self.crop.pk).view_count, 50)
+        ids = [farmer_id for farmer_id, _ in farmers]
+        self.assertEqual(Farmer.objects.filter(pk__in=ids, preferred_language='ny', last_seen=last_seen).count(), 50)
+    
+    def test_saving_the_profile_drops_a_pending_language(self):
+        Farmer.objects.filter(pk=self.farmer.pk).update(preferred_language='en')
+        self.client.force_login(self.farmer.user)
+        self.client.get(reverse('set_language'), {'language': 'ny'})
+        self.assertEqual(Farmer.objects.get(pk=self.farmer.pk).preferred_language, 'ny')
+        
+        data = {
+            'phone_number': self.farmer.phone_number, 'location': self.region.pk,
+            'farm_size_acres': self.farmer.farm_size_acres, 'preferred_language': 'en',
+            'primary_crops': [self.crop.pk],
+        }
+        response = self.client.post(reverse('complete_profile'), data)
+        self.assertRedirects(response, reverse('farmer_dashboard'), fetch_redirect_response=False)
+        # The explicit save is newer than the buffered toggle
+        write_behind.flush()
+        self.assertEqual(Farmer.objects.get(pk=self.farmer.pk).preferred_language, 'en')
+        form = self.client.get(reverse('complete_profile')).context['form']
+        self.assertEqual(form.instance.preferred_language, 'en')
+
+
+@override_settings(PAGE_SHELL_ENABLED=True)
+class PageShellTests(TestCase):
+    
+    def test_shell_is_shared_per_accept_language(self):
+        response = self.client.get(reverse('homepage'), HTTP_ACCEPT_LANGUAGE='en')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Accept-Language', response['Vary'])
+    
+    def test_language_cookie_keeps_the_shell_private(self):
+        # Shared caches don't key on the cookie, so its pages must not be stored
+        self.client.cookies[settings.LANGUAGE_COOKIE_NAME] = 'ny'
+        response = self.client.get(reverse('homepage'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+
+class SeasonMaskTests(TestCase):
+    
+    def test_month_ranges(self):
+        self.assertEqual(mask_months(season_month_mask('November-January')), [1, 11, 12])
+        self.assertEqual(mask_months(season_month_mask('March, June-July')), [3, 6, 7])
+        self.assertEqual(season_month_mask(''), 0)
+    
+    def test_year_round_phrases(self):
+        for season in ['Year-round', 'year round after 8-12 months', 'All year', 'Throughout the year']:
+            self.assertEqual(season_month_mask(season), ALL_MONTHS, season)
+    
+    def test_year_round_crop_is_in_every_month(self):
+        crop = Crop.objects.create(
+            name_en='Test Kale', crop_type='vegetable', planting_season='All year',
+            harvest_season='Throughout the year', water_requirement='Medium', soil_type='Loam',
+            growing_period_days=60,
+        )
+        for month in range(1, 13):
+            self.assertIn(crop, Crop.objects.plantable_in(month))
+            self.assertIn(crop, Crop.objects.harvestable_in(month))
+
+
+def create_crop(name, **fields):
+    values = {
+        'crop_type': 'cereal', 'planting_season': 'November-December', 'harvest_season': 'March-April',
+        'water_requirement': 'Medium', 'soil_type': 'Loam', 'growing_period_days': 120,
+    }
+    values.update(fields)
+    return Crop.objects.create(name_en=name, **values)
+
+
+def create_farmer(username, phone_number, location, crops=()):
+    farmer = Farmer.objects.create(
+        user=User.objects.create_user(username), phone_number=phone_number,
+        location=location, farm_size_acres=2,
+    )
+    farmer.primary_crops.set(crops)
+    return farmer
+
+
+class SuitabilityTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.lowlands = MalawiRegion.objects.create(name='Lowland', region='southern', altitude=100, annual_rainfall=700)
+        cls.highlands = MalawiRegion.objects.create(
+            name='Highland', region='northern', altitude=2200, annual_rainfall=1500,
+        )
+    
+    def setUp(self):
+        # Rankings are shared by every instance and outlive a test's database
+        patcher = mock.patch.object(SuitabilityService, '_rankings', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_saving_a_crop_scores_it_in_every_district(self):
+        create_crop('Sorghum', water_requirement='Low')
+        create_crop('Irish Potato', crop_type='tuber', water_requirement='High')
+        scores = {
+            (crop, region): score
+            for crop, region, score in CropSuitability.objects.values_list('crop__name_en', 'region__name', 'score')
+        }
+        self.assertEqual(len(scores), 4)
+        self.assertGreater(scores['Sorghum', 'Lowland'], scores['Sorghum', 'Highland'])
+        self.assertGreater(scores['Irish Potato', 'Highland'], scores['Irish Potato', 'Lowland'])
+        
+        service = SuitabilityService()
+        self.assertEqual([crop['name_en'] for crop in service.top_crops(self.lowlands)], ['Sorghum', 'Irish Potato'])
+        self.assertEqual([crop['name_en'] for crop in service.top_crops(self.highlands)], ['Irish Potato', 'Sorghum'])
+    
+    def test_crop_without_a_growing_period_is_still_scored(self):
+        crop = create_crop('Testcrop', growing_period_days=0)
+        self.assertEqual(CropSuitability.objects.filter(crop=crop).count(), 2)
+        with self.assertRaises(ValidationError):
+            crop.full_clean()
+
+
+class SeasonTotalsTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = MalawiRegion.objects.create(name='Testland', region='central')
+        cls.start = timezone.localdate() - timedelta(days=10)
+    
+    def add_weather(self, days, temperature_max, temperature_min, rainfall):
+        return WeatherData.objects.create(
+            location=self.region, date=self.start + timedelta(days=days), temperature_max=temperature_max,
+            temperature_min=temperature_min, humidity=60, rainfall=rainfall, weather_condition='Sunny',
+        )
+    
+    def test_totals_between_subtracts_running_totals(self):
+        self.add_weather(0, 30, 20, 5)   # 15 GDD
+        self.add_weather(1, 20, 10, 0)   # 5 GDD
+        self.add_weather(2, 8, 4, 12.5)  # below the base temperature
+        service = SeasonTotalsService()
+        day = lambda days: self.start + timedelta(days=days)
+        self.assertEqual(service.totals_between(self.region, day(0), day(2)), (20.0, 17.5, 3))
+        self.assertEqual(service.totals_between(self.region, day(1), day(2)), (5.0, 12.5, 2))
+        self.assertEqual(service.totals_between(self.region, day(-5), day(-1)), (0.0, 0.0, 0))
+    
+    def test_backfill_and_delete_rebuild_totals(self):
+        self.add_weather(2, 30, 20, 1)
+        self.add_weather(0, 24, 16, 2)  # 10 GDD, recorded late
+        latest = WeatherData.objects.get(location=self.region, date=self.start + timedelta(days=2))
+        self.assertEqual((latest.cumulative_gdd, latest.cumulative_days), (25.0, 2))
+        
+        WeatherData.objects.get(location=self.region, date=self.start).delete()
+        totals = DistrictSeasonTotals.objects.get(location=self.region)
+        self.assertEqual((totals.total_gdd, totals.total_rainfall, totals.total_days), (15.0, 1.0, 1))
+    
+    def test_progress_of_a_crop_without_a_growing_period(self):
+        crop = create_crop('Testcrop')
+        Crop.objects.filter(pk=crop.pk).update(growing_period_days=0)
+        crop.refresh_from_db()
+        farmer = create_farmer('grower', '+265991000001', self.region, [crop])
+        planting = CropPlanting.objects.create(farmer=farmer, crop=crop, planting_date=self.start)
+        progress = SeasonTotalsService().crop_progress(planting, self.region, today=self.start + timedelta(days=3))
+        self.assertEqual(progress['harvest_start'], self.start - timedelta(days=6))
+
+
+class MarketPriceRollupTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = MalawiRegion.objects.create(name='Testland', region='central')
+        cls.crop = create_crop('Test Maize')
+        cls.monday = timezone.localdate() - timedelta(days=timezone.localdate().weekday() + 7)
+    
+    def add_price(self, days, price):
+        return MarketPrice.objects.create(
+            crop=self.crop, location=self.region, market_name='Central Market',
+            date=self.monday + timedelta(days=days), price_per_kg=Decimal(price),
+        )
+    
+    def rollup(self, period, period_start):
+        return MarketPriceRollup.objects.get(crop=self.crop, period=period, period_start=period_start)
+    
+    def test_prices_fold_into_daily_and_weekly_rollups(self):
+        self.add_price(0, '100.00')
+        self.add_price(2, '80.25')
+        self.add_price(4, '120.50')
+        week = self.rollup('week', self.monday)
+        self.assertEqual(week.price_count, 3)
+        self.assertEqual(week.price_total, Decimal('300.75'))
+        self.assertEqual((week.min_price, week.max_price), (Decimal('80.25'), Decimal('120.50')))
+        self.assertEqual(self.rollup('day', self.monday + timedelta(days=2)).price_count, 1)
+    
+    def test_delete_rebuilds_the_buckets(self):
+        self.add_price(0, '100.00')
+        cheapest = self.add_price(1, '60.00')
+        cheapest.delete()
+        week = self.rollup('week', self.monday)
+        self.assertEqual((week.price_count, week.min_price), (1, Decimal('100.00')))
+        self.assertFalse(MarketPriceRollup.objects.filter(period='day', period_start=cheapest.date).exists())
+
+
+class FakeClock:
+    """monotonic() and sleep() for the rate limiter, without waiting"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def monotonic(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SmsTests(TestCase):
+    
+    def test_segment_count(self):
+        self.assertEqual(segment_count('a' * 160), 1)
+        self.assertEqual(segment_count('a' * 161), 2)
+        self.assertEqual(segment_count('a' * 306), 2)
+        # Extension characters take two units
+        self.assertEqual(segment_count('€' * 80), 1)
+        self.assertEqual(segment_count('€' * 81), 2)
+        # Outside GSM-7 the whole message is UCS-2
+        self.assertEqual(segment_count('ŵ' * 70), 1)
+        self.assertEqual(segment_count('ŵ' * 71), 2)
+    
+    def test_fit_segments(self):
+        text = ' '.join(['word'] * 200)
+        fitted = fit_segments(text, 2)
+        self.assertEqual(segment_count(fitted), 2)
+        self.assertTrue(fitted.endswith('word...'))
+        self.assertEqual(fit_segments('short', 1), 'short')
+    
+    def test_rate_limit_charges_whole_batches(self):
+        clock = FakeClock()
+        with mock.patch('advisory.sms.time', clock):
+            bucket = TokenBucket(10)
+            bucket.acquire(10)
+            self.assertEqual(clock.now, 0)
+            # A batch bigger than the burst pays for every message
+            bucket.acquire(25)
+            self.assertAlmostEqual(clock.now, 2.5)
+    
+    def test_delivery_reports(self):
+        region = MalawiRegion.objects.create(name='Testland', region='central')
+        farmer = create_farmer('sms', '+265991000001', region)
+        for message_id in ['m1', 'm2']:
+            OutboundMessage.objects.create(
+                farmer=farmer, phone_number=farmer.phone_number, language='en', body='Hello',
+                status='sent', gateway_message_id=message_id,
+            )
+        reports = [
+            {'message_id': 'm1', 'status': 'delivered'},
+            {'message_id': 'm2', 'status': 'failed', 'error': 'Absent subscriber'},
+            'not a report', None, {'status': 'delivered'},
+        ]
+        self.assertEqual(record_delivery_reports(reports), 2)
+        statuses = dict(OutboundMessage.objects.values_list('gateway_message_id', 'status'))
+        self.assertEqual(statuses, {'m1': 'delivered', 'm2': 'failed'})
+        
+        with self.settings(SMS_DELIVERY_TOKEN='gateway-secret'):
+            for body in ['{"reports": 5}', '{"reports": {"message_id": "m1"}}', '[]', 'not json']:
+                response = self.client.post(
+                    reverse('sms_delivery_report'), body, content_type='application/json',
+                    HTTP_AUTHORIZATION='Bearer gateway-secret',
+                )
+                self.assertEqual(response.status_code, 400, body)
+    
+    def test_delivery_reports_need_a_configured_token(self):
+        body = '{"reports": [{"message_id": "m1", "status": "delivered"}]}'
+        for token, header in [('', ''), ('', 'Bearer '), ('gateway-secret', 'Bearer guess')]:
+            with self.settings(SMS_DELIVERY_TOKEN=token):
+                response = self.client.post(
+                    reverse('sms_delivery_report'), body, content_type='application/json', HTTP_AUTHORIZATION=header,
+                )
+                self.assertEqual(response.status_code, 403, (token, header))
+
+
+class UssdMenuTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.crops = [create_crop(f'Crop {letter}', name_ny=f'Mbewu {letter}') for letter in 'ABCDEFGHI']
+    
+    def setUp(self):
+        # Versions start over with each test's rolled back database
+        UssdService._menus = None
+    
+    def session(self, language='en', preferred_ids=()):
+        return {
+            'language': language, 'farmer_id': None, 'location_id': None,
+            'crop_ids': UssdService().menu_crop_ids(preferred_ids),
+        }
+    
+    def test_menus_page_and_put_the_farmers_crops_first(self):
+        service = UssdService()
+        session = self.session(preferred_ids={self.crops[-1].id})
+        more, text = service.respond(session, [])
+        self.assertTrue(more)
+        lines = text.splitlines()
+        self.assertEqual(lines[:3], ['Choose a crop:', '1. Crop I', '2. Crop A'])
+        self.assertEqual(lines[-1], '9. More')
+        
+        more, text = service.respond(session, ['9'])
+        self.assertEqual(text.splitlines()[1:], ['1. Crop G', '2. Crop H'])
+        more, text = service.respond(session, ['9', '2'])
+        self.assertTrue(text.startswith('Advice for Crop H:'))
+        self.assertEqual(service.respond(session, ['8']), (False, 'Invalid choice. Please dial again.'))
+    
+    def test_menus_follow_crop_changes(self):
+        service = UssdService()
+        session = self.session(language='ny')
+        self.assertIn('1. Mbewu A', service.respond(session, [])[1])
+        
+        self.crops[0].name_ny = 'Chimanga'
+        self.crops[0].save()
+        self.assertIn('1. Chimanga', service.respond(session, [])[1])
+        # A crop deleted during the session drops out of its menu
+        self.crops[0].delete()
+        self.assertIn('1. Mbewu B', service.respond(session, [])[1])
+
+
+@override_settings(SYNC_PAGE_SIZE=5, SYNC_INITIAL_DAYS=10)
+class SyncTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = MalawiRegion.objects.create(name='Testland', region='central')
+        cls.other_region = MalawiRegion.objects.create(name='Elsewhere', region='northern')
+        cls.crop = create_crop('Test Maize')
+        cls.farmer = create_farmer('sync', '+265991000002', cls.region, [cls.crop])
+        today = timezone.localdate()
+        for region in [cls.region, cls.other_region]:
+            for days in range(20):
+                WeatherData.objects.create(
+                    location=region, date=today - timedelta(days=days), temperature_max=28,
+                    temperature_min=18, humidity=60, weather_condition='Sunny',
+                )
+    
+    def setUp(self):
+        # Last-seen times queued by the requests would otherwise be flushed
+        # at exit, after the test database is gone
+        self.addCleanup(write_behind.clear)
+    
+    def sync_all(self, cursor=None):
+        """Follow has_more to the end; returns (weather dates, deleted weather ids, cursor)"""
+        dates, deleted = set(), set()
+        while True:
+            url = reverse('api_sync') + (f'?since={cursor}' if cursor else '')
+            data = self.client.get(url).json()
+            dates.update(row['date'] for row in data['weather'])
+            deleted.update(data['deleted']['weather'])
+            cursor = data['cursor']
+            if not data['has_more']:
+                return dates, deleted, cursor
+    
+    def test_first_sync_pages_keep_the_initial_window(self):
+        self.client.force_login(self.farmer.user)
+        dates, deleted, cursor = self.sync_all()
+        start = timezone.localdate() - timedelta(days=10)
+        self.assertEqual(len(dates), 11)
+        self.assertEqual(min(dates), start.isoformat())
+        self.assertNotIn(':', cursor)
+    
+    def test_tombstones_are_scoped_and_paged(self):
+        self.client.force_login(self.farmer.user)
+        since = SyncService.encode_cursor(timezone.now())
+        own_ids = set(WeatherData.objects.filter(location=self.region).values_list('id', flat=True))
+        WeatherData.objects.all().delete()
+        
+        dates, deleted, cursor = self.sync_all(since)
+        self.assertEqual(deleted, own_ids)
+    
+    def test_invalid_cursor(self):
+        self.client.force_login(self.farmer.user)
+        for cursor in ['abc', '-5', '1:not-a-date']:
+            self.assertEqual(self.client.get(f"{reverse('api_sync')}?since={cursor}").status_code, 400)
+
+
+class ImportFarmersTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = MalawiRegion.objects.create(name='Testland', region='central')
+        cls.maize = create_crop('Maize', name_ny='Chimanga')
+        cls.beans = create_crop('Beans', crop_type='legume')
+        create_farmer('existing', '+265991000003', cls.region)
+    
+    def import_roster(self, rows, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as handle:
+            handle.write('name,phone,district,farm_size,crops,language,password\n')
+            handle.writelines(f'{row}\n' for row in rows)
+        self.addCleanup(os.remove, handle.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_farmers', handle.name, '--workers=1', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+    
+    def test_import_creates_accounts_and_rejects_bad_rows(self):
+        stdout, stderr = self.import_roster([
+            'Chisomo Banda,0991000004,testland,1.5,Chimanga;Beans,ny,',
+            'Mphatso Phiri,+265 991 000 005,Testland,3,maize,,secret-pass',
+            'Duplicate,0991000003,Testland,1,,,',
+            'Nowhere,0991000006,Atlantis,1,,,',
+            'No Crop,0991000007,Testland,1,rice,,',
+        ], '--send-codes')
+        self.assertIn('created 2 farmers, queued 1 codes, rejected 3', stdout)
+        self.assertIn("unknown district 'Atlantis'", stderr)
+        
+        farmer = Farmer.objects.get(phone_number='+265991000004')
+        self.assertEqual(farmer.preferred_language, 'ny')
+        self.assertEqual(set(farmer.primary_crops.all()), {self.maize, self.beans})
+        self.assertEqual((farmer.user.first_name, farmer.user.last_name), ('Chisomo', 'Banda'))
+        self.assertFalse(farmer.user.has_usable_password())
+        self.assertTrue(AccountClaim.objects.filter(farmer=farmer).exists())
+        self.assertEqual(OutboundMessage.objects.get(farmer=farmer).language, 'ny')
+        
+        other = Farmer.objects.get(phone_number='+265991000005')
+        self.assertTrue(other.user.check_password('secret-pass'))
+        self.assertFalse(AccountClaim.objects.filter(farmer=other).exists())
+    
+    def test_dry_run_writes_nothing(self):
+        stdout, stderr = self.import_roster(['Chisomo Banda,0991000004,Testland,1.5,,,'], '--dry-run')
+        self.assertIn('created 1 farmers', stdout)
+        self.assertFalse(Farmer.objects.filter(phone_number='+265991000004').exists())
+
+
+class WeatherAlertTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = MalawiRegion.objects.create(name='Testland', region='central')
+        cls.other_region = MalawiRegion.objects.create(name='Elsewhere', region='northern')
+        cls.maize = create_crop('Test Maize')
+        cls.beans = create_crop('Test Beans', crop_type='legume')
+        cls.farmers = [
+            create_farmer('alert1', '+265991000011', cls.region, [cls.maize, cls.beans]),
+            create_farmer('alert2', '+265991000012', cls.region, [cls.maize]),
+            create_farmer('alert3', '+265991000013', cls.other_region, [cls.maize]),
+        ]
+    
+    def add_weather(self, days=0, rainfall=80):
+        return WeatherData.objects.create(
+            location=self.region, date=timezone.localdate() + timedelta(days=days), temperature_max=28,
+            temperature_min=18, humidity=70, rainfall=rainfall, weather_condition='Heavy Rain',
+        )
+    
+    def test_saving_urgent_weather_only_flags_it(self):
+        weather = self.add_weather()
+        weather.refresh_from_db()
+        self.assertTrue(weather.alert_pending)
+        self.assertFalse(CropAdvice.objects.exists())
+        self.assertFalse(self.add_weather(days=1, rainfall=0).alert_pending)
+    
+    def test_fan_out_pending_alerts_the_district_once(self):
+        weather = self.add_weather()
+        created = WeatherAlertService().fan_out_pending()
+        expected = {
+            (self.farmers[0].id, self.maize.id), (self.farmers[0].id, self.beans.id),
+            (self.farmers[1].id, self.maize.id),
+        }
+        self.assertEqual({(advice.farmer_id, advice.crop_id) for advice in created}, expected)
+        self.assertTrue(all(advice.is_urgent and advice.weather_context_id == weather.id for advice in created))
+        self.assertEqual(OutboundMessage.objects.count(), 3)
+        weather.refresh_from_db()
+        self.assertFalse(weather.alert_pending)
+        
+        # Saving the row again flags it, but nobody is alerted twice
+        weather.rainfall = 90
+        weather.save()
+        self.assertEqual(WeatherAlertService().fan_out_pending(), [])
+        self.assertEqual(CropAdvice.objects.count(), 3)
+    
+    def test_fan_out_skips_calm_and_past_weather(self):
+        service = WeatherAlertService()
+        self.assertEqual(service.fan_out(self.add_weather(rainfall=0)), [])
+        self.assertEqual(service.fan_out(self.add_weather(days=-1)), [])
+        self.assertFalse(CropAdvice.objects.exists())
+
+
+class RequestProfilingTests(TestCase):
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+    
+    def test_profiled_request_is_recorded_and_summarized(self):
+        with self.settings(
+            REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_DIR=self.directory,
+            REQUEST_PROFILING_SAMPLE_RATE=1, REQUEST_PROFILING_MODE='cprofile',
+        ):
+            response = self.client.get(reverse('homepage'))
+        self.assertIn('db;desc=', response['Server-Timing'])
+        self.assertEqual(len(list(Path(self.directory).glob('*.prof'))), 1)
+        
+        out = StringIO()
+        call_command('profile_summary', dir=self.directory, json=True, stdout=out)
+        [row] = json.loads(out.getvalue())
+        self.assertEqual((row['view'], row['requests']), ('homepage', 1))
+        self.assertEqual(len(row['slowest_profiles']), 1)
+    
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('homepage'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(TestCase):
+    
+    @override_settings(METRICS_TOKEN='')
+    def test_refused_without_a_configured_token(self):
+        # Behind nginx every client is 127.0.0.1, so that must not let anyone in
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+    
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_scrape_with_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        wrong = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer guess')
+        self.assertEqual(wrong.status_code, 403)
+        
+        self.client.get(reverse('homepage'))
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('crop_advisor_request_duration_seconds_bucket{', body)
+        self.assertIn('url_name="homepage"', body)
+
+
+class AlertStreamTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = MalawiRegion.objects.create(name='Testland', region='central')
+        cls.crop = create_crop('Testcrop')
+        cls.farmer = create_farmer('streamer', '+265991000002', cls.region, [cls.crop])
+    
+    def add_advice(self, title):
+        return CropAdvice.objects.create(
+            farmer=self.farmer, crop=self.crop, advice_type='pest', title_en=title, content_en=title, is_urgent=True,
+        )
+    
+    async def collect(self, last_event_id):
+        farmer = {'id': self.farmer.id, 'location_id': self.region.id}
+        return [chunk async for chunk in _alert_events(farmer, last_event_id)]
+    
+    def test_parse_event_id(self):
+        self.assertEqual(_parse_event_id('12-7'), (12, 7))
+        for value in (None, '', '12', '12-x', '1-2-3'):
+            self.assertIsNone(_parse_event_id(value), value)
+    
+    @override_settings(ALERT_STREAM_MAX_SECONDS=0)
+    def test_resume_sends_only_what_was_missed(self):
+        seen = self.add_advice('Seen before the reconnect')
+        missed = self.add_advice('Missed while offline')
+        weather = WeatherData.objects.create(
+            location=self.region, date=timezone.localdate() - timedelta(days=1), temperature_max=28,
+            temperature_min=18, humidity=60, rainfall=0, weather_condition='Sunny',
+        )
+        
+        chunks = async_to_sync(self.collect)((seen.id, 0))
+        self.assertTrue(chunks[0].startswith('retry: '))
+        ids = re.findall(r'^id: (\S+)$', ''.join(chunks), re.MULTILINE)
+        self.assertEqual(ids, [f'{missed.id}-0', f'{missed.id}-{weather.id}'])
+        self.assertIn('Missed while offline', chunks[1])
+        self.assertNotIn('Seen before the reconnect', ''.join(chunks))
+    
+    def test_refused_outside_asgi(self):
+        self.addCleanup(write_behind.clear)
+        self.client.force_login(self.farmer.user)
+        self.assertEqual(self.client.get(reverse('alert_stream')).status_code, 501)
+
+
+class ServiceWorkerTests(TestCase):
+    
+    def test_served_uncached_with_the_offline_page(self):
+        response = self.client.get(reverse('service_worker'))
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertIn('no-cache', response['Cache-Control'])
+        body = response.content.decode()
+        self.assertRegex(body, r"const VERSION = '[0-9a-f]{12}';")
+        self.assertIn(f"const OFFLINE_URL = '{reverse('offline')}';", body)
+        self.assertEqual(self.client.get(reverse('offline')).status_code, 200)
@@ -1,6 +1,6 @@
-from django.urls import path
+from django.urls import include, path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Main pages
@@ -14,17 +14,43 @@ urlpatterns = [
     path('register/', views.register_farmer, name='register'),
     path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
+    path('account/claim/', views.claim_account, name='claim_account'),
     
     # Farmer dashboard and profile
     path('dashboard/', views.farmer_dashboard, name='farmer_dashboard'),
     path('profile/', views.complete_profile, name='complete_profile'),
     path('advice/get/', views.get_advice, name='get_advice'),
     path('advice/history/', views.advice_history, name='advice_history'),
+    path('advice/planting/', views.set_planting_date, name='set_planting_date'),
+    
+    # Monitoring
+    path('metrics', views.metrics, name='metrics'),
+    
+    # Gateway callbacks
+    path('sms/delivery/', views.sms_delivery_report, name='sms_delivery_report'),
+    path('ussd/', views.ussd, name='ussd'),
     
     # Language switching
     path('set-language/', views.set_language, name='set_language'),
     
+    # Offline support
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('offline/', views.offline, name='offline'),
+    
     # API endpoints
     path('api/weather/<int:region_id>/', views.api_weather, name='api_weather'),
     path('api/prices/<int:crop_id>/', views.api_market_prices, name='api_market_prices'),
+    path('api/prices/<int:crop_id>/trends/', views.api_price_trends, name='api_price_trends'),
+    path('api/prices/<int:crop_id>/compare/', views.api_price_comparison, name='api_price_comparison'),
+    path('api/session/', views.api_session, name='api_session'),
+    path('api/alerts/stream/', views.alert_stream, name='alert_stream'),
+    path('api/search/', views.api_search, name='api_search'),
+    path('api/recommendations/<int:region_id>/', views.api_crop_recommendations, name='api_crop_recommendations'),
+    path('api/crops/in-season/<int:region_id>/', views.api_seasonal_crops, name='api_seasonal_crops'),
+    
+    # REST API, versioned by URL namespace
+    path('api/v1/', include((api.router.urls, 'api'), namespace='v1')),
+    path('api/sync/', views.api_sync, name='api_sync'),
+    path('api/reference/', views.api_reference, name='api_reference'),
+    path('api/reference/<str:version>/', views.api_reference_bundle, name='api_reference_bundle'),
 ]
\ No newline at end of file
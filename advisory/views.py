@@ -4,38 +4,79 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
 from django.utils.translation import gettext as _, activate, get_language
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.core.paginator import Paginator
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.db.models import Q, Max
+from asgiref.sync import sync_to_async
 from datetime import datetime, timedelta
 from .models import (
     MalawiRegion, Crop, Farmer, WeatherData, CropAdvice, 
-    FarmingCalendar, MarketPrice
+    FarmingCalendar, MarketPrice, CropPlanting, MarketPriceRollup
 )
-from .forms import FarmerRegistrationForm, FarmerProfileForm
-from .services import AdvisoryService, WeatherService
+from .forms import FarmerRegistrationForm, FarmerProfileForm, AccountClaimForm
+from .services import (
+    AdvisoryService, WeatherService, FarmingCalendarService, SuitabilityService, UssdService,
+    ReferenceBundleService, SyncService
+)
+from .decorators import page_shell
+from .caching import get_cache_version
+from .writebehind import write_behind
+from .metrics import render_metrics
+from .events import broker, farmer_channel, district_channel, advice_event, weather_event
+from .sms import record_delivery_reports, normalize_phone
+import asyncio
+import hashlib
 import json
+import re
 
 def set_language(request):
     """Set user's preferred language"""
     language = request.GET.get('language', 'en')
+    response = redirect(request.META.get('HTTP_REFERER', '/'))
     if language in ['en', 'ny']:
         activate(language)
         request.session['django_language'] = language
         
-        # Update farmer's preferred language if logged in
+        # Cacheable page shells pick the language from this cookie
+        response.set_cookie(
+            settings.LANGUAGE_COOKIE_NAME, language,
+            max_age=settings.LANGUAGE_COOKIE_AGE,
+            samesite=settings.LANGUAGE_COOKIE_SAMESITE,
+        )
+        
+        # Update farmer's preferred language if logged in; the session and
+        # cookie already carry it, so the row can wait for the next flush
         if request.user.is_authenticated and hasattr(request.user, 'farmer'):
             farmer = request.user.farmer
-            farmer.preferred_language = language
-            farmer.save()
+            if farmer.preferred_language != language:
+                farmer.preferred_language = language
+                write_behind.set(Farmer, farmer.pk, preferred_language=language)
     
-    return redirect(request.META.get('HTTP_REFERER', '/'))
+    return response
 
+@page_shell
 def homepage(request):
     """Homepage with language selection and basic info"""
     # Get current language from session or user preference
-    if request.user.is_authenticated and hasattr(request.user, 'farmer'):
+    if getattr(request, 'page_shell', False):
+        # Shells must not touch the session, so use the language picked
+        # by LocaleMiddleware from the language cookie
+        language = get_language()
+    elif request.user.is_authenticated and hasattr(request.user, 'farmer'):
         language = request.user.farmer.preferred_language
         activate(language)
     else:
@@ -89,6 +130,20 @@ def register_farmer(request):
     }
     return render(request, 'advisory/register.html', context)
 
+def claim_account(request):
+    """Let a farmer imported from a cooperative roster set a password with their SMS code"""
+    if request.method == 'POST':
+        form = AccountClaimForm(request.POST)
+        if form.is_valid():
+            user = form.save()
+            login(request, user)
+            messages.success(request, _('Password set. Your username is %(username)s') % {'username': user.username})
+            return redirect('farmer_dashboard')
+    else:
+        form = AccountClaimForm()
+    
+    return render(request, 'registration/claim_account.html', {'form': form})
+
 @login_required
 def farmer_dashboard(request):
     """Farmer dashboard with personalized advice"""
@@ -105,7 +160,7 @@ def farmer_dashboard(request):
     recent_advice = CropAdvice.objects.filter(
         farmer=farmer,
         created_at__gte=timezone.now() - timedelta(days=30)
-    )[:5]
+    ).select_related('crop')[:5]
     
     # Get current weather for farmer's location
     current_weather = None
@@ -117,24 +172,30 @@ def farmer_dashboard(request):
     
     # Get farming calendar for current month
     current_month = timezone.now().month
-    farming_activities = FarmingCalendar.objects.filter(
+    farming_activities = FarmingCalendarService().get_month_entries(
+        current_month,
         region=farmer.location,
-        month=current_month,
-        crop__in=farmer.primary_crops.all()
+        crop_ids=farmer.primary_crops.values_list('id', flat=True)
     ) if farmer.location else []
     
+    # Farmer's crops that can be planted or harvested this month
+    plantable_crops = farmer.primary_crops.plantable_in(current_month)
+    harvestable_crops = farmer.primary_crops.harvestable_in(current_month)
+    
     # Get market prices for farmer's crops
     market_prices = MarketPrice.objects.filter(
         crop__in=farmer.primary_crops.all(),
         location=farmer.location,
         date__gte=timezone.now().date() - timedelta(days=7)
-    ).order_by('-date')[:10] if farmer.location else []
+    ).select_related('crop', 'location').order_by('-date')[:10] if farmer.location else []
     
     context = {
         'farmer': farmer,
         'recent_advice': recent_advice,
         'current_weather': current_weather,
         'farming_activities': farming_activities,
+        'plantable_crops': plantable_crops,
+        'harvestable_crops': harvestable_crops,
         'market_prices': market_prices,
         'current_language': farmer.preferred_language,
     }
@@ -192,10 +253,48 @@ def get_advice(request):
     context = {
         'crops': crops,
         'advice_types': CropAdvice.ADVICE_TYPES,
+        'plantings': {
+            planting.crop_id: planting.planting_date
+            for planting in farmer.plantings.all()
+        },
     }
     
     return render(request, 'advisory/get_advice.html', context)
 
+@login_required
+def set_planting_date(request):
+    """Record or clear when the farmer planted one of their crops"""
+    try:
+        farmer = request.user.farmer
+    except Farmer.DoesNotExist:
+        messages.error(request, _('Please complete your farmer profile first.'))
+        return redirect('complete_profile')
+    
+    if request.method == 'POST':
+        crop_id = request.POST.get('crop_id', '')
+        if not crop_id.isdigit():
+            messages.error(request, _('Please choose one of your crops.'))
+            return redirect('get_advice')
+        crop = get_object_or_404(farmer.primary_crops, id=crop_id)
+        planting_date = request.POST.get('planting_date')
+        
+        if planting_date:
+            try:
+                planting_date = datetime.strptime(planting_date, '%Y-%m-%d').date()
+            except ValueError:
+                messages.error(request, _('Please enter a valid planting date.'))
+                return redirect('get_advice')
+            CropPlanting.objects.update_or_create(
+                farmer=farmer, crop=crop, defaults={'planting_date': planting_date}
+            )
+            messages.success(request, _('Planting date saved.'))
+        else:
+            CropPlanting.objects.filter(farmer=farmer, crop=crop).delete()
+            messages.success(request, _('Planting date cleared.'))
+    
+    return redirect('get_advice')
+
+@page_shell
 def crop_list(request):
     """List all available crops"""
     crops = Crop.objects.all()
@@ -224,18 +323,20 @@ def crop_list(request):
     
     return render(request, 'advisory/crop_list.html', context)
 
+@page_shell
 def crop_detail(request, crop_id):
     """Detailed view of a specific crop"""
     crop = get_object_or_404(Crop, id=crop_id)
+    write_behind.increment(Crop, crop.pk, 'view_count')
     
     # Get farming calendar for this crop
-    farming_calendar = FarmingCalendar.objects.filter(crop=crop).order_by('month')
+    farming_calendar = FarmingCalendar.objects.filter(crop=crop).select_related('region').order_by('month', 'region_group')
     
     # Get recent market prices
     market_prices = MarketPrice.objects.filter(
         crop=crop,
         date__gte=timezone.now().date() - timedelta(days=30)
-    ).order_by('-date')[:10]
+    ).select_related('location').order_by('-date')[:10]
     
     context = {
         'crop': crop,
@@ -245,17 +346,22 @@ def crop_detail(request, crop_id):
     
     return render(request, 'advisory/crop_detail.html', context)
 
+@page_shell
 def weather_info(request):
     """Weather information for all regions"""
-    regions = MalawiRegion.objects.all()
-    weather_data = {}
+    regions = list(MalawiRegion.objects.order_by('region', 'name'))
+    weather_data = {region.id: [] for region in regions}
     
+    # One query for every district's week instead of one per district
+    recent_weather = WeatherData.objects.filter(
+        location_id__in=list(weather_data),
+        date__gte=timezone.now().date() - timedelta(days=7)
+    ).order_by('location_id', '-date')
+    for weather in recent_weather:
+        if len(weather_data[weather.location_id]) < 7:
+            weather_data[weather.location_id].append(weather)
     for region in regions:
-        recent_weather = WeatherData.objects.filter(
-            location=region,
-            date__gte=timezone.now().date() - timedelta(days=7)
-        ).order_by('-date')[:7]
-        weather_data[region.id] = recent_weather
+        region.recent_weather = weather_data[region.id]
     
     context = {
         'regions': regions,
@@ -264,28 +370,41 @@ def weather_info(request):
     
     return render(request, 'advisory/weather.html', context)
 
+@page_shell
 def farming_calendar_view(request):
-    """Farming calendar for all crops and regions"""
+    """Farming calendar for one month, optionally narrowed to a district"""
     current_month = timezone.now().month
     
-    # Get activities for current month
-    current_activities = FarmingCalendar.objects.filter(month=current_month)
+    try:
+        selected_month = int(request.GET.get('month', current_month))
+    except ValueError:
+        selected_month = current_month
+    if not 1 <= selected_month <= 12:
+        selected_month = current_month
+    
+    selected_region = None
+    region_id = request.GET.get('region')
+    if region_id:
+        selected_region = get_object_or_404(MalawiRegion, id=region_id)
     
-    # Get all months for navigation
-    all_activities = FarmingCalendar.objects.all().order_by('month', 'crop__name_en')
+    # Entries resolve from an in-memory index of national, regional and
+    # district rows, so the cost no longer grows with the number of districts
+    activities = FarmingCalendarService().get_month_entries(selected_month, region=selected_region)
     
-    # Group by month
-    activities_by_month = {}
-    for activity in all_activities:
-        if activity.month not in activities_by_month:
-            activities_by_month[activity.month] = []
-        activities_by_month[activity.month].append(activity)
+    # Lazy, so they only run when the cached fragment has expired
+    plantable_crops = Crop.objects.plantable_in(selected_month, selected_region).order_by('name_en')
+    harvestable_crops = Crop.objects.harvestable_in(selected_month, selected_region).order_by('name_en')
     
     context = {
         'current_month': current_month,
-        'current_activities': current_activities,
-        'activities_by_month': activities_by_month,
+        'selected_month': selected_month,
+        'selected_region': selected_region,
+        'activities': activities,
+        'plantable_crops': plantable_crops,
+        'harvestable_crops': harvestable_crops,
+        'regions': MalawiRegion.objects.order_by('region', 'name'),
         'months': FarmingCalendar.MONTHS,
+        'calendar_version': get_cache_version('farming_calendar'),
     }
     
     return render(request, 'advisory/farming_calendar.html', context)
@@ -299,45 +418,97 @@ def advice_history(request):
         messages.error(request, _('Please complete your farmer profile first.'))
         return redirect('complete_profile')
     
-    advice_list = CropAdvice.objects.filter(farmer=farmer).order_by('-created_at')
+    advice_list = CropAdvice.objects.filter(farmer=farmer).select_related('crop').order_by('-created_at')
+    page = Paginator(advice_list, 20).get_page(request.GET.get('page'))
     
     context = {
-        'advice_list': advice_list,
+        'advice_list': page,
+        'page_obj': page,
     }
     
     return render(request, 'advisory/advice_history.html', context)
 
-def api_weather(request, region_id):
+# Same-origin static files the service worker stores on install
+OFFLINE_STATIC_FILES = ['css/style.css', 'js/main.js']
+
+def _service_worker_version():
+    """Hash of the precached static files, so editing one refreshes the cache"""
+    digest = hashlib.sha256()
+    for path in OFFLINE_STATIC_FILES:
+        found = finders.find(path)
+        if found:
+            with open(found, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+@never_cache
+def service_worker(request):
+    """Service worker script, served from the root so its scope covers every page"""
+    context = {
+        'version': _service_worker_version(),
+        'precache': (
+            [static(path) for path in OFFLINE_STATIC_FILES]
+            + [reverse('offline')]
+            + list(settings.OFFLINE_CDN_ASSETS)
+        ),
+        'static_prefix': settings.STATIC_URL,
+        'offline_url': reverse('offline'),
+        'advice_url': reverse('get_advice'),
+        'logout_url': reverse('logout'),
+    }
+    return render(request, 'sw.js', context, content_type='application/javascript')
+
+@page_shell
+def offline(request):
+    """Fallback page the service worker shows when a page isn't cached"""
+    return render(request, 'advisory/offline.html')
+
+def _weather_data(weather):
+    return {
+        'date': weather.date.isoformat(),
+        'temp_max': weather.temperature_max,
+        'temp_min': weather.temperature_min,
+        'humidity': weather.humidity,
+        'rainfall': weather.rainfall,
+        'condition': weather.weather_condition,
+    }
+
+async def api_weather(request, region_id):
     """API endpoint for weather data"""
-    region = get_object_or_404(MalawiRegion, id=region_id)
+    region = await MalawiRegion.objects.filter(id=region_id).afirst()
+    if region is None:
+        raise Http404
+    
+    today = timezone.now().date()
     weather = WeatherData.objects.filter(
         location=region,
-        date__gte=timezone.now().date() - timedelta(days=7)
+        date__gte=today - timedelta(days=7)
     ).order_by('-date')
     
-    data = []
-    for w in weather:
-        data.append({
-            'date': w.date.isoformat(),
-            'temp_max': w.temperature_max,
-            'temp_min': w.temperature_min,
-            'humidity': w.humidity,
-            'rainfall': w.rainfall,
-            'condition': w.weather_condition,
-        })
+    data = [_weather_data(w) async for w in weather]
+    
+    # Today's row is usually in the week already; only ask the provider otherwise
+    if data and data[0]['date'] == today.isoformat():
+        current = data[0]
+    else:
+        current_weather = await WeatherService().aget_current_weather(region)
+        current = _weather_data(current_weather) if current_weather else None
     
-    return JsonResponse({'weather_data': data})
+    return JsonResponse({'weather_data': data, 'current': current})
 
-def api_market_prices(request, crop_id):
+async def api_market_prices(request, crop_id):
     """API endpoint for market prices"""
-    crop = get_object_or_404(Crop, id=crop_id)
+    crop = await Crop.objects.filter(id=crop_id).afirst()
+    if crop is None:
+        raise Http404
+    
     prices = MarketPrice.objects.filter(
         crop=crop,
         date__gte=timezone.now().date() - timedelta(days=30)
-    ).order_by('-date')
+    ).select_related('location').order_by('-date')
     
     data = []
-    for price in prices:
+    async for price in prices:
         data.append({
             'date': price.date.isoformat(),
             'price': float(price.price_per_kg),
@@ -346,3 +517,389 @@ def api_market_prices(request, crop_id):
         })
     
     return JsonResponse({'price_data': data})
+
+async def api_search(request):
+    """API endpoint for the search boxes: crops and districts matching ?q="""
+    query = request.GET.get('q', '').strip()
+    search_type = request.GET.get('type', 'all')
+    if len(query) < 2:
+        return JsonResponse([], safe=False)
+    
+    results = []
+    if search_type in ('all', 'crops'):
+        crops = Crop.objects.filter(
+            Q(name_en__icontains=query) | Q(name_ny__icontains=query) | Q(scientific_name__icontains=query)
+        ).order_by('name_en')[:10]
+        async for crop in crops:
+            results.append({
+                'type': 'crop',
+                'url': reverse('crop_detail', args=[crop.id]),
+                'title': f'{crop.name_en} ({crop.name_ny})' if crop.name_ny else crop.name_en,
+                'description': crop.get_crop_type_display(),
+            })
+    if search_type in ('all', 'districts'):
+        regions = MalawiRegion.objects.filter(name__icontains=query).order_by('name')[:10]
+        async for region in regions:
+            results.append({
+                'type': 'district',
+                'url': f"{reverse('crop_list')}?region={region.id}",
+                'title': region.name,
+                'description': region.get_region_display(),
+            })
+    
+    return JsonResponse(results, safe=False)
+
+def _parse_event_id(value):
+    """Split an alert stream event id into its (advice, weather) high-water marks"""
+    try:
+        advice_id, weather_id = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    return advice_id, weather_id
+
+def _sse(event, event_id):
+    return f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def _alert_events(farmer, last_event_id):
+    advice_hwm, weather_hwm = last_event_id
+    urgent_advice = CropAdvice.objects.filter(farmer_id=farmer['id'], is_urgent=True)
+    district_weather = WeatherData.objects.filter(location_id=farmer['location_id'])
+    
+    # Subscribe before catching up so nothing saved in between is missed;
+    # the high-water marks drop anything delivered twice
+    subscription = broker.subscribe([
+        farmer_channel(farmer['id']), district_channel(farmer['location_id']),
+    ])
+    try:
+        yield f"retry: {settings.ALERT_STREAM_RETRY_MS}\n\n"
+        
+        # Only the latest of what was missed is still worth showing
+        missed_advice = [
+            advice_event(advice)
+            async for advice in urgent_advice.filter(id__gt=advice_hwm).order_by('-id')[:20]
+        ]
+        missed_weather = [
+            weather_event(weather)
+            async for weather in district_weather.filter(id__gt=weather_hwm).order_by('-id')[:7]
+        ]
+        backlog = missed_advice[::-1] + missed_weather[::-1]
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ALERT_STREAM_MAX_SECONDS
+        while backlog or loop.time() < deadline:
+            if backlog:
+                event = backlog.pop(0)
+            else:
+                timeout = min(settings.ALERT_STREAM_HEARTBEAT_SECONDS, deadline - loop.time())
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+            
+            if event['type'] == 'advice':
+                if event['id'] <= advice_hwm:
+                    continue
+                advice_hwm = event['id']
+            else:
+                if event['id'] <= weather_hwm:
+                    continue
+                weather_hwm = event['id']
+            yield _sse(event, f'{advice_hwm}-{weather_hwm}')
+            
+            if subscription.overflowed:
+                # Too far behind: end the stream and let the client resume
+                break
+    finally:
+        subscription.close()
+
+async def alert_stream(request):
+    """Server-sent events: urgent advice and new weather for the farmer's district"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the lifetime of the stream
+        return JsonResponse({'error': 'Alert streams require the ASGI server'}, status=501)
+    
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=403)
+    farmer = await Farmer.objects.filter(user=user).values('id', 'location_id').afirst()
+    if farmer is None:
+        raise Http404
+    
+    last_event_id = _parse_event_id(
+        request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    if last_event_id is None:
+        # A fresh stream only carries what happens from now on
+        advice_hwm = await CropAdvice.objects.filter(
+            farmer_id=farmer['id'], is_urgent=True
+        ).aaggregate(hwm=Max('id'))
+        weather_hwm = await WeatherData.objects.filter(
+            location_id=farmer['location_id']
+        ).aaggregate(hwm=Max('id'))
+        last_event_id = (advice_hwm['hwm'] or 0, weather_hwm['hwm'] or 0)
+    
+    response = StreamingHttpResponse(
+        _alert_events(farmer, last_event_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _ussd_session(session_id, phone_number):
+    """Farmer details and crop menu order for a USSD session, kept in the cache"""
+    key = f'ussd:session:{session_id}'
+    session = cache.get(key)
+    if session is None:
+        normalized = normalize_phone(phone_number)
+        candidates = {phone_number, normalized} if normalized else {phone_number}
+        if normalized:
+            # Farmers type their numbers in either form
+            candidates.add('0' + normalized[1 + len(settings.SMS_COUNTRY_CODE):])
+        farmer = Farmer.objects.filter(phone_number__in=candidates).values(
+            'id', 'location_id', 'preferred_language'
+        ).first()
+        crop_ids = []
+        if farmer:
+            crop_ids = list(
+                Farmer.primary_crops.through.objects.filter(farmer_id=farmer['id']).values_list('crop_id', flat=True)
+            )
+        session = {
+            'farmer_id': farmer['id'] if farmer else None,
+            'location_id': farmer['location_id'] if farmer else None,
+            'language': farmer['preferred_language'] if farmer else 'en',
+            'crop_ids': UssdService().menu_crop_ids(set(crop_ids)),
+        }
+    # Refresh the timeout on every step of the session
+    cache.set(key, session, settings.USSD_SESSION_TIMEOUT)
+    return session
+
+@csrf_exempt
+@require_POST
+def ussd(request):
+    """USSD gateway callback: sessionId, phoneNumber and the inputs so far as text ("1*2")"""
+    # Replies carry a farmer's own advice, so only the gateway may ask
+    token = settings.USSD_TOKEN
+    in_url = bool(token) and constant_time_compare(request.GET.get('token', ''), token)
+    if not (in_url or _has_token(request, token)):
+        return HttpResponse(status=403)
+    session_id = request.POST.get('sessionId', '')
+    phone_number = request.POST.get('phoneNumber', '')
+    if not session_id or not phone_number:
+        return HttpResponse('END Invalid request', content_type='text/plain', status=400)
+    
+    session = _ussd_session(session_id, phone_number)
+    text = request.POST.get('text', '').strip()
+    more, reply = UssdService().respond(session, text.split('*') if text else [])
+    if not more:
+        cache.delete(f'ussd:session:{session_id}')
+    return HttpResponse(f"{'CON' if more else 'END'} {reply}", content_type='text/plain')
+
+@csrf_exempt
+@require_POST
+def sms_delivery_report(request):
+    """Delivery reports from the SMS gateway: {"reports": [{"message_id", "status", "error"}]}"""
+    # Without a configured token anyone could mark messages delivered or failed
+    if not _has_token(request, settings.SMS_DELIVERY_TOKEN):
+        return JsonResponse({'error': 'Invalid token'}, status=403)
+    try:
+        reports = json.loads(request.body)['reports']
+    except (ValueError, KeyError, TypeError):
+        reports = None
+    if not isinstance(reports, list):
+        return JsonResponse({'error': 'Expected {"reports": [...]}'}, status=400)
+    
+    return JsonResponse({'updated': record_delivery_reports(reports)})
+
+def _has_token(request, token):
+    """True when a token is configured and the request sends it as a bearer token"""
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+@never_cache
+def metrics(request):
+    """Prometheus metrics, for scrapers sending METRICS_TOKEN"""
+    if not _has_token(request, settings.METRICS_TOKEN):
+        return HttpResponse(status=403)
+    
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+@never_cache
+def api_session(request):
+    """API endpoint for the personalized fragments of cacheable pages"""
+    data = {
+        'authenticated': request.user.is_authenticated,
+        'display_name': '',
+        'language': get_language(),
+        'messages': [
+            {'message': str(message), 'tags': message.tags}
+            for message in messages.get_messages(request)
+        ],
+    }
+    
+    farmer = None
+    if request.user.is_authenticated:
+        data['display_name'] = request.user.get_full_name() or request.user.username
+        farmer = Farmer.objects.filter(user=request.user).only('preferred_language').first()
+        if farmer:
+            data['language'] = farmer.preferred_language
+    
+    response = JsonResponse(data)
+    
+    # Keep the language cookie in step with the farmer's preference so the
+    # next shell page is served in the right language
+    if farmer and request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME) != farmer.preferred_language:
+        response.set_cookie(
+            settings.LANGUAGE_COOKIE_NAME, farmer.preferred_language,
+            max_age=settings.LANGUAGE_COOKIE_AGE,
+            samesite=settings.LANGUAGE_COOKIE_SAMESITE,
+        )
+    
+    return response
+
+def api_crop_recommendations(request, region_id):
+    """API endpoint for the best suited crops in a district"""
+    region = get_object_or_404(MalawiRegion, id=region_id)
+    
+    try:
+        k = min(max(int(request.GET.get('k', 5)), 1), 50)
+    except ValueError:
+        k = 5
+    
+    recommendations = SuitabilityService().top_crops(region, k)
+    
+    return JsonResponse({
+        'district': region.name,
+        'recommendations': recommendations,
+    })
+
+def api_seasonal_crops(request, region_id):
+    """API endpoint for crops to plant or harvest in a district this month"""
+    region = get_object_or_404(MalawiRegion, id=region_id)
+    
+    try:
+        month = int(request.GET.get('month', timezone.now().month))
+    except ValueError:
+        month = timezone.now().month
+    if not 1 <= month <= 12:
+        month = timezone.now().month
+    
+    fields = ('id', 'name_en', 'name_ny', 'crop_type')
+    plant = Crop.objects.plantable_in(month, region).order_by('name_en').values(*fields)
+    harvest = Crop.objects.harvestable_in(month, region).order_by('name_en').values(*fields)
+    
+    return JsonResponse({
+        'district': region.name,
+        'month': month,
+        'plant': list(plant),
+        'harvest': list(harvest),
+    })
+
+@never_cache
+@gzip_page
+def api_sync(request):
+    """API endpoint for the farmer's rows changed since ?since=<cursor>"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=403)
+    farmer = Farmer.objects.filter(user=request.user).only('id', 'location_id').first()
+    if farmer is None:
+        raise Http404
+    
+    since = request.GET.get('since')
+    if since:
+        try:
+            since, start = SyncService.decode_cursor(since)
+        except (ValueError, OverflowError):
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    else:
+        since = start = None
+    
+    return JsonResponse(SyncService(farmer).changes(since, start))
+
+def api_reference(request):
+    """API endpoint pointing at the current reference-data bundle"""
+    bundle = ReferenceBundleService.get_bundle()
+    response = redirect('api_reference_bundle', version=bundle['hash'])
+    patch_cache_control(response, no_cache=True)
+    return response
+
+def api_reference_bundle(request, version):
+    """API endpoint for crops, districts and calendar, immutable under their hash"""
+    bundle = ReferenceBundleService.get_bundle(version)
+    if version != bundle['hash']:
+        # Only the current bundle is kept; send old clients to it
+        return api_reference(request)
+    
+    etag = f'"{bundle["hash"]}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif re.search(r'\bgzip\b', request.headers.get('Accept-Encoding', '')):
+        response = HttpResponse(bundle['gzip'], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(bundle['body'], content_type='application/json')
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
+
+def _rollup_data(rollup):
+    return {
+        'period_start': rollup.period_start.isoformat(),
+        'market': rollup.market_name,
+        'location': rollup.location.name,
+        'count': rollup.price_count,
+        'min': float(rollup.min_price),
+        'mean': float(rollup.mean_price),
+        'max': float(rollup.max_price),
+        'avg_7d': float(rollup.rolling_avg_7d) if rollup.rolling_avg_7d is not None else None,
+        'avg_30d': float(rollup.rolling_avg_30d) if rollup.rolling_avg_30d is not None else None,
+    }
+
+def api_price_trends(request, crop_id):
+    """API endpoint for daily or weekly price statistics, read from the rollups"""
+    crop = get_object_or_404(Crop, id=crop_id)
+    
+    period = request.GET.get('period', 'day')
+    if period not in ('day', 'week'):
+        period = 'day'
+    try:
+        days = min(max(int(request.GET.get('days', 90)), 1), 730)
+    except ValueError:
+        days = 90
+    
+    rollups = MarketPriceRollup.objects.filter(
+        crop=crop,
+        period=period,
+        period_start__gte=timezone.now().date() - timedelta(days=days)
+    ).select_related('location').order_by('period_start')
+    
+    district = request.GET.get('district', '')
+    if district.isdigit():
+        rollups = rollups.filter(location_id=district)
+    market = request.GET.get('market')
+    if market:
+        rollups = rollups.filter(market_name=market)
+    
+    return JsonResponse({
+        'period': period,
+        'trend_data': [_rollup_data(rollup) for rollup in rollups],
+    })
+
+def api_price_comparison(request, crop_id):
+    """API endpoint comparing the latest daily statistics of every market for a crop"""
+    crop = get_object_or_404(Crop, id=crop_id)
+    
+    rollups = MarketPriceRollup.objects.filter(
+        crop=crop,
+        period='day',
+        period_start__gte=timezone.now().date() - timedelta(days=30)
+    ).select_related('location').order_by('-period_start')
+    
+    latest = {}
+    for rollup in rollups:
+        latest.setdefault((rollup.location_id, rollup.market_name), rollup)
+    
+    markets = sorted(latest.values(), key=lambda rollup: rollup.rolling_avg_7d or 0)
+    return JsonResponse({'markets': [_rollup_data(rollup) for rollup in markets]})
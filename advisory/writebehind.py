@@ -0,0 +1,189 @@
+"""Write-behind buffer for updates nobody waits on.
+
+Language preferences, last-seen times and view counters are collected per
+process, coalesced (the last value of a field wins, increments add up) and
+written in one transaction once the oldest is WRITE_BEHIND_FLUSH_SECONDS old
+or WRITE_BEHIND_MAX_PENDING rows are waiting. Rows getting the same values
+(a language, a last-seen minute) share one UPDATE. On SQLite every write takes
+the database's single writer lock, so a handful of short batched
+transactions replace one lock acquisition per request.
+
+Flushes run after a response has been sent (request_finished) and at exit.
+Until then, values set by primary key are applied to instances this process
+loads; other workers see them after the flush. Saving such an instance the
+normal way writes its current values, so the pending ones for the fields it
+saves are dropped rather than written over them later.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.db.models.signals import post_init, pre_save
+from .metrics import WRITE_BEHIND_FLUSH, WRITE_BEHIND_PENDING, WRITE_BEHIND_WRITES
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Coalesces field updates and counter increments until the next flush"""
+    
+    # Keys per UPDATE, well under SQLite's limit on query parameters
+    CHUNK_SIZE = 500
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # (model, key_field, key) -> {field: value}
+        self.updates = {}
+        # (model, key_field, key, field) -> amount
+        self.increments = defaultdict(int)
+        self.oldest = None
+        self.overlaid = set()
+    
+    def __len__(self):
+        return len(self.updates) + len(self.increments)
+    
+    def set(self, model, key, key_field='pk', **values):
+        """Queue ``UPDATE model SET **values WHERE key_field = key``"""
+        with self.lock:
+            pending = self.updates.setdefault((model, key_field, key), {})
+            WRITE_BEHIND_WRITES.labels('coalesced' if pending else 'queued').inc()
+            pending.update(values)
+            if key_field == 'pk' and model not in self.overlaid:
+                post_init.connect(self.apply_pending, sender=model, weak=False)
+                pre_save.connect(self.discard_saved, sender=model, weak=False)
+                self.overlaid.add(model)
+            self.queued()
+    
+    def increment(self, model, key, field, amount=1, key_field='pk'):
+        """Queue ``UPDATE model SET field = field + amount WHERE key_field = key``"""
+        with self.lock:
+            pending_key = (model, key_field, key, field)
+            WRITE_BEHIND_WRITES.labels('coalesced' if pending_key in self.increments else 'queued').inc()
+            self.increments[pending_key] += amount
+            self.queued()
+    
+    def queued(self):
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        WRITE_BEHIND_PENDING.set(len(self))
+    
+    def apply_pending(self, sender, instance, **kwargs):
+        """Show a freshly loaded instance the values still waiting to be written"""
+        values = self.updates.get((sender, 'pk', instance.pk))
+        if values:
+            for field, value in values.items():
+                setattr(instance, field, value)
+    
+    def discard(self, model, key, fields=None, key_field='pk'):
+        """Forget the pending values of a row, or of some of its fields"""
+        with self.lock:
+            pending = self.updates.get((model, key_field, key))
+            if pending is None:
+                return
+            for field in list(pending) if fields is None else fields:
+                pending.pop(field, None)
+            if not pending:
+                del self.updates[model, key_field, key]
+            if not len(self):
+                self.oldest = None
+            WRITE_BEHIND_PENDING.set(len(self))
+    
+    def discard_saved(self, sender, instance, raw=False, update_fields=None, **kwargs):
+        """A normal save writes newer values than the ones still pending"""
+        if not raw and instance.pk is not None:
+            self.discard(sender, instance.pk, update_fields)
+    
+    def due(self):
+        return self.oldest is not None and (
+            len(self) >= settings.WRITE_BEHIND_MAX_PENDING
+            or time.monotonic() - self.oldest >= settings.WRITE_BEHIND_FLUSH_SECONDS
+        )
+    
+    def flush_if_due(self, **kwargs):
+        if self.due():
+            self.flush()
+    
+    def clear(self):
+        """Drop everything pending without writing it"""
+        with self.lock:
+            self.updates = {}
+            self.increments = defaultdict(int)
+            self.oldest = None
+            WRITE_BEHIND_PENDING.set(0)
+    
+    def flush(self):
+        """Write everything pending in one transaction; returns the rows queued"""
+        # A second thread finding a flush in progress leaves the new rows for later
+        if not self.flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self.lock:
+                updates, increments = self.updates, self.increments
+                self.updates, self.increments = {}, defaultdict(int)
+                self.oldest = None
+                WRITE_BEHIND_PENDING.set(0)
+            count = len(updates) + len(increments)
+            if not count:
+                return 0
+            
+            started = time.monotonic()
+            try:
+                with transaction.atomic():
+                    self.write_updates(updates)
+                    self.write_increments(increments)
+            except DatabaseError:
+                WRITE_BEHIND_FLUSH.labels('error').observe(time.monotonic() - started)
+                logger.exception('Write-behind flush of %d rows failed; keeping them for the next one', count)
+                self.requeue(updates, increments)
+                return 0
+            WRITE_BEHIND_FLUSH.labels('ok').observe(time.monotonic() - started)
+            WRITE_BEHIND_WRITES.labels('flushed').inc(count)
+            return count
+        finally:
+            self.flush_lock.release()
+    
+    def write_updates(self, updates):
+        # Rows getting the same values share one UPDATE ... WHERE key IN (...)
+        groups = defaultdict(list)
+        for (model, key_field, key), values in updates.items():
+            groups[model, key_field, tuple(sorted(values.items()))].append(key)
+        
+        for (model, key_field, values), keys in groups.items():
+            for start in range(0, len(keys), self.CHUNK_SIZE):
+                model._base_manager.filter(
+                    **{f'{key_field}__in': keys[start:start + self.CHUNK_SIZE]}
+                ).update(**dict(values))
+    
+    def write_increments(self, increments):
+        # Counters bumped by the same amount share one UPDATE
+        groups = defaultdict(list)
+        for (model, key_field, key, field), amount in increments.items():
+            if amount:
+                groups[model, key_field, field, amount].append(key)
+        
+        for (model, key_field, field, amount), keys in groups.items():
+            for start in range(0, len(keys), self.CHUNK_SIZE):
+                model._base_manager.filter(
+                    **{f'{key_field}__in': keys[start:start + self.CHUNK_SIZE]}
+                ).update(**{field: F(field) + amount})
+    
+    def requeue(self, updates, increments):
+        with self.lock:
+            for pending_key, values in updates.items():
+                # Anything set since the failed flush is newer
+                self.updates[pending_key] = {**values, **self.updates.get(pending_key, {})}
+            for pending_key, amount in increments.items():
+                self.increments[pending_key] += amount
+            self.queued()
+
+
+write_behind = WriteBehindBuffer()
+
+request_finished.connect(write_behind.flush_if_due, dispatch_uid='advisory.write_behind')
+atexit.register(write_behind.flush)
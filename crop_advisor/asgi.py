@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crop_advisor.settings')
 
-application = get_asgi_application()
+# What get_asgi_application() does, with a handler that keeps alert streams cheap
+django.setup(set_prefix=False)
+
+from advisory.handlers import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
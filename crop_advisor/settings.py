@@ -46,14 +46,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'advisory.middleware.RequestProfilingMiddleware',
+    'advisory.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'advisory.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'advisory.middleware.LastSeenMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +75,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.i18n',
+                'advisory.context_processors.page_shell',
             ],
         },
     },
@@ -159,7 +163,128 @@ CORS_ALLOW_ALL_ORIGINS = True
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'advisory.pagination.IdCursorPagination',
+    'PAGE_SIZE': 100,
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+}
+
+# Page shell caching
+# Public pages leave out per-user fragments so a reverse proxy can cache them
+PAGE_SHELL_ENABLED = True
+PAGE_SHELL_MAX_AGE = 300  # seconds
+
+# Request profiling (opt-in, e.g. REQUEST_PROFILING=1 python manage.py runserver)
+# Every request gets SQL, template and total timings; a sampled fraction is
+# also profiled and dumped to REQUEST_PROFILING_DIR
+REQUEST_PROFILING_ENABLED = os.environ.get('REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', '0'))
+REQUEST_PROFILING_MODE = os.environ.get('REQUEST_PROFILING_MODE', 'stack')  # 'stack' or 'cprofile'
+REQUEST_PROFILING_INTERVAL = 0.005  # seconds between stack samples
+REQUEST_PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Metrics
+# /metrics is only served to scrapers sending this bearer token; behind
+# nginx every client arrives from 127.0.0.1, so addresses can't be trusted.
+# Empty refuses every scrape.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Live alerts
+# Streams end after ALERT_STREAM_MAX_SECONDS and the browser reconnects with
+# Last-Event-ID, so clients that vanished without closing don't pile up
+ALERT_STREAM_HEARTBEAT_SECONDS = 20
+ALERT_STREAM_MAX_SECONDS = 300
+ALERT_STREAM_RETRY_MS = 5000
+
+# Outbound SMS
+# Messages go to the first gateway whose PREFIXES match the number, else to
+# one without prefixes. RATE_LIMIT is messages per second per gateway.
+SMS_GATEWAYS = {
+    'default': {
+        'URL': os.environ.get('SMS_GATEWAY_URL', 'http://127.0.0.1:8025/send'),
+        'TOKEN': os.environ.get('SMS_GATEWAY_TOKEN', ''),
+        'PREFIXES': [],
+        'RATE_LIMIT': 500,
+        'BATCH_SIZE': 100,
+        'CONCURRENCY': 8,
+        'TIMEOUT': 10,
+    },
+}
+SMS_COUNTRY_CODE = '265'
+SMS_MAX_SEGMENTS = 3
+SMS_MAX_ATTEMPTS = 5
+SMS_RETRY_BACKOFF = 30  # seconds, doubled on every attempt
+# Gateways send delivery reports with this bearer token; empty refuses them all
+SMS_DELIVERY_TOKEN = os.environ.get('SMS_DELIVERY_TOKEN', '')
+
+# USSD
+# Gateways drop sessions that go quiet, so ours can expire soon after
+USSD_SESSION_TIMEOUT = 180  # seconds
+# Shared secret the gateway sends as a bearer token or in the callback URL
+# (/ussd/?token=...); empty refuses every call
+USSD_TOKEN = os.environ.get('USSD_TOKEN', '')
+
+# Public address used in links sent by SMS
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Farmers imported without a password get an SMS code to set one
+ACCOUNT_CLAIM_DAYS = 14
+
+# Write-behind
+# Language changes, last-seen times and view counters are buffered per process
+# and written in one transaction once the oldest has waited
+# WRITE_BEHIND_FLUSH_SECONDS or WRITE_BEHIND_MAX_PENDING rows are queued
+WRITE_BEHIND_FLUSH_SECONDS = 5
+WRITE_BEHIND_MAX_PENDING = 1000
+
+# Delta sync
+# Devices without a cursor get this many days of history; each section of a
+# response holds at most SYNC_PAGE_SIZE rows
+SYNC_INITIAL_DAYS = 30
+SYNC_PAGE_SIZE = 500
+# How far back the next cursor reaches to catch rows from slow transactions
+SYNC_CURSOR_OVERLAP_SECONDS = 60
+
+# Offline support
+# CDN files base.html loads, stored by the service worker on install
+OFFLINE_CDN_ASSETS = [
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+    'https://cdn.jsdelivr.net/npm/chart.js',
+]
+
+# Cache
+# Instrumented so hit ratios show up on /metrics
+CACHES = {
+    'default': {
+        'BACKEND': 'advisory.caching.InstrumentedLocMemCache',
+    }
+}
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'advisory': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
 }
 
 # Login/Logout URLs
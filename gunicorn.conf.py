@@ -0,0 +1,23 @@
+"""Gunicorn settings: gunicorn crop_advisor.wsgi -c gunicorn.conf.py"""
+import os
+import shutil
+import tempfile
+
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Workers write their metrics here so /metrics can merge them; it must be set
+# before any worker imports prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'crop_advisor_metrics'))
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be merged into this one
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -2,17 +2,102 @@
 
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize all components
+    initializePageShell();
     initializeLanguageSwitcher();
     initializeWeatherCharts();
     initializePriceCharts();
     initializeFormValidation();
     initializeTooltips();
     initializeAlerts();
+    initializeAlertStream();
     
     // Smooth scrolling for anchor links
     initializeSmoothScrolling();
 });
 
+// Page Shell
+// Cacheable pages leave out login state and messages; fill them in here
+function initializePageShell() {
+    const endpoint = document.body.dataset.pageShell;
+    if (!endpoint) return;
+    
+    fetch(endpoint, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+        .then(response => response.json())
+        .then(data => {
+            const state = data.authenticated ? 'user' : 'anonymous';
+            document.querySelectorAll('[data-shell-auth]').forEach(element => {
+                element.classList.toggle('d-none', element.dataset.shellAuth !== state);
+            });
+            
+            document.querySelectorAll('[data-shell-field]').forEach(element => {
+                element.textContent = data[element.dataset.shellField] || '';
+            });
+            
+            const messagesContainer = document.querySelector('[data-shell-messages]');
+            if (messagesContainer) {
+                data.messages.forEach(item => {
+                    messagesContainer.appendChild(createMessageAlert(item.message, item.tags));
+                });
+                initializeAlerts();
+            }
+        })
+        .catch(error => {
+            console.error('Error loading session fragment:', error);
+        });
+}
+
+// Build a dismissible alert without interpreting the message as HTML
+function createMessageAlert(message, tags) {
+    const alertElement = document.createElement('div');
+    alertElement.className = `alert alert-${tags} alert-dismissible fade show`;
+    alertElement.setAttribute('role', 'alert');
+    alertElement.textContent = message;
+    
+    const closeButton = document.createElement('button');
+    closeButton.type = 'button';
+    closeButton.className = 'btn-close';
+    closeButton.dataset.bsDismiss = 'alert';
+    alertElement.appendChild(closeButton);
+    
+    return alertElement;
+}
+
+// Live Alerts
+// Urgent advice and new weather pushed over server-sent events; EventSource
+// reconnects by itself and resumes from the last event id it saw
+function initializeAlertStream() {
+    const container = document.querySelector('[data-alert-stream]');
+    if (!container || !window.EventSource) return;
+    
+    const language = container.dataset.alertLanguage;
+    const source = new EventSource(container.dataset.alertStream);
+    
+    source.addEventListener('advice', event => {
+        const advice = JSON.parse(event.data);
+        const title = language === 'ny' && advice.title_ny ? advice.title_ny : advice.title_en;
+        container.prepend(createMessageAlert(title, 'warning'));
+    });
+    
+    source.addEventListener('weather', event => {
+        const weather = JSON.parse(event.data);
+        const card = document.querySelector('[data-live-weather]');
+        if (!card || weather.date !== new Date().toISOString().slice(0, 10)) return;
+        
+        const title = card.querySelector('.card-title');
+        card.replaceChildren(title);
+        [
+            ['h3 mb-1', `${Math.round(weather.temp_max)}° / ${Math.round(weather.temp_min)}°C`],
+            ['mb-1', weather.condition],
+            ['text-muted small mb-0', `${Math.round(weather.humidity)}% · ${weather.rainfall.toFixed(1)} mm`],
+        ].forEach(([className, text]) => {
+            const line = document.createElement('p');
+            line.className = className;
+            line.textContent = text;
+            card.appendChild(line);
+        });
+    });
+}
+
 // Language Switcher
 function initializeLanguageSwitcher() {
     const languageLinks = document.querySelectorAll('[href*="set-language"]');
@@ -144,9 +229,9 @@ function initializePriceCharts() {
 // Fetch price data from API
 async function fetchPriceData(cropId) {
     try {
-        const response = await fetch(`/api/prices/${cropId}/`);
+        const response = await fetch(`/api/prices/${cropId}/trends/`);
         const data = await response.json();
-        return data.price_data;
+        return data.trend_data;
     } catch (error) {
         console.error('Error fetching price data:', error);
         return [];
@@ -157,8 +242,8 @@ async function fetchPriceData(cropId) {
 function createPriceChart(element, priceData) {
     const ctx = element.getContext('2d');
     
-    const dates = priceData.map(item => new Date(item.date).toLocaleDateString());
-    const prices = priceData.map(item => item.price);
+    const dates = priceData.map(item => new Date(item.period_start).toLocaleDateString());
+    const prices = priceData.map(item => item.mean);
     
     new Chart(ctx, {
         type: 'line',
@@ -513,16 +598,40 @@ function initializeDynamicComponents() {
 document.addEventListener('DOMContentLoaded', initializeDynamicComponents);
 
 // Service Worker for offline functionality
+function replayOfflineRequests() {
+    if (navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage({type: 'replay-outbox'});
+    }
+}
+
 if ('serviceWorker' in navigator) {
     window.addEventListener('load', function() {
         navigator.serviceWorker.register('/sw.js')
             .then(function(registration) {
                 console.log('SW registered: ', registration);
+                // Browsers without background sync replay on the next page load
+                if (navigator.onLine) {
+                    replayOfflineRequests();
+                }
             })
             .catch(function(registrationError) {
                 console.log('SW registration failed: ', registrationError);
             });
     });
+    
+    window.addEventListener('online', replayOfflineRequests);
+    
+    navigator.serviceWorker.addEventListener('message', function(event) {
+        if (!event.data || event.data.type !== 'outbox-replayed') {
+            return;
+        }
+        if (event.data.sent) {
+            showAlert(`${event.data.sent} saved advice request(s) sent. Your new advice is on the dashboard.`, 'success');
+        }
+        if (event.data.failed) {
+            showAlert(`${event.data.failed} saved advice request(s) could not be sent. Please request them again.`, 'warning');
+        }
+    });
 }
 
 // Export functions for external use
@@ -0,0 +1,261 @@
+// Malawi Crop Advisory - Service Worker
+// Rendered by the service_worker view; VERSION changes whenever a precached
+// static file does, which replaces the static cache on the next visit.
+
+const VERSION = '{{ version }}';
+const STATIC_CACHE = `static-${VERSION}`;
+const DATA_CACHE = 'data-v1';
+const PAGE_CACHE = 'pages-v1';
+
+const PRECACHE = [
+{% for url in precache %}    '{{ url|escapejs }}',
+{% endfor %}];
+const STATIC_PREFIX = '{{ static_prefix|escapejs }}';
+const OFFLINE_URL = '{{ offline_url|escapejs }}';
+const ADVICE_URL = '{{ advice_url|escapejs }}';
+const LOGOUT_URL = '{{ logout_url|escapejs }}';
+const CDN_HOSTS = ['cdn.jsdelivr.net', 'cdnjs.cloudflare.com'];
+
+// Read-only JSON that is fine to show while a fresh copy loads
+const DATA_PATHS = [
+    /^\/api\/weather\//,
+    /^\/api\/prices\//,
+    /^\/api\/recommendations\//,
+    /^\/api\/crops\/in-season\//,
+    /^\/api\/reference\//,
+];
+const NETWORK_TIMEOUT = 4000;
+const MAX_DATA_ENTRIES = 100;
+const MAX_PAGE_ENTRIES = 50;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(STATIC_CACHE)
+            .then(cache => Promise.all(PRECACHE.map(url => {
+                const sameOrigin = new URL(url, self.location.href).origin === self.location.origin;
+                return fetch(url, {mode: sameOrigin ? 'same-origin' : 'cors', cache: 'reload'}).then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Precache failed for ${url}: ${response.status}`);
+                    }
+                    return cache.put(url, response);
+                });
+            })))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names
+                    .filter(name => name.startsWith('static-') && name !== STATIC_CACHE)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin;
+
+    if (request.method === 'POST' && sameOrigin && url.pathname === ADVICE_URL) {
+        event.respondWith(postOrQueue(request));
+        return;
+    }
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    if (sameOrigin) {
+        if (url.pathname === LOGOUT_URL) {
+            // Cached pages belong to the farmer who is leaving
+            event.respondWith(caches.delete(PAGE_CACHE).then(() => fetch(request)));
+        } else if (url.pathname.startsWith(STATIC_PREFIX)) {
+            event.respondWith(cacheFirst(request, STATIC_CACHE));
+        } else if (DATA_PATHS.some(pattern => pattern.test(url.pathname))) {
+            event.respondWith(staleWhileRevalidate(request, event));
+        } else if (request.mode === 'navigate') {
+            event.respondWith(networkFirst(request, event));
+        }
+    } else if (CDN_HOSTS.includes(url.hostname)) {
+        event.respondWith(cacheFirst(request, STATIC_CACHE));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'replay-outbox') {
+        event.waitUntil(replayOutbox());
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'replay-outbox') {
+        event.waitUntil(replayOutbox());
+    }
+});
+
+// Strategies
+
+async function cacheFirst(request, cacheName) {
+    const cached = await caches.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(cacheName);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function staleWhileRevalidate(request, event) {
+    const cache = await caches.open(DATA_CACHE);
+    const cached = await cache.match(request);
+    const refresh = fetch(request).then(async response => {
+        if (response.ok) {
+            await cache.put(request, response.clone());
+            await trimCache(DATA_CACHE, MAX_DATA_ENTRIES);
+        }
+        return response;
+    });
+
+    if (cached) {
+        event.waitUntil(refresh.catch(() => {}));
+        return cached;
+    }
+    return refresh;
+}
+
+async function networkFirst(request, event) {
+    const network = fetch(request).then(async response => {
+        const cacheControl = response.headers.get('Cache-Control') || '';
+        if (response.ok && response.type === 'basic' && !cacheControl.includes('no-store')) {
+            const cache = await caches.open(PAGE_CACHE);
+            await cache.put(request, response.clone());
+            await trimCache(PAGE_CACHE, MAX_PAGE_ENTRIES);
+        }
+        return response;
+    });
+    // Keep updating the cache even if the timeout answers first
+    event.waitUntil(network.catch(() => {}));
+
+    const timeout = new Promise((resolve, reject) => {
+        setTimeout(() => reject(new Error('timeout')), NETWORK_TIMEOUT);
+    });
+    try {
+        return await Promise.race([network, timeout]);
+    } catch (error) {
+        const cached = await caches.match(request);
+        if (cached) {
+            return cached;
+        }
+        // A slow connection that eventually answers beats the offline page
+        if (error.message === 'timeout') {
+            try {
+                return await network;
+            } catch (networkError) {
+                // Fall through to the offline page
+            }
+        }
+        return caches.match(OFFLINE_URL, {ignoreSearch: true});
+    }
+}
+
+async function trimCache(cacheName, maxEntries) {
+    const cache = await caches.open(cacheName);
+    const keys = await cache.keys();
+    // Keys come back in insertion order, so the oldest go first
+    for (const key of keys.slice(0, Math.max(keys.length - maxEntries, 0))) {
+        await cache.delete(key);
+    }
+}
+
+// Offline advice requests
+
+async function postOrQueue(request) {
+    const body = await request.clone().text();
+    try {
+        return await fetch(request);
+    } catch (error) {
+        await addToOutbox({
+            url: request.url,
+            body: body,
+            contentType: request.headers.get('Content-Type'),
+            queuedAt: Date.now(),
+        });
+        if (self.registration.sync) {
+            self.registration.sync.register('replay-outbox').catch(() => {});
+        }
+        return Response.redirect(`${OFFLINE_URL}?queued=1`, 303);
+    }
+}
+
+async function replayOutbox() {
+    const entries = await readOutbox();
+    let sent = 0;
+    let failed = 0;
+    for (const entry of entries) {
+        let response;
+        try {
+            response = await fetch(entry.url, {
+                method: 'POST',
+                body: entry.body,
+                headers: {'Content-Type': entry.contentType},
+                credentials: 'same-origin',
+                redirect: 'manual',
+            });
+        } catch (error) {
+            // Still offline; try again on the next sync or page load
+            break;
+        }
+        if (response.ok || response.type === 'opaqueredirect') {
+            sent += 1;
+        } else if (response.status >= 500) {
+            continue;
+        } else {
+            // Rejected (e.g. the session or CSRF token expired); replaying won't help
+            failed += 1;
+        }
+        await removeFromOutbox(entry.id);
+    }
+
+    if (sent || failed) {
+        const clients = await self.clients.matchAll({type: 'window'});
+        clients.forEach(client => client.postMessage({type: 'outbox-replayed', sent: sent, failed: failed}));
+    }
+}
+
+function openOutbox() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open('crop-advisory', 1);
+        open.onupgradeneeded = () => open.result.createObjectStore('outbox', {keyPath: 'id', autoIncrement: true});
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function outboxTransaction(mode, action) {
+    const db = await openOutbox();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction('outbox', mode);
+        const request = action(transaction.objectStore('outbox'));
+        transaction.oncomplete = () => resolve(request.result);
+        transaction.onerror = () => reject(transaction.error);
+    });
+}
+
+function addToOutbox(entry) {
+    return outboxTransaction('readwrite', store => store.add(entry));
+}
+
+function readOutbox() {
+    return outboxTransaction('readonly', store => store.getAll());
+}
+
+function removeFromOutbox(id) {
+    return outboxTransaction('readwrite', store => store.delete(id));
+}